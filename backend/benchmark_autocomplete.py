@@ -0,0 +1,161 @@
+"""
+Benchmark do autocomplete de usuários (índices GIN de trigramas)
+
+Cria uma tabela users temporária com 50.000 usuários, aplica os índices de
+USER_SEARCH_DDL e, para cada termo, mostra o plano da consulta do autocomplete
+(com os padrões gerados por escape_like) e o tempo com e sem os índices.
+Tudo roda em uma única transação desfeita no final: o banco não é alterado.
+
+Uso: python benchmark_autocomplete.py [usuarios]
+"""
+
+import sys
+import time
+import random
+import statistics
+
+from psycopg2.extras import execute_values
+
+from sordchat.routes.users import AUTOCOMPLETE_SQL, autocomplete_params
+from sordchat.utils.db_pool import get_db_connection
+from sordchat.utils.search import USER_SEARCH_DDL
+
+USERS = 50_000
+ITERATIONS = 50
+LIMIT = 10
+SCHEMA = "autocomplete_benchmark"
+
+# Prefixos comuns, sobrenomes, erros de digitação e curingas literais
+TERMS = ["an", "mar", "silva", "joao sou", "fernadno", "user_1", "100%"]
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Henrique",
+    "Isabela", "João", "Larissa", "Marcos", "Mariana", "Nicolas", "Otávio", "Paula",
+    "Rafael", "Sofia", "Thiago", "Vitória", "Fernando", "Juliana", "Lucas", "Beatriz"
+]
+LAST_NAMES = [
+    "Silva", "Souza", "Oliveira", "Santos", "Pereira", "Costa", "Rodrigues", "Almeida",
+    "Nascimento", "Lima", "Araújo", "Fernandes", "Carvalho", "Gomes", "Martins", "Rocha"
+]
+DEPARTMENTS = ["TI", "RH", "Financeiro", "Comercial", "Operações", "Jurídico"]
+
+
+def build_users(count: int):
+    """Gera (username, email, full_name, department, is_active, is_online) determinísticos"""
+    rng = random.Random(42)
+    rows = []
+
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        full_name = f"{first} {rng.choice(LAST_NAMES)} {last}"
+        # Alguns usernames com '_' e '%' literais, que escape_like precisa proteger
+        username = f"{first.lower()}.{last.lower()}{i}" if i % 50 else f"user_{i}_100%"
+        rows.append((
+            username,
+            f"{username}@empresa.com",
+            full_name,
+            rng.choice(DEPARTMENTS),
+            i % 20 != 0,
+            i % 7 == 0
+        ))
+
+    return rows
+
+
+def seed(cursor, count: int):
+    """Tabela users isolada em um schema próprio, com os índices de produção"""
+    # A extensão fica no schema padrão; os índices, junto da tabela temporária
+    cursor.execute(USER_SEARCH_DDL[0])
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET LOCAL search_path TO {SCHEMA}, public")
+    cursor.execute("""
+                   CREATE TABLE users (
+                       id         SERIAL PRIMARY KEY,
+                       username   VARCHAR(50)  NOT NULL,
+                       email      VARCHAR(100) NOT NULL,
+                       full_name  VARCHAR(100) NOT NULL,
+                       department VARCHAR(100),
+                       is_active  BOOLEAN DEFAULT TRUE,
+                       is_online  BOOLEAN DEFAULT FALSE
+                   )
+                   """)
+
+    started = time.perf_counter()
+    execute_values(cursor, """
+                   INSERT INTO users (username, email, full_name, department, is_active, is_online)
+                   VALUES %s
+                   """, build_users(count), page_size=5000)
+    print(f"   {'inserção (total)':<28} {(time.perf_counter() - started) * 1000:>12.1f} ms")
+
+    started = time.perf_counter()
+    for statement in USER_SEARCH_DDL[1:]:
+        cursor.execute(statement)
+    cursor.execute("ANALYZE users")
+    print(f"   {'índices + ANALYZE':<28} {(time.perf_counter() - started) * 1000:>12.1f} ms")
+
+
+def explain(cursor, term: str):
+    """Plano com tempos reais; indica se algum índice de trigramas foi usado"""
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + AUTOCOMPLETE_SQL, autocomplete_params(term, LIMIT))
+    plan = [row[0] for row in cursor.fetchall()]
+    uses_index = any("_trgm" in line for line in plan)
+    return plan, uses_index
+
+
+def measure(cursor, term: str) -> float:
+    """Mediana, em ms, de ITERATIONS execuções da consulta"""
+    params = autocomplete_params(term, LIMIT)
+    timings = []
+
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        cursor.execute(AUTOCOMPLETE_SQL, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return statistics.median(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else USERS
+
+    print(f"🔎 Benchmark do autocomplete: {count} usuários, {ITERATIONS} execuções por termo")
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        print("\n📊 Carga")
+        seed(cursor, count)
+
+        print("\n🧭 Planos")
+        results = {}
+        for term in TERMS:
+            plan, uses_index = explain(cursor, term)
+            status = "✅ índice GIN" if uses_index else "⚠️ sem índice"
+            print(f"\n   {term!r} ({status}) -> {autocomplete_params(term, LIMIT)[0]!r}")
+            for line in plan:
+                print(f"      {line}")
+            results[term] = {"index": measure(cursor, term)}
+
+        # Mesmo plano forçado a varrer a tabela, para comparação
+        cursor.execute("SET LOCAL enable_bitmapscan = off")
+        cursor.execute("SET LOCAL enable_indexscan = off")
+        for term in TERMS:
+            results[term]["seq"] = measure(cursor, term)
+
+        print("\n⏱️ Mediana por consulta")
+        print(f"   {'termo':<14} {'com índice':>12} {'sem índice':>12} {'ganho':>8}")
+        for term, timing in results.items():
+            print(f"   {term!r:<14} {timing['index']:>9.2f} ms {timing['seq']:>9.2f} ms "
+                  f"{timing['seq'] / max(timing['index'], 1e-9):>7.1f}x")
+
+    finally:
+        # Nada do benchmark fica no banco
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark do armazenamento de notificações em memória
+
+Compara o índice por usuário (sordchat.utils.notifications) com a
+implementação anterior baseada em listas, com 10.000 notificações por usuário
+
+Uso: python benchmark_notifications.py [notificacoes_por_usuario]
+"""
+
+import sys
+import time
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from sordchat.utils.notifications import Notification, NotificationManager, NOTIFICATIONS_DB
+from sordchat.utils.notification_store import notification_writer
+
+NOTIFICATIONS_PER_USER = 10_000
+USERS = 3
+ITERATIONS = 200
+
+
+class ListNotificationManager:
+    """Comportamento anterior: lista por usuário, ordenada e varrida a cada chamada"""
+
+    def __init__(self):
+        self.db = {}
+
+    def store_notification(self, notification):
+        self.db.setdefault(notification.user_id, []).append(notification)
+
+    def get_user_notifications(self, user_id, unread_only=False, limit=50):
+        user_notifications = self.db.get(user_id, [])
+        if unread_only:
+            user_notifications = [n for n in user_notifications if not n.read]
+        user_notifications.sort(key=lambda x: x.created_at, reverse=True)
+        return [n.to_dict() for n in user_notifications[:limit]]
+
+    def mark_as_read(self, user_id, notification_id):
+        for notification in self.db.get(user_id, []):
+            if notification.id == notification_id:
+                notification.read = True
+                return True
+        return False
+
+    def delete_notification(self, user_id, notification_id):
+        user_notifications = self.db.get(user_id, [])
+        for i, notification in enumerate(user_notifications):
+            if notification.id == notification_id:
+                del user_notifications[i]
+                return True
+        return False
+
+    def get_unread_count(self, user_id):
+        return len([n for n in self.db.get(user_id, []) if not n.read])
+
+
+def build_notifications(per_user: int):
+    """Gera notificações em ordem cronológica, metade delas já lidas"""
+    start = datetime.now() - timedelta(days=1)
+    notifications = []
+
+    for user_id in range(1, USERS + 1):
+        for i in range(per_user):
+            notifications.append(Notification(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                title=f"Notificação {i}",
+                message="Mensagem de teste",
+                type="info",
+                data={},
+                read=i % 2 == 0,
+                created_at=(start + timedelta(milliseconds=i)).isoformat()
+            ))
+
+    return notifications
+
+
+def measure(label: str, func, iterations: int = ITERATIONS) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed_us = (time.perf_counter() - started) / iterations * 1_000_000
+    print(f"   {label:<28} {elapsed_us:>12.1f} µs/op")
+    return elapsed_us
+
+
+def run(manager, notifications, label: str):
+    print(f"\n📊 {label}")
+
+    started = time.perf_counter()
+    for notification in notifications:
+        manager.store_notification(notification)
+    print(f"   {'inserção (total)':<28} {(time.perf_counter() - started) * 1000:>12.1f} ms")
+
+    user_ids = [n.id for n in notifications if n.user_id == 1]
+    sample = random.Random(42).sample(user_ids, ITERATIONS)
+
+    results = {
+        'list': measure("listar 50 recentes", lambda: manager.get_user_notifications(1)),
+        'list_unread': measure("listar 50 não lidas", lambda: manager.get_user_notifications(1, unread_only=True)),
+        'unread_count': measure("contar não lidas", lambda: manager.get_unread_count(1)),
+    }
+
+    ids = iter(sample)
+    results['mark_read'] = measure("marcar como lida", lambda: manager.mark_as_read(1, next(ids)))
+
+    ids = iter(sample)
+    results['delete'] = measure("excluir", lambda: manager.delete_notification(1, next(ids)))
+
+    return results
+
+
+def main():
+    per_user = int(sys.argv[1]) if len(sys.argv) > 1 else NOTIFICATIONS_PER_USER
+
+    # Mede apenas o índice em memória, sem a gravação na tabela
+    notification_writer.enabled = False
+
+    print(f"🔔 Benchmark de notificações: {USERS} usuários x {per_user} notificações")
+
+    legacy = run(ListNotificationManager(), build_notifications(per_user), "Listas (anterior)")
+
+    NOTIFICATIONS_DB.clear()
+    indexed = run(NotificationManager(), build_notifications(per_user), "Índice por usuário")
+
+    print("\n🚀 Ganho (anterior / atual)")
+    for operation, legacy_us in legacy.items():
+        print(f"   {operation:<28} {legacy_us / max(indexed[operation], 1e-9):>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -178,6 +178,42 @@ def create_database_tables():
         print("🔨 Criando tabelas no banco de dados...")
         metadata.create_all(engine)
 
+        # Índices de busca textual (tsvector + GIN)
+        print("🔎 Criando índices de busca...")
+        from sordchat.utils.search import get_search_schema_statements
+        from sqlalchemy import text
+        with engine.begin() as connection:
+            for statement in get_search_schema_statements():
+                connection.execute(text(statement))
+
+        # Metadados de arquivos enviados
+        print("📁 Criando tabelas de arquivos...")
+        from sordchat.utils.file_store import get_file_store_schema_statements
+        with engine.begin() as connection:
+            for statement in get_file_store_schema_statements():
+                connection.execute(text(statement))
+
+        # Notificações persistidas
+        print("🔔 Criando tabela de notificações...")
+        from sordchat.utils.notification_store import get_notification_store_schema_statements
+        with engine.begin() as connection:
+            for statement in get_notification_store_schema_statements():
+                connection.execute(text(statement))
+
+        # Agregados por hora/dia dos gráficos do dashboard
+        print("📈 Criando agregados de atividade...")
+        from sordchat.utils.rollups import get_rollup_schema_statements
+        with engine.begin() as connection:
+            for statement in get_rollup_schema_statements():
+                connection.execute(text(statement))
+
+        # Log de atividades (feed de atividade recente)
+        print("📜 Criando log de atividades...")
+        from sordchat.utils.activity_log import get_activity_log_schema_statements
+        with engine.begin() as connection:
+            for statement in get_activity_log_schema_statements():
+                connection.execute(text(statement))
+
         # Verificar tabelas criadas
         from sqlalchemy import inspect
         inspector = inspect(engine)
@@ -0,0 +1,100 @@
+"""
+Relatório do tempo de inicialização (importações) da API
+
+Executa a importação em um processo novo com `python -X importtime` e mostra
+o tempo total, os módulos mais lentos e quais dependências pesadas foram
+carregadas sem necessidade
+
+Uso: python profile_startup.py [modulo ...] [--top N] [--runs N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+# Módulo da aplicação importado pelo servidor (fábrica e todas as rotas)
+DEFAULT_TARGETS = ["sordchat.main"]
+
+# Dependências que só devem ser carregadas no primeiro uso
+LAZY_MODULES = ["PIL", "magic", "aiofiles"]
+
+TOP_MODULES = 15
+RUNS = 5
+
+
+def run_importtime(targets: List[str]) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """
+    Importa os módulos em um processo novo
+    Retorna (tempo total em ms, [(módulo, self µs, cumulativo µs)])
+    """
+    code = "; ".join(f"import {target}" for target in targets)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit(f"❌ Falha ao importar {', '.join(targets)}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip()[1:], int(self_us), int(cumulative_us)))
+
+    return elapsed_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de inicialização do SorDChat")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--top", type=int, default=TOP_MODULES)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    print(f"⏱️ Perfil de inicialização: {', '.join(args.targets)}")
+
+    # A primeira execução também aquece o cache de bytecode (__pycache__)
+    wall_times = []
+    modules = []
+    for _ in range(args.runs + 1):
+        elapsed_ms, modules = run_importtime(args.targets)
+        wall_times.append(elapsed_ms)
+    wall_times = sorted(wall_times[1:])
+
+    import_us = sum(self_us for _, self_us, _ in modules)
+    print(f"\n📊 Processo (mediana de {args.runs}): {wall_times[len(wall_times) // 2]:.1f} ms")
+    print(f"   Importações: {import_us / 1000:.1f} ms em {len(modules)} módulos")
+
+    # Pacotes de nível superior (o nome sem indentação é o cumulativo do pacote)
+    top_level: Dict[str, int] = {}
+    for name, _, cumulative_us in modules:
+        if not name.startswith(" "):
+            top_level[name] = max(top_level.get(name, 0), cumulative_us)
+
+    print("\n🐢 Pacotes mais lentos (cumulativo)")
+    for name, cumulative_us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"   {name:<45} {cumulative_us / 1000:>9.1f} ms")
+
+    print("\n🔍 Módulos mais lentos (próprio)")
+    for name, self_us, _ in sorted(modules, key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"   {name.strip():<45} {self_us / 1000:>9.1f} ms")
+
+    loaded = {name.strip().split(".")[0] for name, _, _ in modules}
+    print("\n💤 Dependências carregadas sob demanda")
+    for module in LAZY_MODULES:
+        status = "⚠️ importado na inicialização" if module in loaded else "✅ não importado"
+        print(f"   {module:<45} {status}")
+
+
+if __name__ == "__main__":
+    main()
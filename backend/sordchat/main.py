@@ -0,0 +1,214 @@
+"""
+SorDChat - Sistema Corporativo de Mensagens, Tickets e Tasks
+Arquivo principal da API FastAPI
+"""
+
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import uvicorn
+from datetime import datetime
+
+from .config.settings import APP_NAME, VERSION
+
+# Importar rotas
+from .routes import auth, users, messages, tickets, tasks, dashboard, files, notifications, search
+
+# Recursos compartilhados, iniciados e encerrados pelo lifespan
+from .utils.db_pool import db_pool, PoolExhausted
+from .utils.auth import pwd_context
+from .utils.delivery import delivery_bus
+from .utils.file_handler import create_upload_directories, blob_reaper
+from .utils.thumbnails import thumbnail_queue
+from .utils.notification_store import notification_writer
+from .utils.notifications import notification_retention, notification_digest
+from .utils.push_queue import push_queue
+from .utils.activity_log import activity_retention
+
+ROUTERS = [auth, users, messages, tickets, tasks, dashboard, files, notifications, search]
+
+SHUTDOWN_DRAIN_TIMEOUT = 5  # segundos para esvaziar filas no desligamento
+
+
+async def warm_up(app: FastAPI):
+    """
+    Prepara pools e caches antes de a aplicação se declarar pronta, para que as
+    primeiras requisições após um deploy não paguem a inicialização
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    create_upload_directories()
+
+    await asyncio.gather(
+        # Conexões mínimas abertas e validadas
+        loop.run_in_executor(None, db_pool.open),
+        # Backend do bcrypt carregado (primeiro login)
+        loop.run_in_executor(None, pwd_context.dummy_verify),
+        # Processos de thumbnail já com o PIL importado
+        thumbnail_queue.warm_up()
+    )
+
+    app.state.warm_up_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🔥 Aquecimento concluído em {app.state.warm_up_ms} ms")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(f"✅ Configurações carregadas para {APP_NAME} v{VERSION}")
+
+    app.state.ready = False
+    app.state.started_at = datetime.now().isoformat()
+    app.state.db_pool = db_pool
+    app.state.ws_manager = messages.manager
+    app.state.delivery_bus = delivery_bus
+    app.state.thumbnail_queue = thumbnail_queue
+    app.state.push_queue = push_queue
+
+    # Workers em segundo plano
+    blob_reaper.start()
+    notification_writer.start()
+    notification_retention.start()
+    notification_digest.start()
+    push_queue.start()
+    activity_retention.start()
+
+    try:
+        await warm_up(app)
+        app.state.ready = True
+    except Exception as e:
+        # Segue no ar (liveness), mas /ready continua indicando a falha
+        app.state.warm_up_error = str(e)
+        print(f"❌ Falha no aquecimento: {e}")
+
+    yield
+
+    app.state.ready = False
+
+    # Conexões WebSocket e entregas em andamento
+    await messages.manager.close_all()
+    await delivery_bus.drain(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    await push_queue.drain(timeout=SHUTDOWN_DRAIN_TIMEOUT)
+
+    await push_queue.stop()
+    await notification_digest.stop()
+    await notification_retention.stop()
+    await activity_retention.stop()
+    await notification_writer.stop()  # grava o que estiver pendente
+    await thumbnail_queue.stop()
+    await blob_reaper.stop()
+
+    db_pool.closeall()
+    print("👋 SorDChat encerrado")
+
+
+def create_app() -> FastAPI:
+    """Cria a aplicação com todas as rotas e o ciclo de vida dos recursos compartilhados"""
+    app = FastAPI(
+        title="SorDChat API",
+        description="API para sistema corporativo de mensagens, tickets e controle de tarefas",
+        version=VERSION,
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan
+    )
+
+    # Configuração CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Incluir rotas
+    for module in ROUTERS:
+        app.include_router(module.router)
+
+    # Rota inicial
+    @app.get("/")
+    async def root():
+        """Rota inicial para verificar se a API está funcionando"""
+        return {
+            "message": "SorDChat API está funcionando!",
+            "timestamp": datetime.now().isoformat(),
+            "version": VERSION,
+            "endpoints": {
+                "docs": "/docs",
+                **{module.router.prefix.strip("/"): module.router.prefix for module in ROUTERS},
+                "health": "/health",
+                "ready": "/ready"
+            }
+        }
+
+    # Rota de health check (liveness)
+    @app.get("/health")
+    async def health_check():
+        """Verificação de saúde da API"""
+        return {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat()
+        }
+
+    # Readiness: só passa depois do aquecimento
+    @app.get("/ready")
+    async def readiness_check():
+        """Indica se a instância já pode receber tráfego"""
+        if not getattr(app.state, "ready", False):
+            return JSONResponse(
+                status_code=503,
+                content={
+                    "status": "starting",
+                    "error": getattr(app.state, "warm_up_error", None)
+                }
+            )
+
+        return {
+            "status": "ready",
+            "started_at": app.state.started_at,
+            "warm_up_ms": app.state.warm_up_ms,
+            "db_pool": db_pool.get_metrics(),
+            "websocket_connections": len(messages.manager.active_connections)
+        }
+
+    # Manipuladores de exceção
+    @app.exception_handler(404)
+    async def not_found_handler(request, exc):
+        return JSONResponse(
+            status_code=404,
+            content={"message": "Endpoint não encontrado", "detail": str(exc)}
+        )
+
+    @app.exception_handler(PoolExhausted)
+    async def pool_exhausted_handler(request, exc):
+        return JSONResponse(
+            status_code=503,
+            content={"message": "Servidor ocupado, tente novamente", "detail": str(exc)},
+            headers={"Retry-After": "1"}
+        )
+
+    @app.exception_handler(500)
+    async def internal_error_handler(request, exc):
+        return JSONResponse(
+            status_code=500,
+            content={"message": "Erro interno do servidor", "detail": str(exc)}
+        )
+
+    return app
+
+
+app = create_app()
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "sordchat.main:app",
+        host="127.0.0.1",
+        port=8000,
+        reload=True,
+        log_level="info"
+    )
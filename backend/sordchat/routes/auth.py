@@ -5,32 +5,17 @@ Rotas de autenticação
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime
-import psycopg2
-from urllib.parse import urlparse
-import os
-from dotenv import load_dotenv
 
+from ..config.settings import load_environment
 from ..schemas.auth import UserLogin, Token, UserResponse
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_password, create_access_token, verify_token, create_user_token_data
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/auth", tags=["Autenticação"])
 security = HTTPBearer()
 
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
-
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
-    )
-
 def get_user_by_username(username: str):
     """Busca usuário por username"""
     conn = get_db_connection()
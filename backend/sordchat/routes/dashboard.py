@@ -4,34 +4,42 @@ Dashboard com estatísticas completas
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any, List
-import psycopg2
-from urllib.parse import urlparse
-import os
+from typing import Dict, Any, List, Optional
+import time
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
+from ..config.settings import load_environment
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_token
-from ..utils.permissions import has_permission, Permission
+from ..utils.permissions import has_permission, require_permission, Permission
+from ..utils.rollups import (
+    SCOPE_USER, SCOPE_DEPARTMENT, METRIC_TASKS_CREATED, METRIC_TASKS_COMPLETED, METRIC_MESSAGES,
+    fetch_daily_series, fetch_hour_of_day
+)
+from ..utils.activity_log import fetch_activity
+from ..utils.pagination import encode_cursor, decode_cursor
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 security = HTTPBearer()
 
+RECENT_ACTIVITY_LIMIT = 10  # itens do bloco recent_activity da visão geral
 
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
+TEAM_PERFORMANCE_CACHE_TTL = 60  # segundos
+TEAM_PERFORMANCE_CACHE: Dict[str, Any] = {}  # departamento -> (calculado em, generated_at, membros)
 
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
-    )
+# Campos aceitos em sort_by do ranking da equipe
+TEAM_SORT_KEYS = {
+    "task_completion_rate": lambda m: m["tasks"]["completion_rate"],
+    "completed_tasks": lambda m: m["tasks"]["completed"],
+    "overdue_tasks": lambda m: m["tasks"]["overdue"],
+    "avg_completion_hours": lambda m: m["tasks"]["avg_completion_hours"],
+    "ticket_completion_rate": lambda m: m["tickets"]["completion_rate"],
+    "closed_tickets": lambda m: m["tickets"]["closed"],
+    "avg_resolution_hours": lambda m: m["tickets"]["avg_resolution_hours"],
+    "full_name": lambda m: m["full_name"].lower(),
+}
 
 
 def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -48,6 +56,91 @@ def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depe
     return payload
 
 
+def get_chart_scope_key(cursor, current_user: Dict[str, Any], scope: str):
+    """Chave dos agregados do gráfico: o próprio usuário ou o departamento dele"""
+    user_id = current_user.get("user_id")
+
+    if scope != SCOPE_DEPARTMENT:
+        return user_id
+
+    cursor.execute("SELECT department FROM users WHERE id = %s", (user_id,))
+    row = cursor.fetchone()
+
+    if not row or not row[0]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuário sem departamento"
+        )
+
+    return row[0]
+
+
+def fetch_member_performance(cursor, member_filter: str, params: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Métricas de tickets e tasks atribuídos a cada usuário que atende
+    `member_filter` (condição sobre users u), em uma única consulta agrupada
+    """
+    cursor.execute(f"""
+        WITH members AS (
+            SELECT u.id, u.username, u.full_name
+            FROM users u
+            WHERE {member_filter}
+        ),
+        ticket_stats AS (
+            SELECT t.assigned_to_id AS user_id,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE lower(t.status::text) = 'encerrado') AS closed,
+                   AVG(EXTRACT(EPOCH FROM (COALESCE(t.closed_at, NOW()) - t.created_at)) / 3600) AS avg_hours
+            FROM tickets t
+            JOIN members m ON m.id = t.assigned_to_id
+            GROUP BY t.assigned_to_id
+        ),
+        task_stats AS (
+            SELECT t.assigned_to_id AS user_id,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE lower(t.status::text) = 'concluida') AS completed,
+                   COUNT(*) FILTER (WHERE t.due_date < NOW() AND lower(t.status::text) <> 'concluida') AS overdue,
+                   AVG(EXTRACT(EPOCH FROM (COALESCE(t.completed_at, NOW()) - t.created_at)) / 3600) AS avg_hours
+            FROM tasks t
+            JOIN members m ON m.id = t.assigned_to_id
+            GROUP BY t.assigned_to_id
+        )
+        SELECT m.id, m.username, m.full_name,
+               COALESCE(ts.total, 0), COALESCE(ts.closed, 0), ts.avg_hours,
+               COALESCE(ks.total, 0), COALESCE(ks.completed, 0), COALESCE(ks.overdue, 0), ks.avg_hours
+        FROM members m
+        LEFT JOIN ticket_stats ts ON ts.user_id = m.id
+        LEFT JOIN task_stats ks ON ks.user_id = m.id
+        ORDER BY m.full_name
+    """, params)
+
+    members = []
+    for row in cursor.fetchall():
+        (user_id, username, full_name, tickets_total, tickets_closed, ticket_hours,
+         tasks_total, tasks_completed, tasks_overdue, task_hours) = row
+
+        members.append({
+            "user_id": user_id,
+            "username": username,
+            "full_name": full_name,
+            "tickets": {
+                "total": tickets_total,
+                "closed": tickets_closed,
+                "completion_rate": round(tickets_closed / tickets_total * 100, 1) if tickets_total else 0,
+                "avg_resolution_hours": round(float(ticket_hours or 0), 1)
+            },
+            "tasks": {
+                "total": tasks_total,
+                "completed": tasks_completed,
+                "overdue": tasks_overdue,
+                "completion_rate": round(tasks_completed / tasks_total * 100, 1) if tasks_total else 0,
+                "avg_completion_hours": round(float(task_hours or 0), 1)
+            }
+        })
+
+    return members
+
+
 @router.get("/overview")
 async def get_dashboard_overview(
         current_user=Depends(get_current_user_from_token)
@@ -160,37 +253,8 @@ async def get_dashboard_overview(
             "recent": message_stats[4]
         }
 
-        # 5. Atividade recente
-        cursor.execute("""
-            (SELECT 'ticket' as type, title as description, created_at as timestamp
-             FROM tickets 
-             WHERE created_by_id = %s OR assigned_to_id = %s
-             ORDER BY created_at DESC LIMIT 5)
-            UNION ALL
-            (SELECT 'task' as type, name as description, created_at as timestamp
-             FROM tasks 
-             WHERE created_by_id = %s OR assigned_to_id = %s
-             ORDER BY created_at DESC LIMIT 5)
-            UNION ALL
-            (SELECT 'message' as type, 
-                    CASE WHEN LENGTH(content) > 50 
-                         THEN SUBSTRING(content FROM 1 FOR 50) || '...'
-                         ELSE content 
-                    END as description, 
-                    created_at as timestamp
-             FROM messages 
-             WHERE sender_id = %s
-             ORDER BY created_at DESC LIMIT 5)
-            ORDER BY timestamp DESC LIMIT 10
-        """, (user_id, user_id, user_id, user_id, user_id))
-
-        recent_activity = []
-        for row in cursor.fetchall():
-            recent_activity.append({
-                "type": row[0],
-                "description": row[1],
-                "timestamp": row[2].isoformat()
-            })
+        # 5. Atividade recente (log de atividades)
+        recent_activity = fetch_activity(cursor, user_id, RECENT_ACTIVITY_LIMIT)
 
         overview["recent_activity"] = recent_activity
 
@@ -201,6 +265,42 @@ async def get_dashboard_overview(
         conn.close()
 
 
+@router.get("/activity")
+async def get_activity_feed(
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Cursor retornado pela página anterior"),
+        current_user=Depends(get_current_user_from_token)
+):
+    """📜 Feed de atividades do usuário (novos eventos chegam pelo WebSocket como "activity")"""
+
+    position = decode_cursor(cursor)
+    if position and not all(key in position for key in ("timestamp", "id")):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        events = fetch_activity(db_cursor, current_user.get("user_id"), limit + 1, position)
+
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        next_cursor = None
+        if has_more and events:
+            last = events[-1]
+            next_cursor = encode_cursor({"timestamp": last["timestamp"], "id": last["id"]})
+
+        return {
+            "events": events,
+            "next_cursor": next_cursor
+        }
+
+    finally:
+        db_cursor.close()
+        conn.close()
+
+
 @router.get("/charts/tickets-by-priority")
 async def get_tickets_by_priority_chart(
         current_user=Depends(get_current_user_from_token)
@@ -254,32 +354,20 @@ async def get_tickets_by_priority_chart(
 @router.get("/charts/tasks-timeline")
 async def get_tasks_timeline_chart(
         days: int = Query(30, ge=7, le=90),
+        scope: str = Query(SCOPE_USER, pattern="^(user|department)$"),
         current_user=Depends(get_current_user_from_token)
 ):
-    """Dados para gráfico de timeline de tasks"""
+    """Dados para gráfico de timeline de tasks (agregados diários)"""
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        user_id = current_user.get("user_id")
+        scope_key = get_chart_scope_key(cursor, current_user, scope)
 
-        cursor.execute("""
-                       SELECT
-                           DATE (created_at) as date, COUNT (*) as created, COUNT (CASE WHEN status = 'concluida' THEN 1 END) as completed
-                       FROM tasks
-                       WHERE (created_by_id = %s
-                          OR assigned_to_id = %s)
-                         AND created_at >= NOW() - INTERVAL '%s days'
-                       GROUP BY DATE (created_at)
-                       ORDER BY date
-                       """, (user_id, user_id, days))
-
-        data = cursor.fetchall()
-
-        categories = [row[0].strftime("%d/%m") for row in data]
-        created_data = [row[1] for row in data]
-        completed_data = [row[2] for row in data]
+        dates, series = fetch_daily_series(
+            cursor, scope, scope_key, [METRIC_TASKS_CREATED, METRIC_TASKS_COMPLETED], days
+        )
 
         return {
             "type": "line",
@@ -287,18 +375,18 @@ async def get_tasks_timeline_chart(
             "series": [
                 {
                     "name": "Criadas",
-                    "data": created_data,
+                    "data": series[METRIC_TASKS_CREATED],
                     "type": "line",
                     "marker": {"color": "#3B82F6"}
                 },
                 {
                     "name": "Concluídas",
-                    "data": completed_data,
+                    "data": series[METRIC_TASKS_COMPLETED],
                     "type": "line",
                     "marker": {"color": "#10B981"}
                 }
             ],
-            "categories": categories
+            "categories": [day.strftime("%d/%m") for day in dates]
         }
 
     finally:
@@ -309,33 +397,20 @@ async def get_tasks_timeline_chart(
 @router.get("/charts/messages-activity")
 async def get_messages_activity_chart(
         hours: int = Query(24, ge=6, le=168),
+        scope: str = Query(SCOPE_USER, pattern="^(user|department)$"),
         current_user=Depends(get_current_user_from_token)
 ):
-    """Dados para gráfico de atividade de mensagens"""
+    """Dados para gráfico de atividade de mensagens (agregados por hora)"""
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        user_id = current_user.get("user_id")
-
-        cursor.execute("""
-                       SELECT EXTRACT(HOUR FROM created_at) as hour,
-                COUNT(*) as message_count
-                       FROM messages
-                       WHERE (sender_id = %s
-                          OR receiver_id = %s)
-                         AND created_at >= NOW() - INTERVAL '%s hours'
-                       GROUP BY EXTRACT (HOUR FROM created_at)
-                       ORDER BY hour
-                       """, (user_id, user_id, hours))
-
-        data = cursor.fetchall()
+        scope_key = get_chart_scope_key(cursor, current_user, scope)
 
         # Preencher todas as horas (0-23)
-        hours_data = {int(row[0]): row[1] for row in data}
+        message_counts = fetch_hour_of_day(cursor, scope, scope_key, METRIC_MESSAGES, hours)
         categories = [f"{h:02d}:00" for h in range(24)]
-        message_counts = [hours_data.get(h, 0) for h in range(24)]
 
         return {
             "type": "bar",
@@ -368,55 +443,73 @@ async def get_performance_metrics(
     try:
         user_id = current_user.get("user_id")
 
-        # Métricas de tickets
-        cursor.execute("""
-                       SELECT COUNT(*)                                                                  as total_tickets,
-                              COUNT(CASE WHEN status = 'encerrado' THEN 1 END)                          as closed_tickets,
-                              AVG(EXTRACT(EPOCH FROM (COALESCE(closed_at, NOW()) - created_at)) / 3600) as avg_resolution_hours
-                       FROM tickets
-                       WHERE assigned_to_id = %s
-                       """, (user_id,))
+        members = fetch_member_performance(cursor, "u.id = %s", [user_id])
+        if not members:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuário não encontrado"
+            )
 
-        ticket_metrics = cursor.fetchone()
+        return {
+            "tickets": members[0]["tickets"],
+            "tasks": members[0]["tasks"]
+        }
 
-        # Métricas de tasks
-        cursor.execute("""
-                       SELECT COUNT(*)                                                                     as total_tasks,
-                              COUNT(CASE WHEN status = 'concluida' THEN 1 END)                             as completed_tasks,
-                              COUNT(CASE WHEN due_date < NOW() AND status != 'concluida' THEN 1 END)       as overdue_tasks,
-                              AVG(EXTRACT(EPOCH FROM (COALESCE(completed_at, NOW()) - created_at)) /
-                                  3600)                                                                    as avg_completion_hours
-                       FROM tasks
-                       WHERE assigned_to_id = %s
-                       """, (user_id,))
+    finally:
+        cursor.close()
+        conn.close()
 
-        task_metrics = cursor.fetchone()
 
-        # Calcular taxas de conclusão
-        ticket_completion_rate = 0
-        if ticket_metrics[0] > 0:
-            ticket_completion_rate = (ticket_metrics[1] / ticket_metrics[0]) * 100
+@router.get("/performance/team")
+async def get_team_performance(
+        department: Optional[str] = Query(None, description="Apenas master pode consultar outro departamento"),
+        sort_by: str = Query("task_completion_rate", pattern=f"^({'|'.join(TEAM_SORT_KEYS)})$"),
+        order: str = Query("desc", pattern="^(asc|desc)$"),
+        page: int = Query(1, ge=1),
+        per_page: int = Query(20, ge=1, le=100),
+        current_user=Depends(get_current_user_from_token)
+):
+    """🏆 Ranking de performance dos membros de um departamento"""
 
-        task_completion_rate = 0
-        if task_metrics[0] > 0:
-            task_completion_rate = (task_metrics[1] / task_metrics[0]) * 100
+    access_level = current_user.get("access_level")
+    require_permission(access_level, Permission.VIEW_DEPARTMENT_TASKS)
 
-        return {
-            "tickets": {
-                "total": ticket_metrics[0],
-                "closed": ticket_metrics[1],
-                "completion_rate": round(ticket_completion_rate, 1),
-                "avg_resolution_hours": round(ticket_metrics[2] or 0, 1)
-            },
-            "tasks": {
-                "total": task_metrics[0],
-                "completed": task_metrics[1],
-                "overdue": task_metrics[2],
-                "completion_rate": round(task_completion_rate, 1),
-                "avg_completion_hours": round(task_metrics[3] or 0, 1)
-            }
-        }
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if not department or not has_permission(access_level, Permission.VIEW_ALL_TASKS):
+            department = get_chart_scope_key(cursor, current_user, SCOPE_DEPARTMENT)
+
+        cached = TEAM_PERFORMANCE_CACHE.get(department)
+        if cached is None or time.monotonic() - cached[0] > TEAM_PERFORMANCE_CACHE_TTL:
+            members = fetch_member_performance(
+                cursor, "u.department = %s AND u.is_active = TRUE", [department]
+            )
+            cached = (time.monotonic(), datetime.now().isoformat(), members)
+            TEAM_PERFORMANCE_CACHE[department] = cached
 
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+    _, generated_at, members = cached
+
+    # O cache guarda o departamento inteiro; ordenação e página saem dele
+    ranked = sorted(members, key=TEAM_SORT_KEYS[sort_by], reverse=order == "desc")
+
+    offset = (page - 1) * per_page
+
+    return {
+        "department": department,
+        "generated_at": generated_at,
+        "total": len(ranked),
+        "page": page,
+        "per_page": per_page,
+        "sort_by": sort_by,
+        "order": order,
+        "members": [
+            {"rank": offset + position + 1, **member}
+            for position, member in enumerate(ranked[offset:offset + per_page])
+        ]
+    }
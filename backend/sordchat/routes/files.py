@@ -2,22 +2,42 @@
 Rotas para upload e gerenciamento de arquivos
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from typing import List, Optional
 import os
 import json
+import asyncio
 from pathlib import Path
-import aiofiles
 
 from ..utils.file_handler import (
     save_uploaded_file,
-    delete_file,
+    release_file,
     get_file_info,
+    get_blob_path,
+    get_thumbnail_info,
+    resolve_thumbnail,
+    get_image_derivative,
+    create_upload_session,
+    get_upload_session,
+    append_upload_chunk,
+    complete_upload_session,
+    abort_upload_session,
+    UPLOAD_SESSION_CHUNK_SIZE,
+    UPLOAD_BATCH_CONCURRENCY,
+    derivative_cache,
+    blob_reaper,
     UPLOAD_DIR,
+    MAX_FILES_PER_USER,
     validate_file
 )
+from ..utils.thumbnails import thumbnail_queue
+from ..utils.derivatives import DERIVATIVE_FORMATS, DERIVATIVE_MAX_DIMENSION, snap_dimension
+from ..utils.file_store import get_db_connection, fetch_file, row_to_file, get_user_usage, FILE_COLUMNS
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.http_cache import file_response, make_etag
+from ..schemas.file import UploadSessionCreate, UploadSessionResponse
 
 # Importar função de verificação de token
 try:
@@ -55,10 +75,6 @@ def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depe
     return payload
 
 
-# Simulação de banco de dados para arquivos
-FILES_DB = {}
-
-
 @router.post("/upload")
 async def upload_file(
         file: UploadFile = File(...),
@@ -80,17 +96,7 @@ async def upload_file(
             }
 
         # Salvar arquivo
-        file_info = await save_uploaded_file(file, user_id, category)
-
-        # Adicionar informações extras
-        file_info.update({
-            'description': description,
-            'downloads': 0,
-            'is_public': False
-        })
-
-        # Salvar no "banco de dados"
-        FILES_DB[file_info['id']] = file_info
+        file_info = await save_uploaded_file(file, user_id, category, description)
 
         return {
             "success": True,
@@ -101,7 +107,9 @@ async def upload_file(
                 "category": file_info['category'],
                 "size": file_info['size'],
                 "uploaded_at": file_info['uploaded_at'],
-                "thumbnail_url": f"/files/{file_info['id']}/thumbnail" if file_info.get('thumbnail_path') else None
+                "deduplicated": file_info['deduplicated'],
+                "thumbnail_status": file_info['thumbnail_status'],
+                "thumbnail_url": f"/files/{file_info['id']}/thumbnail" if file_info['thumbnail_status'] == 'ready' else None
             }
         }
 
@@ -117,129 +125,386 @@ async def upload_multiple_files(
         category: Optional[str] = Form(None),
         current_user=Depends(get_current_user_from_token)
 ):
-    """📤 Upload de múltiplos arquivos"""
+    """
+    📤 Upload de múltiplos arquivos
+    Processa até UPLOAD_BATCH_CONCURRENCY arquivos ao mesmo tempo e devolve uma
+    linha NDJSON por arquivo assim que ele termina, seguida de um resumo
+    """
 
     user_id = current_user.get("user_id")
-    results = []
+    semaphore = asyncio.Semaphore(UPLOAD_BATCH_CONCURRENCY)
+
+    async def process(index: int, file: UploadFile) -> dict:
+        async with semaphore:
+            try:
+                file_info = await save_uploaded_file(file, user_id, category)
+
+                return {
+                    "index": index,
+                    "success": True,
+                    "file": {
+                        "id": file_info['id'],
+                        "original_name": file_info['original_name'],
+                        "size": file_info['size'],
+                        "thumbnail_status": file_info['thumbnail_status']
+                    }
+                }
 
-    for file in files:
-        try:
-            file_info = await save_uploaded_file(file, user_id, category)
-            FILES_DB[file_info['id']] = file_info
-
-            results.append({
-                "success": True,
-                "file": {
-                    "id": file_info['id'],
-                    "original_name": file_info['original_name'],
-                    "size": file_info['size']
+            except Exception as e:
+                # Falha isolada: os demais arquivos do lote seguem normalmente
+                return {
+                    "index": index,
+                    "success": False,
+                    "filename": file.filename,
+                    "error": e.detail if isinstance(e, HTTPException) else str(e)
                 }
-            })
 
-        except Exception as e:
-            results.append({
-                "success": False,
-                "filename": file.filename,
-                "error": str(e)
-            })
+    async def stream_results():
+        tasks = [asyncio.create_task(process(i, file)) for i, file in enumerate(files)]
+        successful = 0
+
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                successful += result['success']
+                yield json.dumps(result) + "\n"
+        finally:
+            # Cliente desconectou: interromper o que ainda não terminou
+            for task in tasks:
+                task.cancel()
+
+        yield json.dumps({
+            "summary": True,
+            "message": f"{successful}/{len(files)} arquivos enviados com sucesso",
+            "successful": successful,
+            "total": len(files)
+        }) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def build_session_response(session: dict) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session['id'],
+        original_name=session['original_name'],
+        category=session['category'],
+        total_size=session['total_size'],
+        received_bytes=session['received_bytes'],
+        chunk_size=UPLOAD_SESSION_CHUNK_SIZE,
+        expires_at=session['expires_at']
+    )
 
-    successful = len([r for r in results if r['success']])
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def start_upload_session(
+        session_data: UploadSessionCreate,
+        current_user=Depends(get_current_user_from_token)
+):
+    """⏯️ Abre uma sessão de upload retomável (arquivos grandes)"""
+
+    session = create_upload_session(
+        current_user.get("user_id"),
+        session_data.filename,
+        session_data.size,
+        session_data.category,
+        session_data.description
+    )
+    return build_session_response(session)
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session_status(
+        session_id: str,
+        response: Response,
+        current_user=Depends(get_current_user_from_token)
+):
+    """⏯️ Consulta quantos bytes já foram recebidos"""
+
+    session = get_upload_session(session_id, current_user.get("user_id"))
+    response.headers["Upload-Offset"] = str(session['received_bytes'])
+    return build_session_response(session)
+
+
+@router.put("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def upload_session_chunk(
+        session_id: str,
+        request: Request,
+        response: Response,
+        offset: int = Query(..., ge=0, description="Posição do bloco no arquivo"),
+        current_user=Depends(get_current_user_from_token)
+):
+    """⏯️ Envia um bloco (corpo bruto) a partir de offset"""
+
+    session = await append_upload_chunk(
+        session_id, current_user.get("user_id"), offset, request.stream()
+    )
+    response.headers["Upload-Offset"] = str(session['received_bytes'])
+    return build_session_response(session)
+
+
+@router.post("/uploads/{session_id}/complete")
+async def finish_upload_session(
+        session_id: str,
+        current_user=Depends(get_current_user_from_token)
+):
+    """⏯️ Finaliza a sessão e registra o arquivo"""
+
+    file_info = await complete_upload_session(session_id, current_user.get("user_id"))
 
     return {
-        "message": f"{successful}/{len(files)} arquivos enviados com sucesso",
-        "results": results
+        "success": True,
+        "message": "Arquivo enviado com sucesso!",
+        "file": {
+            "id": file_info['id'],
+            "original_name": file_info['original_name'],
+            "category": file_info['category'],
+            "size": file_info['size'],
+            "uploaded_at": file_info['uploaded_at'],
+            "deduplicated": file_info['deduplicated'],
+            "thumbnail_status": file_info['thumbnail_status'],
+            "thumbnail_url": f"/files/{file_info['id']}/thumbnail" if file_info['thumbnail_status'] == 'ready' else None
+        }
     }
 
 
+@router.delete("/uploads/{session_id}")
+async def cancel_upload_session(
+        session_id: str,
+        current_user=Depends(get_current_user_from_token)
+):
+    """⏯️ Cancela a sessão e descarta os bytes recebidos"""
+
+    if not abort_upload_session(session_id, current_user.get("user_id")):
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada")
+
+    return {"message": "Sessão de upload cancelada"}
+
+
 @router.get("/")
 async def list_files(
         category: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=200),
+        cursor: Optional[str] = Query(None, description="Cursor retornado pela página anterior"),
         current_user=Depends(get_current_user_from_token)
 ):
     """📋 Lista arquivos do usuário"""
 
     user_id = current_user.get("user_id")
-    user_files = []
-
-    for file_info in FILES_DB.values():
-        if file_info['uploaded_by'] == user_id:
-            if not category or file_info['category'] == category:
-                user_files.append({
-                    "id": file_info['id'],
-                    "original_name": file_info['original_name'],
-                    "category": file_info['category'],
-                    "size": file_info['size'],
-                    "uploaded_at": file_info['uploaded_at'],
-                    "downloads": file_info.get('downloads', 0),
-                    "thumbnail_url": f"/files/{file_info['id']}/thumbnail" if file_info.get('thumbnail_path') else None
-                })
 
-    return {
-        "files": user_files,
-        "total": len(user_files),
-        "categories": list(set(f['category'] for f in user_files))
-    }
+    position = decode_cursor(cursor)
+    if position and not all(key in position for key in ("uploaded_at", "id")):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        where_conditions = ["f.uploaded_by = %s"]
+        params = [user_id]
+
+        if category:
+            where_conditions.append("f.category = %s")
+            params.append(category)
+
+        # Contagens por categoria (contadores mantidos em file_usage)
+        category_counts = {
+            name: usage['count'] for name, usage in get_user_usage(db_cursor, user_id).items()
+        }
+
+        if position:
+            where_conditions.append("(f.uploaded_at, f.id) < (%s, %s)")
+            params.extend([position["uploaded_at"], position["id"]])
+
+        columns = ", ".join(f"f.{column}" for column in FILE_COLUMNS)
+        db_cursor.execute(f"""
+            SELECT {columns}, b.thumbnail_status, b.thumbnail_path
+            FROM files f
+            JOIN file_blobs b ON b.hash = f.hash
+            WHERE {" AND ".join(where_conditions)}
+            ORDER BY f.uploaded_at DESC, f.id DESC
+            LIMIT %s
+        """, params + [limit + 1])
+
+        rows = db_cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        user_files = []
+        for row in rows:
+            file_info = row_to_file(row[:len(FILE_COLUMNS)])
+            thumbnail = resolve_thumbnail(file_info['hash'], row[-2], row[-1])
+            user_files.append({
+                "id": file_info['id'],
+                "original_name": file_info['original_name'],
+                "category": file_info['category'],
+                "size": file_info['size'],
+                "uploaded_at": file_info['uploaded_at'],
+                "downloads": file_info['downloads'],
+                "thumbnail_status": thumbnail['status'],
+                "thumbnail_url": f"/files/{file_info['id']}/thumbnail" if thumbnail['status'] == 'ready' else None
+            })
+
+        next_cursor = None
+        if has_more and user_files:
+            last = user_files[-1]
+            next_cursor = encode_cursor({"uploaded_at": last["uploaded_at"], "id": last["id"]})
+
+        return {
+            "files": user_files,
+            "total": category_counts.get(category, 0) if category else sum(category_counts.values()),
+            "categories": list(category_counts.keys()),
+            "next_cursor": next_cursor
+        }
+
+    finally:
+        db_cursor.close()
+        conn.close()
 
 
 @router.get("/{file_id}")
 async def download_file(
         file_id: str,
+        request: Request,
         current_user=Depends(get_current_user_from_token)
 ):
-    """⬇️ Download de arquivo"""
+    """⬇️ Download de arquivo (aceita Range e requisições condicionais)"""
 
-    file_info = FILES_DB.get(file_id)
-    if not file_info:
-        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
 
-    file_path = Path(file_info['path'])
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Arquivo não encontrado no sistema")
+    try:
+        file_info = fetch_file(db_cursor, file_id)
+        if not file_info:
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+        file_path = get_blob_path(file_info)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado no sistema")
+
+        response = file_response(
+            request,
+            file_path,
+            etag=make_etag(file_info['hash']),
+            media_type=file_info['mime_type'],
+            filename=file_info['original_name']
+        )
 
-    # Incrementar contador de downloads
-    FILES_DB[file_id]['downloads'] = file_info.get('downloads', 0) + 1
+        # Contar apenas downloads iniciados (não revalidações nem retomadas)
+        content_range = response.headers.get("content-range", "")
+        if response.status_code == 200 or content_range.startswith("bytes 0-"):
+            db_cursor.execute(
+                "UPDATE files SET downloads = downloads + 1 WHERE id = %s",
+                (file_id,)
+            )
+            conn.commit()
 
-    return FileResponse(
-        path=file_path,
-        filename=file_info['original_name'],
-        media_type=file_info['mime_type']
-    )
+    finally:
+        db_cursor.close()
+        conn.close()
+
+    return response
 
 
 @router.get("/{file_id}/thumbnail")
-async def get_thumbnail(file_id: str):
+async def get_thumbnail(file_id: str, request: Request):
     """🖼️ Obtém thumbnail do arquivo"""
 
-    file_info = FILES_DB.get(file_id)
-    if not file_info or not file_info.get('thumbnail_path'):
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        file_info = fetch_file(db_cursor, file_id)
+        if not file_info:
+            raise HTTPException(status_code=404, detail="Thumbnail não encontrado")
+
+        thumbnail = get_thumbnail_info(db_cursor, file_info)
+
+    finally:
+        db_cursor.close()
+        conn.close()
+
+    if thumbnail['status'] == 'pending':
+        # Ainda na fila; o cliente recebe "thumbnail_ready" via WebSocket
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Thumbnail em processamento",
+            headers={"Retry-After": "2"}
+        )
+
+    if not thumbnail['path']:
         raise HTTPException(status_code=404, detail="Thumbnail não encontrado")
 
-    thumbnail_path = Path(file_info['thumbnail_path'])
+    thumbnail_path = Path(thumbnail['path'])
     if not thumbnail_path.exists():
         raise HTTPException(status_code=404, detail="Thumbnail não encontrado no sistema")
 
-    return FileResponse(
-        path=thumbnail_path,
+    return file_response(
+        request,
+        thumbnail_path,
+        etag=make_etag(file_info['hash'], "thumb"),
         media_type="image/jpeg"
     )
 
 
-@router.get("/{file_id}/info")
-async def get_file_info_endpoint(
+@router.get("/{file_id}/image")
+async def get_image(
         file_id: str,
+        request: Request,
+        w: int = Query(..., ge=1, le=DERIVATIVE_MAX_DIMENSION, description="Largura máxima"),
+        h: Optional[int] = Query(None, ge=1, le=DERIVATIVE_MAX_DIMENSION, description="Altura máxima (padrão: igual à largura)"),
+        format: str = Query("jpeg", pattern="^(jpeg|webp|png)$"),
         current_user=Depends(get_current_user_from_token)
 ):
-    """ℹ️ Informações detalhadas do arquivo"""
+    """🖼️ Imagem redimensionada sob demanda (mantém a proporção)"""
 
-    file_info = FILES_DB.get(file_id)
+    file_info = get_file_info(file_id)
     if not file_info:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
     # Verificar se o usuário tem acesso
-    user_id = current_user.get("user_id")
-    if file_info['uploaded_by'] != user_id and not file_info.get('is_public', False):
+    if file_info['uploaded_by'] != current_user.get("user_id") and not file_info['is_public']:
         raise HTTPException(status_code=403, detail="Acesso negado")
 
+    # Apenas os tamanhos de DERIVATIVE_SIZES são gerados
+    width = snap_dimension(w)
+    height = snap_dimension(h or w)
+
+    derivative_path = await get_image_derivative(file_info, width, height, format)
+
+    return file_response(
+        request,
+        derivative_path,
+        etag=make_etag(file_info['hash'], f"{width}x{height}", format),
+        media_type=DERIVATIVE_FORMATS[format]['media_type']
+    )
+
+
+@router.get("/{file_id}/info")
+async def get_file_info_endpoint(
+        file_id: str,
+        current_user=Depends(get_current_user_from_token)
+):
+    """ℹ️ Informações detalhadas do arquivo"""
+
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        file_info = fetch_file(db_cursor, file_id)
+        if not file_info:
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+        # Verificar se o usuário tem acesso
+        user_id = current_user.get("user_id")
+        if file_info['uploaded_by'] != user_id and not file_info['is_public']:
+            raise HTTPException(status_code=403, detail="Acesso negado")
+
+        thumbnail = get_thumbnail_info(db_cursor, file_info)
+
+    finally:
+        db_cursor.close()
+        conn.close()
+
     return {
         "id": file_info['id'],
         "original_name": file_info['original_name'],
@@ -248,10 +513,11 @@ async def get_file_info_endpoint(
         "hash": file_info['hash'],
         "mime_type": file_info['mime_type'],
         "uploaded_at": file_info['uploaded_at'],
-        "downloads": file_info.get('downloads', 0),
-        "description": file_info.get('description'),
-        "is_public": file_info.get('is_public', False),
-        "thumbnail_available": bool(file_info.get('thumbnail_path'))
+        "downloads": file_info['downloads'],
+        "description": file_info['description'],
+        "is_public": file_info['is_public'],
+        "thumbnail_status": thumbnail['status'],
+        "thumbnail_available": thumbnail['status'] == 'ready'
     }
 
 
@@ -262,7 +528,7 @@ async def delete_file_endpoint(
 ):
     """🗑️ Excluir arquivo"""
 
-    file_info = FILES_DB.get(file_id)
+    file_info = get_file_info(file_id)
     if not file_info:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
 
@@ -274,15 +540,35 @@ async def delete_file_endpoint(
         if current_user.get("access_level") != "master":
             raise HTTPException(status_code=403, detail="Sem permissão para excluir este arquivo")
 
-    # Excluir arquivo físico
-    success = delete_file(file_id, user_id)
+    # Liberar o conteúdo (o arquivo físico só sai quando não houver outras referências)
+    if release_file(file_id) is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    return {"message": "Arquivo excluído com sucesso"}
+
+
+@router.get("/stats/thumbnails")
+async def get_thumbnail_metrics(current_user=Depends(get_current_user_from_token)):
+    """🖼️ Métricas da fila de thumbnails (apenas master)"""
 
-    if success:
-        # Remover do "banco de dados"
-        del FILES_DB[file_id]
-        return {"message": "Arquivo excluído com sucesso"}
-    else:
-        raise HTTPException(status_code=500, detail="Erro ao excluir arquivo")
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    return {
+        **thumbnail_queue.get_metrics(),
+        "derivatives": derivative_cache.get_metrics(),
+        "reaper": blob_reaper.get_metrics()
+    }
+
+
+@router.post("/maintenance/reconcile")
+async def reconcile_uploads(current_user=Depends(get_current_user_from_token)):
+    """🧹 Remove do disco blobs, thumbnails e temporários sem registro (apenas master)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    return await blob_reaper.reconcile()
 
 
 @router.get("/stats/overview")
@@ -290,27 +576,38 @@ async def get_file_stats(current_user=Depends(get_current_user_from_token)):
     """📊 Estatísticas de arquivos"""
 
     user_id = current_user.get("user_id")
-    user_files = [f for f in FILES_DB.values() if f['uploaded_by'] == user_id]
 
-    # Calcular estatísticas
-    total_size = sum(f['size'] for f in user_files)
-    categories = {}
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        # Totais lidos dos contadores incrementais, sem percorrer os arquivos
+        categories = get_user_usage(db_cursor, user_id)
 
-    for file_info in user_files:
-        category = file_info['category']
-        if category not in categories:
-            categories[category] = {'count': 0, 'size': 0}
-        categories[category]['count'] += 1
-        categories[category]['size'] += file_info['size']
+        db_cursor.execute(f"""
+            SELECT {", ".join(FILE_COLUMNS)} FROM files
+            WHERE uploaded_by = %s
+            ORDER BY uploaded_at DESC, id DESC
+            LIMIT 5
+        """, (user_id,))
+        recent_uploads = [row_to_file(row) for row in db_cursor.fetchall()]
+
+    finally:
+        db_cursor.close()
+        conn.close()
+
+    total_files = sum(c['count'] for c in categories.values())
+    total_size = sum(c['size'] for c in categories.values())
 
     return {
-        "total_files": len(user_files),
+        "total_files": total_files,
         "total_size": total_size,
         "total_size_mb": round(total_size / (1024 * 1024), 2),
         "categories": categories,
-        "recent_uploads": sorted(
-            user_files,
-            key=lambda x: x['uploaded_at'],
-            reverse=True
-        )[:5]
-    }
\ No newline at end of file
+        "quota": {
+            "max_files": MAX_FILES_PER_USER,
+            "used": total_files,
+            "remaining": max(MAX_FILES_PER_USER - total_files, 0)
+        },
+        "recent_uploads": recent_uploads
+    }
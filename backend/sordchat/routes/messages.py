@@ -5,18 +5,24 @@ Rotas CRUD para mensagens e chat em tempo real
 from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional, Dict, Any
-import psycopg2
-from urllib.parse import urlparse
-import os
 import json
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 
-from ..schemas.message import MessageCreate, MessageUpdate, MessageResponse, MessageListResponse
+from ..config.settings import load_environment
+from ..schemas.message import (
+    MessageCreate, MessageUpdate, MessageResponse, MessageListResponse,
+    MessageSearchHit, MessageSearchResponse
+)
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_token
 from ..utils.permissions import require_permission, Permission, has_permission
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.search import SEARCH_LANGUAGE, HEADLINE_OPTIONS
+from ..utils.notifications import notify_new_message, notification_manager
+from ..utils.delivery import delivery_bus
+from ..utils.activity_log import record_activity, publish_activity, refresh_activity_summary, forget_activity
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/messages", tags=["Mensagens"])
 security = HTTPBearer()
@@ -42,29 +48,28 @@ class ConnectionManager:
         if user_id in self.user_rooms:
             del self.user_rooms[user_id]
 
-    async def send_personal_message(self, message: str, user_id: int):
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]
-            try:
-                await websocket.send_text(message)
-                return True
-            except:
-                self.disconnect(user_id)
-                return False
-        return False
+    async def send_frame(self, user_id: int, frame: str) -> bool:
+        """Envio direto no socket (usado pelo delivery_bus)"""
+        websocket = self.active_connections.get(user_id)
+        if websocket is None:
+            return False
+
+        try:
+            await websocket.send_text(frame)
+            return True
+        except:
+            self.disconnect(user_id)
+            return False
+
+    async def send_personal_message(self, message: str, user_id: int) -> bool:
+        # Publicado no barramento: eventos da mesma volta do loop saem em um frame
+        # Retorna True apenas depois que o frame foi escrito no socket
+        return await delivery_bus.deliver(user_id, message)
 
     async def broadcast_to_room(self, message: str, room: str, exclude_user: Optional[int] = None):
-        disconnected_users = []
-        for user_id, websocket in self.active_connections.items():
+        for user_id in list(self.active_connections):
             if self.user_rooms.get(user_id) == room and user_id != exclude_user:
-                try:
-                    await websocket.send_text(message)
-                except:
-                    disconnected_users.append(user_id)
-
-        # Limpar conexões desconectadas
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+                delivery_bus.publish(user_id, message)
 
     async def broadcast_user_status(self, user_id: int, is_online: bool, exclude_user: Optional[int] = None):
         message = json.dumps({
@@ -75,37 +80,27 @@ class ConnectionManager:
         })
 
         # Broadcast para todos os usuários conectados
-        disconnected_users = []
-        for connected_user_id, websocket in self.active_connections.items():
+        for connected_user_id in list(self.active_connections):
             if connected_user_id != exclude_user:
-                try:
-                    await websocket.send_text(message)
-                except:
-                    disconnected_users.append(connected_user_id)
-
-        for user_id in disconnected_users:
-            self.disconnect(user_id)
+                delivery_bus.publish(connected_user_id, message)
 
     def get_online_users(self) -> List[int]:
         return list(self.active_connections.keys())
 
+    async def close_all(self, code: int = 1001):
+        """Encerra todas as conexões (desligamento da aplicação)"""
+        for user_id, websocket in list(self.active_connections.items()):
+            try:
+                await websocket.close(code=code)
+            except Exception:
+                pass
+            self.disconnect(user_id)
 
-# Instância global do gerenciador
-manager = ConnectionManager()
-
-
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
 
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
-    )
+# Instância global do gerenciador; chat e notificações entregam pelo mesmo barramento
+manager = ConnectionManager()
+delivery_bus.attach(manager)
+notification_manager.set_websocket_manager(manager)
 
 
 def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -197,7 +192,9 @@ async def handle_chat_message(message_data: dict, sender_id: int, sender_usernam
                        ))
 
         result = cursor.fetchone()
+        activity = record_activity(cursor, sender_id, "message_sent", "message", result[0], result[1], [result[3]])
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nome do remetente
         cursor.execute("SELECT full_name FROM users WHERE id = %s", (sender_id,))
@@ -221,11 +218,15 @@ async def handle_chat_message(message_data: dict, sender_id: int, sender_usernam
 
         # Enviar mensagem
         if message_data.get("receiver_id"):
-            # Mensagem privada
-            await manager.send_personal_message(
+            # Mensagem privada; destinatário offline recebe notificação (agrupada)
+            delivered = await manager.send_personal_message(
                 json.dumps(broadcast_message),
                 message_data.get("receiver_id")
             )
+            if not delivered:
+                await notify_new_message(
+                    message_data.get("receiver_id"), sender_name, result[1], sender_id=sender_id
+                )
             # Confirmar para o remetente
             await manager.send_personal_message(
                 json.dumps(broadcast_message),
@@ -275,6 +276,36 @@ async def handle_join_room(message_data: dict, user_id: int):
     manager.user_rooms[user_id] = room
 
 
+def build_message_visibility_filter(current_user: dict, receiver_id: Optional[int] = None):
+    """
+    Monta as condições de visibilidade de mensagens para o usuário atual
+    Retorna (condições, parâmetros) para compor a cláusula WHERE
+    """
+    user_id = current_user.get("user_id")
+    where_conditions = []
+    params = []
+
+    if receiver_id:
+        # Mensagens privadas entre dois usuários
+        where_conditions.append("""
+            ((sender_id = %s AND receiver_id = %s) OR 
+             (sender_id = %s AND receiver_id = %s))
+        """)
+        params.extend([user_id, receiver_id, receiver_id, user_id])
+    else:
+        # Mensagens públicas ou recebidas pelo usuário
+        if has_permission(current_user.get("access_level"), Permission.VIEW_ALL_MESSAGES):
+            # Master pode ver todas as mensagens
+            pass
+        else:
+            where_conditions.append("""
+                (receiver_id IS NULL OR receiver_id = %s OR sender_id = %s)
+            """)
+            params.extend([user_id, user_id])
+
+    return where_conditions, params
+
+
 @router.get("/", response_model=MessageListResponse)
 async def list_messages(
         page: int = Query(1, ge=1),
@@ -290,26 +321,7 @@ async def list_messages(
 
     try:
         user_id = current_user.get("user_id")
-        where_conditions = []
-        params = []
-
-        if receiver_id:
-            # Mensagens privadas entre dois usuários
-            where_conditions.append("""
-                ((sender_id = %s AND receiver_id = %s) OR 
-                 (sender_id = %s AND receiver_id = %s))
-            """)
-            params.extend([user_id, receiver_id, receiver_id, user_id])
-        else:
-            # Mensagens públicas ou recebidas pelo usuário
-            if has_permission(current_user.get("access_level"), Permission.VIEW_ALL_MESSAGES):
-                # Master pode ver todas as mensagens
-                pass
-            else:
-                where_conditions.append("""
-                    (receiver_id IS NULL OR receiver_id = %s OR sender_id = %s)
-                """)
-                params.extend([user_id, user_id])
+        where_conditions, params = build_message_visibility_filter(current_user, receiver_id)
 
         if only_unread:
             where_conditions.append("is_read = FALSE AND receiver_id = %s")
@@ -379,6 +391,109 @@ async def list_messages(
         conn.close()
 
 
+@router.get("/search", response_model=MessageSearchResponse)
+async def search_messages(
+        q: str = Query(..., min_length=1, max_length=200, description="Termos de busca"),
+        receiver_id: Optional[int] = Query(None, description="Restringe a busca à conversa com este usuário"),
+        sort: str = Query("relevance", pattern="^(relevance|recent)$", description="relevance ou recent"),
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Cursor retornado pela página anterior"),
+        current_user=Depends(get_current_user_from_token)
+):
+    """Busca textual no histórico de mensagens (índice GIN sobre tsvector)"""
+
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        where_conditions, params = build_message_visibility_filter(current_user, receiver_id)
+        where_conditions.insert(0, "m.search_vector @@ q.query")
+        params.insert(0, q)
+
+        # A chave de ordenação é calculada dentro do CTE para que o cursor
+        # compare exatamente o mesmo valor usado no ORDER BY (float8, pois o
+        # real de ts_rank_cd não sobrevive à ida e volta pelo JSON do cursor)
+        if sort == "relevance":
+            sort_key = "ts_rank_cd(m.search_vector, q.query)::float8"
+        else:
+            sort_key = "m.created_at"
+
+        cursor_conditions = []
+        cursor_params = []
+        position = decode_cursor(cursor)
+        if position:
+            if position.get("sort") != sort or "key" not in position or "id" not in position:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor inválido"
+                )
+            cursor_conditions.append("(h.sort_key, h.id) < (%s, %s)")
+            cursor_params.extend([position["key"], position["id"]])
+
+        cursor_clause = "WHERE " + " AND ".join(cursor_conditions) if cursor_conditions else ""
+
+        db_cursor.execute(f"""
+            WITH q AS (
+                SELECT websearch_to_tsquery('{SEARCH_LANGUAGE}', %s) AS query
+            ),
+            hits AS (
+                SELECT m.id, {sort_key} AS sort_key,
+                       ts_rank_cd(m.search_vector, q.query) AS rank
+                FROM messages m, q
+                WHERE {" AND ".join(where_conditions)}
+            )
+            SELECT h.id, h.sort_key, h.rank,
+                   m.content, m.sender_id, m.receiver_id, m.message_type,
+                   m.is_read, m.is_edited, m.created_at, m.updated_at,
+                   u.full_name as sender_name, u.username as sender_username,
+                   ts_headline('{SEARCH_LANGUAGE}', m.content, q.query, %s) AS highlight
+            FROM hits h
+            JOIN messages m ON m.id = h.id
+            LEFT JOIN users u ON m.sender_id = u.id
+            CROSS JOIN q
+            {cursor_clause}
+            ORDER BY h.sort_key DESC, h.id DESC
+            LIMIT %s
+        """, params + [HEADLINE_OPTIONS] + cursor_params + [limit + 1])
+
+        rows = db_cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        results = []
+        for row in rows:
+            results.append(MessageSearchHit(
+                id=row[0],
+                rank=float(row[2]),
+                content=row[3],
+                sender_id=row[4],
+                receiver_id=row[5],
+                message_type=row[6],
+                is_read=row[7],
+                is_edited=row[8],
+                created_at=row[9],
+                updated_at=row[10],
+                sender_name=row[11],
+                sender_username=row[12],
+                highlight=row[13]
+            ))
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            sort_value = float(last[1]) if sort == "relevance" else last[1].isoformat()
+            next_cursor = encode_cursor({"sort": sort, "key": sort_value, "id": last[0]})
+
+        return MessageSearchResponse(
+            results=results,
+            next_cursor=next_cursor
+        )
+
+    finally:
+        db_cursor.close()
+        conn.close()
+
+
 @router.post("/", response_model=MessageResponse)
 async def create_message(
         message_data: MessageCreate,
@@ -415,7 +530,11 @@ async def create_message(
                        ))
 
         result = cursor.fetchone()
+        activity = record_activity(
+            cursor, current_user.get("user_id"), "message_sent", "message", result[0], result[1], [result[3]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nome do remetente
         cursor.execute("SELECT full_name, username FROM users WHERE id = %s",
@@ -441,14 +560,21 @@ async def create_message(
         # Enviar via WebSocket se possível
         broadcast_message = {
             "type": "new_message",
-            "message": message_response.dict()
+            "message": json.loads(message_response.json())
         }
 
         if message_data.receiver_id:
-            await manager.send_personal_message(
+            delivered = await manager.send_personal_message(
                 json.dumps(broadcast_message),
                 message_data.receiver_id
             )
+            if not delivered:
+                await notify_new_message(
+                    message_data.receiver_id,
+                    sender_info[0] if sender_info else "Usuário",
+                    message_response.content,
+                    sender_id=current_user.get("user_id")
+                )
         else:
             await manager.broadcast_to_room(
                 json.dumps(broadcast_message),
@@ -505,6 +631,7 @@ async def update_message(
                        """, (message_data.content, message_id))
 
         result = cursor.fetchone()
+        refresh_activity_summary(cursor, "message", message_id, result[1])
         conn.commit()
 
         # Buscar nome do remetente
@@ -531,7 +658,7 @@ async def update_message(
         # Notificar via WebSocket
         broadcast_message = {
             "type": "message_updated",
-            "message": message_response.dict()
+            "message": json.loads(message_response.json())
         }
 
         if message[1]:  # mensagem privada
@@ -690,6 +817,7 @@ async def delete_message(
             )
 
         cursor.execute("DELETE FROM messages WHERE id = %s", (message_id,))
+        forget_activity(cursor, "message", message_id)
         conn.commit()
 
         # Notificar via WebSocket
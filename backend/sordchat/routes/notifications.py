@@ -7,8 +7,14 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 
+from ..config.settings import load_environment
+from ..utils.db_pool import get_db_connection
+from ..utils.delivery import delivery_bus
 from ..utils.notifications import (
     notification_manager,
+    notification_retention,
+    notification_digest,
+    push_queue,
     notify_new_ticket,
     notify_ticket_assigned,
     notify_task_completed,
@@ -33,10 +39,42 @@ except ImportError:
         except jwt.PyJWTError:
             return None
 
+load_environment()
+
 router = APIRouter(prefix="/notifications", tags=["🔔 Notificações"])
 security = HTTPBearer()
 
 
+def get_broadcast_recipients(department: Optional[str] = None, access_level: Optional[str] = None) -> List[int]:
+    """Ids dos usuários ativos, opcionalmente filtrados por departamento e nível"""
+    where_conditions = ["is_active = TRUE"]
+    params = []
+
+    if department:
+        where_conditions.append("department = %s")
+        params.append(department)
+
+    if access_level:
+        # O enum é gravado com o nome em maiúsculas
+        where_conditions.append("lower(access_level::text) = lower(%s)")
+        params.append(access_level)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT id FROM users
+            WHERE {" AND ".join(where_conditions)}
+            ORDER BY id
+        """, params)
+        return [row[0] for row in cursor.fetchall()]
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Obtém usuário atual do token"""
     token = credentials.credentials
@@ -62,6 +100,7 @@ class NotificationCreate(BaseModel):
 class PushSubscription(BaseModel):
     endpoint: str
     keys: Dict[str, str]
+    digest_only: bool = False  # offline: apenas resumos periódicos em vez de um push por evento
 
 
 @router.get("/")
@@ -246,44 +285,116 @@ async def test_message_notification(current_user=Depends(get_current_user_from_t
     return {"message": "Notificação de mensagem enviada"}
 
 
-@router.post("/broadcast")
+@router.post("/broadcast", status_code=status.HTTP_202_ACCEPTED)
 async def broadcast_notification(
         notification_data: NotificationCreate,
+        department: Optional[str] = None,
+        access_level: Optional[str] = None,
         current_user=Depends(get_current_user_from_token)
 ):
-    """📢 Enviar notificação para todos os usuários (apenas admin)"""
+    """📢 Enviar notificação para todos os usuários ativos (apenas admin)"""
 
-    access_level = current_user.get("access_level")
-
-    if access_level != "master":
+    if current_user.get("access_level") != "master":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Apenas administradores podem enviar broadcasts"
         )
 
-    # Simular envio para todos os usuários (IDs 1, 2, 3)
-    user_ids = [1, 2, 3]
-    sent_count = 0
+    user_ids = get_broadcast_recipients(department, access_level)
 
-    for user_id in user_ids:
-        try:
-            await notification_manager.create_notification(
-                user_id=user_id,
-                title=f"📢 {notification_data.title}",
-                message=notification_data.message,
-                notification_type=notification_data.type,
-                data=notification_data.data
-            )
-            sent_count += 1
-        except Exception as e:
-            print(f"Erro ao enviar para usuário {user_id}: {e}")
+    # Gravação e entrega em segundo plano; o progresso fica em /broadcast/{job_id}
+    job = notification_manager.start_broadcast(
+        user_ids,
+        title=f"📢 {notification_data.title}",
+        message=notification_data.message,
+        notification_type=notification_data.type,
+        data=notification_data.data,
+        created_by=current_user.get("user_id")
+    )
+
+    return {
+        "message": f"Broadcast iniciado para {len(user_ids)} usuários",
+        "job_id": job["id"],
+        "total": job["total"],
+        "status_url": f"/notifications/broadcast/{job['id']}"
+    }
+
+
+@router.get("/broadcast/{job_id}")
+async def get_broadcast_status(job_id: str, current_user=Depends(get_current_user_from_token)):
+    """📢 Progresso de um broadcast (apenas admin)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+
+    job = notification_manager.get_broadcast_job(job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast não encontrado")
+
+    return job
+
+
+@router.get("/digest")
+async def get_notification_digest(current_user=Depends(get_current_user_from_token)):
+    """📬 Prévia do próximo resumo de notificações não lidas"""
+
+    digest = notification_digest.build_digest(current_user.get("user_id"))
+    return digest or {"count": 0, "events": 0, "by_type": {}, "highlights": []}
+
+
+@router.post("/digest/run")
+async def run_notification_digest(current_user=Depends(get_current_user_from_token)):
+    """📬 Envia agora os resumos para usuários offline (apenas admin)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+
+    return await notification_digest.run()
+
+
+@router.get("/push/stats")
+async def get_push_stats(current_user=Depends(get_current_user_from_token)):
+    """🔔 Fila de push: pendências, tentativas e dead-letter (apenas admin)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
 
     return {
-        "message": f"Broadcast enviado para {sent_count} usuários",
-        "sent_count": sent_count
+        **push_queue.get_metrics(),
+        "recent_dead_letters": push_queue.get_dead_letters(limit=20)
     }
 
 
+@router.get("/delivery/stats")
+async def get_delivery_stats(current_user=Depends(get_current_user_from_token)):
+    """📡 Entrega em tempo real: frames, lotes e latência (admin vê todos os usuários)"""
+
+    if current_user.get("access_level") != "master":
+        return delivery_bus.get_metrics(current_user.get("user_id"))
+
+    return delivery_bus.get_metrics()
+
+
+@router.get("/retention")
+async def get_retention_stats(current_user=Depends(get_current_user_from_token)):
+    """🧹 Estado da limpeza de notificações (apenas admin)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+
+    return notification_retention.get_metrics()
+
+
+@router.post("/maintenance/retention")
+async def run_notification_retention(current_user=Depends(get_current_user_from_token)):
+    """🧹 Executa agora uma passada de expiração e limite (apenas admin)"""
+
+    if current_user.get("access_level") != "master":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+
+    return await notification_retention.run_pass()
+
+
 @router.get("/stats")
 async def get_notification_stats(current_user=Depends(get_current_user_from_token)):
     """📊 Estatísticas de notificações"""
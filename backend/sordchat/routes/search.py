@@ -0,0 +1,230 @@
+"""
+Busca unificada de tickets e tasks
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
+
+from ..config.settings import load_environment
+from ..schemas.search import SearchHit, SearchFacets, AssigneeFacet, SearchResponse
+from ..utils.db_pool import get_db_connection
+from ..utils.auth import verify_token
+from ..utils.permissions import (
+    Permission,
+    has_permission,
+    ticket_visibility_filter,
+    task_visibility_filter
+)
+from ..utils.pagination import encode_cursor, decode_cursor
+from ..utils.search import SEARCH_LANGUAGE, HEADLINE_OPTIONS
+
+load_environment()
+
+router = APIRouter(prefix="/search", tags=["Busca"])
+security = HTTPBearer()
+
+ENTITY_TYPES = ("ticket", "task")
+
+
+def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Obtém usuário atual do token"""
+    token = credentials.credentials
+    payload = verify_token(token)
+
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
+
+    return payload
+
+
+def build_document_visibility_filter(cursor, current_user: dict, entity_types):
+    """
+    Combina as regras de visibilidade de tickets e de tasks sobre search_documents
+    Retorna (condição, parâmetros)
+    """
+    user_id = current_user.get("user_id")
+    access_level = current_user.get("access_level")
+
+    clauses = []
+    params = []
+
+    if "ticket" in entity_types:
+        conditions, ticket_params = ticket_visibility_filter(current_user, alias="d")
+        clauses.append("(d.entity_type = 'ticket' AND " + " AND ".join(conditions or ["TRUE"]) + ")")
+        params.extend(ticket_params)
+
+    if "task" in entity_types:
+        department = None
+        if (not has_permission(access_level, Permission.VIEW_ALL_TASKS) and
+                has_permission(access_level, Permission.VIEW_DEPARTMENT_TASKS)):
+            cursor.execute("SELECT department FROM users WHERE id = %s", (user_id,))
+            user_dept = cursor.fetchone()
+            department = user_dept[0] if user_dept else None
+
+        conditions, task_params = task_visibility_filter(current_user, department, alias="d")
+        clauses.append("(d.entity_type = 'task' AND " + " AND ".join(conditions or ["TRUE"]) + ")")
+        params.extend(task_params)
+
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+@router.get("/", response_model=SearchResponse)
+async def search(
+        q: str = Query(..., min_length=1, max_length=200, description="Termos de busca"),
+        types: Optional[str] = Query(None, description="ticket, task ou ticket,task"),
+        status_filter: Optional[str] = Query(None, description="Status do ticket ou da task"),
+        priority: Optional[str] = Query(None, description="Prioridade do ticket ou urgência da task"),
+        assigned_to_id: Optional[int] = Query(None),
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description="Cursor retornado pela página anterior"),
+        current_user=Depends(get_current_user_from_token)
+):
+    """Busca textual em tickets e tasks com facetas por status, prioridade e responsável"""
+
+    entity_types = ENTITY_TYPES
+    if types:
+        entity_types = tuple(t.strip() for t in types.split(",") if t.strip())
+        if not entity_types or any(t not in ENTITY_TYPES for t in entity_types):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Tipos válidos: ticket, task"
+            )
+
+    position = decode_cursor(cursor)
+    if position and not all(key in position for key in ("rank", "type", "id")):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+    conn = get_db_connection()
+    db_cursor = conn.cursor()
+
+    try:
+        visibility_clause, visibility_params = build_document_visibility_filter(
+            db_cursor, current_user, entity_types
+        )
+
+        where_conditions = ["d.search_vector @@ q.query", visibility_clause]
+        params = list(visibility_params)
+
+        # Aplicar filtros adicionais
+        if status_filter:
+            where_conditions.append("d.status = %s")
+            params.append(status_filter)
+
+        if priority:
+            where_conditions.append("d.priority = %s")
+            params.append(priority)
+
+        if assigned_to_id:
+            where_conditions.append("d.assigned_to_id = %s")
+            params.append(assigned_to_id)
+
+        where_clause = " AND ".join(where_conditions)
+
+        # Facetas e total em uma única passada sobre os documentos encontrados
+        db_cursor.execute(f"""
+            WITH q AS (
+                SELECT websearch_to_tsquery('{SEARCH_LANGUAGE}', %s) AS query
+            )
+            SELECT d.entity_type, d.status, d.priority, d.assigned_to_id, u.full_name,
+                   COUNT(*),
+                   GROUPING(d.entity_type), GROUPING(d.status),
+                   GROUPING(d.priority), GROUPING(d.assigned_to_id)
+            FROM search_documents d
+            CROSS JOIN q
+            LEFT JOIN users u ON d.assigned_to_id = u.id
+            WHERE {where_clause}
+            GROUP BY GROUPING SETS (
+                (d.entity_type), (d.status), (d.priority), (d.assigned_to_id, u.full_name), ()
+            )
+        """, [q] + params)
+
+        facets = SearchFacets()
+        total = 0
+        for row in db_cursor.fetchall():
+            count = row[5]
+            if not row[6]:
+                facets.entity_type[row[0]] = count
+            elif not row[7]:
+                facets.status[row[1] or "sem_status"] = count
+            elif not row[8]:
+                facets.priority[row[2] or "sem_prioridade"] = count
+            elif not row[9]:
+                facets.assigned_to.append(AssigneeFacet(id=row[3], name=row[4], count=count))
+            else:
+                total = count
+
+        facets.assigned_to.sort(key=lambda facet: facet.count, reverse=True)
+
+        cursor_clause = ""
+        cursor_params = []
+        if position:
+            cursor_clause = "WHERE (h.rank, h.entity_type, h.entity_id) < (%s, %s, %s)"
+            cursor_params = [position["rank"], position["type"], position["id"]]
+
+        db_cursor.execute(f"""
+            WITH q AS (
+                SELECT websearch_to_tsquery('{SEARCH_LANGUAGE}', %s) AS query
+            ),
+            hits AS (
+                SELECT d.entity_type, d.entity_id,
+                       ts_rank_cd(d.search_vector, q.query)::float8 AS rank
+                FROM search_documents d, q
+                WHERE {where_clause}
+            )
+            SELECT h.entity_type, h.entity_id, h.rank,
+                   d.title, d.status, d.priority, d.created_by_id, d.assigned_to_id,
+                   d.created_at, d.updated_at,
+                   u.full_name as assigned_to_name,
+                   ts_headline('{SEARCH_LANGUAGE}', coalesce(d.body, d.title), q.query, %s) AS highlight
+            FROM hits h
+            JOIN search_documents d ON d.entity_type = h.entity_type AND d.entity_id = h.entity_id
+            LEFT JOIN users u ON d.assigned_to_id = u.id
+            CROSS JOIN q
+            {cursor_clause}
+            ORDER BY h.rank DESC, h.entity_type DESC, h.entity_id DESC
+            LIMIT %s
+        """, [q] + params + [HEADLINE_OPTIONS] + cursor_params + [limit + 1])
+
+        rows = db_cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        results = []
+        for row in rows:
+            results.append(SearchHit(
+                entity_type=row[0],
+                id=row[1],
+                rank=float(row[2]),
+                title=row[3],
+                status=row[4],
+                priority=row[5],
+                created_by_id=row[6],
+                assigned_to_id=row[7],
+                created_at=row[8],
+                updated_at=row[9],
+                assigned_to_name=row[10],
+                highlight=row[11]
+            ))
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = encode_cursor({"rank": float(last[2]), "type": last[0], "id": last[1]})
+
+        return SearchResponse(
+            results=results,
+            facets=facets,
+            total=total,
+            next_cursor=next_cursor
+        )
+
+    finally:
+        db_cursor.close()
+        conn.close()
@@ -5,35 +5,21 @@ Rotas CRUD para tasks
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional, Dict, Any
-import psycopg2
-from urllib.parse import urlparse
-import os
 import json
 from datetime import datetime
-from dotenv import load_dotenv
 
-from ..schemas.task import TaskCreate, TaskUpdate, TaskComment, TaskResponse
+from ..config.settings import load_environment
+from ..schemas.tasks import TaskCreate, TaskUpdate, TaskComment, TaskResponse
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_token
-from ..utils.permissions import require_permission, Permission, has_permission
+from ..utils.permissions import require_permission, Permission, has_permission, task_visibility_filter
+from ..utils.activity_log import record_activity, publish_activity
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/tasks", tags=["Tasks"])
 security = HTTPBearer()
 
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
-
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
-    )
-
 def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Obtém usuário atual do token"""
     token = credentials.credentials
@@ -61,41 +47,18 @@ async def list_tasks(
     cursor = conn.cursor()
 
     try:
-        # Construir query baseada em permissões
-        where_conditions = []
-        params = []
-
         user_id = current_user.get("user_id")
         access_level = current_user.get("access_level")
 
         # Filtros de visibilidade baseados em permissões
-        if has_permission(access_level, Permission.VIEW_ALL_TASKS):
-            # Master pode ver todas as tasks
-            pass
-        elif has_permission(access_level, Permission.VIEW_DEPARTMENT_TASKS):
-            # Coordenador vê tasks do departamento + públicas
+        department = None
+        if (not has_permission(access_level, Permission.VIEW_ALL_TASKS) and
+                has_permission(access_level, Permission.VIEW_DEPARTMENT_TASKS)):
             cursor.execute("SELECT department FROM users WHERE id = %s", (user_id,))
             user_dept = cursor.fetchone()
-            if user_dept and user_dept[0]:
-                where_conditions.append("""
-                    (t.visibility = 'todos' OR 
-                     (t.visibility = 'departamento' AND 
-                      (t.created_by_id IN (SELECT id FROM users WHERE department = %s) OR
-                       t.assigned_to_id = %s)) OR
-                     t.created_by_id = %s OR t.assigned_to_id = %s)
-                """)
-                params.extend([user_dept[0], user_id, user_id, user_id])
-            else:
-                # Se não tem departamento, só vê suas próprias tasks
-                where_conditions.append("(t.created_by_id = %s OR t.assigned_to_id = %s)")
-                params.extend([user_id, user_id])
-        else:
-            # Usuário padrão vê apenas suas tasks + públicas atribuídas a ele
-            where_conditions.append("""
-                (t.created_by_id = %s OR 
-                 (t.assigned_to_id = %s AND t.visibility = 'todos'))
-            """)
-            params.extend([user_id, user_id])
+            department = user_dept[0] if user_dept else None
+
+        where_conditions, params = task_visibility_filter(current_user, department, alias="t")
 
         # Aplicar filtros adicionais
         if status_filter:
@@ -212,7 +175,11 @@ async def create_task(
         ))
 
         result = cursor.fetchone()
+        activity = record_activity(
+            cursor, current_user.get("user_id"), "task_created", "task", result[0], result[1], [result[7]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nomes dos usuários
         cursor.execute("""
@@ -459,7 +426,12 @@ async def update_task(
         """, params)
 
         result = cursor.fetchone()
+        event = "task_completed" if task_data.status == "concluida" else "task_updated"
+        activity = record_activity(
+            cursor, user_id, event, "task", result[0], result[1], [result[6], result[7], task[1]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nomes dos usuários
         cursor.execute("""
@@ -548,7 +520,12 @@ async def add_comment(
             WHERE id = %s
         """, (json.dumps(current_comments), task_id))
 
+        activity = record_activity(
+            cursor, current_user.get("user_id"), "task_commented", "task", task_id,
+            comment_data.content, [task[0], task[1]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         return {"message": "Comentário adicionado com sucesso", "comment": new_comment}
 
@@ -5,33 +5,19 @@ Rotas CRUD para tickets
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional
-import psycopg2
-from urllib.parse import urlparse
-import os
-from dotenv import load_dotenv
 
+from ..config.settings import load_environment
 from ..schemas.ticket import TicketCreate, TicketUpdate, TicketResponse, TicketListResponse
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_token
-from ..utils.permissions import require_permission, Permission, has_permission
+from ..utils.permissions import require_permission, Permission, has_permission, ticket_visibility_filter
+from ..utils.activity_log import record_activity, publish_activity, forget_activity
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 security = HTTPBearer()
 
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
-
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
-    )
-
 def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Obtém usuário atual do token"""
     token = credentials.credentials
@@ -62,18 +48,7 @@ async def list_tickets(
 
     try:
         # Construir query com filtros baseados em permissões
-        where_conditions = []
-        params = []
-
-        # Verificar permissões para visualização
-        if has_permission(current_user.get("access_level"), Permission.VIEW_ALL_TICKETS):
-            # Master e Coordenador podem ver todos os tickets
-            pass
-        else:
-            # Usuário padrão só vê seus próprios tickets
-            where_conditions.append("(created_by_id = %s OR assigned_to_id = %s)")
-            user_id = current_user.get("user_id")
-            params.extend([user_id, user_id])
+        where_conditions, params = ticket_visibility_filter(current_user, alias="t")
 
         # Aplicar filtros adicionais
         if status_filter:
@@ -187,7 +162,11 @@ async def create_ticket(
         ))
 
         result = cursor.fetchone()
+        activity = record_activity(
+            cursor, current_user.get("user_id"), "ticket_created", "ticket", result[0], result[1], [result[6]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nomes dos usuários
         cursor.execute("""
@@ -378,7 +357,12 @@ async def update_ticket(
         """, params)
 
         result = cursor.fetchone()
+        event = "ticket_closed" if ticket_data.status == "encerrado" else "ticket_updated"
+        activity = record_activity(
+            cursor, user_id, event, "ticket", result[0], result[1], [result[5], result[6], ticket[1]]
+        )
         conn.commit()
+        publish_activity(activity)
 
         # Buscar nomes dos usuários
         cursor.execute("""
@@ -432,6 +416,7 @@ async def delete_ticket(
                 detail="Ticket não encontrado"
             )
 
+        forget_activity(cursor, "ticket", ticket_id)
         conn.commit()
 
         return {"message": "Ticket excluído com sucesso"}
@@ -6,32 +6,57 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional
 import psycopg2
-from urllib.parse import urlparse
-import os
-from dotenv import load_dotenv
 
-from ..schemas.user import UserCreate, UserUpdate, UserPasswordUpdate, UserListResponse
+from ..config.settings import load_environment
+from ..schemas.user import (
+    UserCreate, UserUpdate, UserPasswordUpdate, UserListResponse, UserAutocompleteResponse
+)
 from ..schemas.auth import UserResponse
+from ..utils.db_pool import get_db_connection
 from ..utils.auth import verify_token, get_password_hash, verify_password
 from ..utils.permissions import require_permission, Permission
+from ..utils.search import escape_like
 
-load_dotenv()
+load_environment()
 
 router = APIRouter(prefix="/users", tags=["Usuários"])
 security = HTTPBearer()
 
-
-def get_db_connection():
-    """Obtém conexão com o banco de dados"""
-    database_url = os.getenv("DATABASE_URL")
-    parsed = urlparse(database_url)
-
-    return psycopg2.connect(
-        host=parsed.hostname,
-        database=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-        port=parsed.port or 5432
+AUTOCOMPLETE_MIN_LENGTH = 2  # abaixo disso o padrão casa com quase todos os usuários
+
+# Prefixo primeiro, depois similaridade; todas as condições do WHERE são
+# atendidas pelos índices GIN de trigramas (ver benchmark_autocomplete.py)
+AUTOCOMPLETE_SQL = """
+                   SELECT id,
+                          username,
+                          full_name,
+                          department,
+                          is_online,
+                          (username ILIKE %s OR full_name ILIKE %s OR full_name ILIKE %s) AS is_prefix,
+                          GREATEST(similarity(username, %s), word_similarity(%s, full_name)) AS score
+                   FROM users
+                   WHERE is_active = TRUE
+                     AND (username ILIKE %s
+                      OR full_name ILIKE %s
+                      OR full_name ILIKE %s
+                      OR username %% %s
+                      OR %s <%% full_name)
+                   ORDER BY is_prefix DESC, score DESC, full_name
+                   LIMIT %s
+                   """
+
+
+def autocomplete_params(term: str, limit: int) -> tuple:
+    """Parâmetros de AUTOCOMPLETE_SQL para um termo já sem espaços nas pontas"""
+    prefix_param = f"{escape_like(term)}%"
+    word_prefix_param = f"% {escape_like(term)}%"
+
+    return (
+        prefix_param, prefix_param, word_prefix_param,
+        term, term,
+        prefix_param, prefix_param, word_prefix_param,
+        term, term,
+        limit
     )
 
 
@@ -72,7 +97,7 @@ async def list_users(
 
         if search:
             where_conditions.append("(full_name ILIKE %s OR username ILIKE %s OR email ILIKE %s)")
-            search_param = f"%{search}%"
+            search_param = f"%{escape_like(search)}%"
             params.extend([search_param, search_param, search_param])
 
         if department:
@@ -188,6 +213,42 @@ async def create_user(
         conn.close()
 
 
+@router.get("/autocomplete", response_model=List[UserAutocompleteResponse])
+async def autocomplete_users(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(10, ge=1, le=50),
+        current_user=Depends(get_current_user_from_token)
+):
+    """Sugestões de usuários para o seletor (prefixo primeiro, depois similaridade)"""
+
+    # min_length da Query vale antes do strip: "   " viraria o padrão "%"
+    term = q.strip()
+    if len(term) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(AUTOCOMPLETE_SQL, autocomplete_params(term, limit))
+
+        return [
+            UserAutocompleteResponse(
+                id=row[0],
+                username=row[1],
+                full_name=row[2],
+                department=row[3],
+                is_online=row[4],
+                score=1.0 if row[5] else round(float(row[6] or 0), 3)
+            )
+            for row in cursor.fetchall()
+        ]
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
         user_id: int,
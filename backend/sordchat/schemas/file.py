@@ -0,0 +1,26 @@
+"""
+Schemas para sessões de upload retomável
+"""
+
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+
+class UploadSessionCreate(BaseModel):
+    """Schema para abertura de sessão de upload"""
+    filename: str
+    size: int
+    category: Optional[str] = None
+    description: Optional[str] = None
+
+
+class UploadSessionResponse(BaseModel):
+    """Schema para estado da sessão de upload"""
+    id: str
+    original_name: str
+    category: str
+    total_size: int
+    received_bytes: int
+    chunk_size: int
+    expires_at: datetime
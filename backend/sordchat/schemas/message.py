@@ -49,6 +49,29 @@ class MessageListResponse(BaseModel):
     total: int
     unread_count: int
 
+class MessageSearchHit(BaseModel):
+    """Schema para resultado de busca de mensagens"""
+    id: int
+    content: str
+    highlight: str  # trecho com os termos marcados em <mark>
+    rank: float
+    sender_id: int
+    receiver_id: Optional[int]
+    message_type: str
+    is_read: bool
+    is_edited: bool
+    created_at: datetime
+    updated_at: Optional[datetime]
+
+    # Informações do remetente
+    sender_name: Optional[str] = None
+    sender_username: Optional[str] = None
+
+class MessageSearchResponse(BaseModel):
+    """Schema para página de resultados da busca"""
+    results: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
 class ChatRoom(BaseModel):
     """Schema para sala de chat"""
     name: str
@@ -0,0 +1,46 @@
+"""
+Schemas para busca unificada de tickets e tasks
+"""
+
+from pydantic import BaseModel
+from typing import Optional, List, Dict
+from datetime import datetime
+
+
+class SearchHit(BaseModel):
+    """Schema para um resultado da busca"""
+    entity_type: str  # ticket, task
+    id: int
+    title: str
+    highlight: str  # trecho com os termos marcados em <mark>
+    rank: float
+    status: Optional[str]
+    priority: Optional[str]  # prioridade do ticket ou urgência da task
+    created_by_id: Optional[int]
+    assigned_to_id: Optional[int]
+    assigned_to_name: Optional[str] = None
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+class AssigneeFacet(BaseModel):
+    """Schema para contagem por responsável"""
+    id: Optional[int]
+    name: Optional[str] = None
+    count: int
+
+
+class SearchFacets(BaseModel):
+    """Schema para contagens por faceta"""
+    entity_type: Dict[str, int] = {}
+    status: Dict[str, int] = {}
+    priority: Dict[str, int] = {}
+    assigned_to: List[AssigneeFacet] = []
+
+
+class SearchResponse(BaseModel):
+    """Schema para página de resultados da busca"""
+    results: List[SearchHit]
+    facets: SearchFacets
+    total: int
+    next_cursor: Optional[str] = None
@@ -41,4 +41,13 @@ class UserListResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class UserAutocompleteResponse(BaseModel):
+    """Schema para sugestão de usuário no autocomplete"""
+    id: int
+    username: str
+    full_name: str
+    department: Optional[str]
+    is_online: bool
+    score: float  # 1.0 para correspondência por prefixo
@@ -0,0 +1,311 @@
+"""
+Log de atividades (append-only) usado no feed de atividade recente
+
+As rotas de tickets, tasks e mensagens gravam um evento compacto por usuário
+envolvido (autor e afetados) na mesma transação da alteração; o feed é uma
+leitura por faixa do índice (user_id, created_at, id)
+"""
+
+import json
+import asyncio
+from typing import Dict, List, Optional, Any, Iterable
+
+from psycopg2.extras import execute_values
+
+from .db_pool import get_db_connection
+from .delivery import delivery_bus
+
+ACTIVITY_SUMMARY_MAX = 50  # caracteres guardados da descrição
+ACTIVITY_RETENTION_DAYS = 90  # eventos mais antigos saem do log
+ACTIVITY_MAX_PER_USER = 500  # eventos mantidos por usuário (o feed só lê o começo)
+ACTIVITY_RETENTION_INTERVAL = 60 * 60  # segundos entre passadas de limpeza
+ACTIVITY_PURGE_BATCH = 5000  # eventos antigos removidos por comando
+
+
+def summary_sql(column: str) -> str:
+    """Mesma regra de summarize() em SQL (carga inicial a partir das tabelas)"""
+    text = f"btrim(coalesce({column}, ''), E' \\t\\r\\n')"
+    return (f"CASE WHEN length({text}) > {ACTIVITY_SUMMARY_MAX} "
+            f"THEN left({text}, {ACTIVITY_SUMMARY_MAX}) || '...' ELSE {text} END")
+
+
+ACTIVITY_LOG_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS activity_events (
+        id          BIGSERIAL    PRIMARY KEY,
+        user_id     INTEGER      NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        actor_id    INTEGER,
+        event       VARCHAR(30)  NOT NULL,
+        entity_type VARCHAR(10)  NOT NULL,
+        entity_id   INTEGER      NOT NULL,
+        summary     VARCHAR(60)  NOT NULL,
+        created_at  TIMESTAMPTZ  NOT NULL DEFAULT now()
+    )
+    """,
+    # Feed por usuário, mais recentes primeiro; também é a chave do cursor
+    """
+    CREATE INDEX IF NOT EXISTS idx_activity_events_user_time
+        ON activity_events (user_id, created_at DESC, id DESC)
+    """,
+    # Limpeza por idade (ActivityRetention)
+    """
+    CREATE INDEX IF NOT EXISTS idx_activity_events_created
+        ON activity_events (created_at)
+    """,
+    # Eventos de um registro editado ou excluído (forget_activity / refresh_activity_summary)
+    """
+    CREATE INDEX IF NOT EXISTS idx_activity_events_entity
+        ON activity_events (entity_type, entity_id)
+    """,
+    # Bases existentes: eventos de criação a partir das tabelas (apenas com o log
+    # vazio), com os mesmos destinatários e descrição das gravações ao vivo
+    f"""
+    INSERT INTO activity_events (user_id, actor_id, event, entity_type, entity_id, summary, created_at)
+    SELECT * FROM (
+        SELECT DISTINCT ON (subject.user_id, t.id)
+               subject.user_id, t.created_by_id, 'ticket_created', 'ticket', t.id,
+               {summary_sql('t.title')}, t.created_at
+        FROM tickets t
+        CROSS JOIN LATERAL (VALUES (t.created_by_id), (t.assigned_to_id)) AS subject (user_id)
+        WHERE subject.user_id IS NOT NULL
+        UNION ALL
+        SELECT DISTINCT ON (subject.user_id, t.id)
+               subject.user_id, t.created_by_id, 'task_created', 'task', t.id,
+               {summary_sql('t.name')}, t.created_at
+        FROM tasks t
+        CROSS JOIN LATERAL (VALUES (t.created_by_id), (t.assigned_to_id)) AS subject (user_id)
+        WHERE subject.user_id IS NOT NULL
+        UNION ALL
+        SELECT DISTINCT ON (subject.user_id, m.id)
+               subject.user_id, m.sender_id, 'message_sent', 'message', m.id,
+               {summary_sql('m.content')}, m.created_at
+        FROM messages m
+        CROSS JOIN LATERAL (VALUES (m.sender_id), (m.receiver_id)) AS subject (user_id)
+        WHERE subject.user_id IS NOT NULL
+    ) existing (user_id, actor_id, event, entity_type, entity_id, summary, created_at)
+    WHERE NOT EXISTS (SELECT 1 FROM activity_events)
+      AND created_at > now() - make_interval(days => {ACTIVITY_RETENTION_DAYS})
+    """,
+]
+
+ACTIVITY_COLUMNS = ('id', 'user_id', 'actor_id', 'event', 'entity_type', 'entity_id', 'summary', 'created_at')
+
+
+def get_activity_log_schema_statements():
+    """
+    Retorna os comandos DDL do log de atividades, na ordem de execução
+    """
+    return ACTIVITY_LOG_DDL
+
+
+def summarize(text: Optional[str]) -> str:
+    """Descrição curta guardada no evento"""
+    text = (text or "").strip()
+    if len(text) > ACTIVITY_SUMMARY_MAX:
+        return text[:ACTIVITY_SUMMARY_MAX] + "..."
+    return text
+
+
+def row_to_event(row) -> Dict[str, Any]:
+    """Converte uma linha de activity_events (na ordem de ACTIVITY_COLUMNS) no formato do feed"""
+    event = dict(zip(ACTIVITY_COLUMNS, row))
+    return {
+        "id": event['id'],
+        "user_id": event['user_id'],
+        "type": event['entity_type'],
+        "event": event['event'],
+        "entity_id": event['entity_id'],
+        "actor_id": event['actor_id'],
+        "description": event['summary'],
+        "timestamp": event['created_at'].isoformat()
+    }
+
+
+def record_activity(
+        cursor,
+        actor_id: int,
+        event: str,
+        entity_type: str,
+        entity_id: int,
+        summary: Optional[str],
+        user_ids: Iterable[Optional[int]] = ()
+) -> List[Dict[str, Any]]:
+    """
+    Grava o evento para o autor e para cada usuário afetado (sem repetir)
+    Deve ser chamado antes do commit da alteração; o retorno vai para publish_activity
+    """
+    recipients = sorted({uid for uid in (actor_id, *user_ids) if uid is not None})
+    if not recipients:
+        return []
+
+    description = summarize(summary)
+    rows = execute_values(cursor, f"""
+        INSERT INTO activity_events (user_id, actor_id, event, entity_type, entity_id, summary)
+        VALUES %s
+        RETURNING {', '.join(ACTIVITY_COLUMNS)}
+    """, [
+        (user_id, actor_id, event, entity_type, entity_id, description)
+        for user_id in recipients
+    ], fetch=True)
+
+    return [row_to_event(row) for row in rows]
+
+
+def refresh_activity_summary(cursor, entity_type: str, entity_id: int, text: Optional[str]) -> int:
+    """
+    Atualiza a descrição guardada nos eventos de um registro editado
+    Deve ser chamado na mesma transação da alteração
+    """
+    cursor.execute("""
+        UPDATE activity_events SET summary = %s
+        WHERE entity_type = %s AND entity_id = %s
+    """, (summarize(text), entity_type, entity_id))
+    return cursor.rowcount
+
+
+def forget_activity(cursor, entity_type: str, entity_id: int) -> int:
+    """
+    Remove os eventos de um registro excluído, para o feed não continuar
+    exibindo o conteúdo apagado; deve ser chamado na mesma transação do DELETE
+    """
+    cursor.execute(
+        "DELETE FROM activity_events WHERE entity_type = %s AND entity_id = %s",
+        (entity_type, entity_id)
+    )
+    return cursor.rowcount
+
+
+def publish_activity(events: List[Dict[str, Any]]):
+    """Envia os eventos já gravados pelo WebSocket de cada usuário (tail ao vivo)"""
+    for event in events:
+        delivery_bus.publish(event['user_id'], json.dumps({"type": "activity", "event": event}))
+
+
+def fetch_activity(cursor, user_id: int, limit: int, position: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Eventos do usuário, mais recentes primeiro, a partir da posição do cursor
+    (created_at, id) do último item da página anterior
+    """
+    conditions = ["user_id = %s"]
+    params: List[Any] = [user_id]
+
+    if position:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend([position["timestamp"], position["id"]])
+
+    cursor.execute(f"""
+        SELECT {', '.join(ACTIVITY_COLUMNS)}
+        FROM activity_events
+        WHERE {" AND ".join(conditions)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, params + [limit])
+
+    return [row_to_event(row) for row in cursor.fetchall()]
+
+
+def purge_activity(max_per_user: int = ACTIVITY_MAX_PER_USER,
+                   retention_days: int = ACTIVITY_RETENTION_DAYS) -> Dict[str, int]:
+    """
+    Remove os eventos mais antigos que retention_days e o excedente de cada
+    usuário (mantém os mais recentes, que são os lidos pelo feed)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Antigos em lotes pela faixa do índice de created_at
+        expired = 0
+        while True:
+            cursor.execute("""
+                DELETE FROM activity_events
+                WHERE id IN (
+                    SELECT id FROM activity_events
+                    WHERE created_at < now() - make_interval(days => %s)
+                    ORDER BY created_at
+                    LIMIT %s
+                )
+            """, (retention_days, ACTIVITY_PURGE_BATCH))
+            expired += cursor.rowcount
+            conn.commit()
+            if cursor.rowcount < ACTIVITY_PURGE_BATCH:
+                break
+
+        # Excedente: apenas usuários acima do limite, pelo índice do feed
+        cursor.execute("""
+            DELETE FROM activity_events
+            WHERE id IN (
+                SELECT excess.id
+                FROM (
+                    SELECT user_id FROM activity_events
+                    GROUP BY user_id
+                    HAVING count(*) > %s
+                ) over_cap
+                CROSS JOIN LATERAL (
+                    SELECT id FROM activity_events
+                    WHERE user_id = over_cap.user_id
+                    ORDER BY created_at DESC, id DESC
+                    OFFSET %s
+                ) excess
+            )
+        """, (max_per_user, max_per_user))
+        trimmed = cursor.rowcount
+
+        conn.commit()
+        return {'expired': expired, 'trimmed': trimmed}
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class ActivityRetention:
+    """Limpeza periódica do log de atividades, em segundo plano"""
+
+    def __init__(self, interval: float = ACTIVITY_RETENTION_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'passes': 0,
+            'expired': 0,
+            'trimmed': 0
+        }
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        self._task = asyncio.get_running_loop().create_task(
+            self._retention_loop(), name="activity-retention"
+        )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_pass(self) -> Dict[str, int]:
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None, purge_activity)
+
+        self.stats['passes'] += 1
+        self.stats['expired'] += report['expired']
+        self.stats['trimmed'] += report['trimmed']
+
+        if report['expired'] or report['trimmed']:
+            print(f"🧹 Atividades: {report['expired']} antigas, {report['trimmed']} acima do limite removidas")
+
+        return report
+
+    async def _retention_loop(self):
+        while True:
+            try:
+                await self.run_pass()
+            except Exception as e:
+                print(f"❌ Erro na limpeza do log de atividades: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Instância global da limpeza
+activity_retention = ActivityRetention()
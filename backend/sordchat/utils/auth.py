@@ -8,9 +8,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from ..config.settings import load_environment
+
+load_environment()
 
 # Configurações de segurança
 SECRET_KEY = os.getenv("SECRET_KEY", "172839")
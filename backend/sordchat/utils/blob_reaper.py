@@ -0,0 +1,223 @@
+"""
+Remoção assíncrona, em lotes, de arquivos de blobs liberados e reconciliação do disco
+"""
+
+import os
+import time
+import asyncio
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+from .file_store import get_db_connection
+
+REAPER_BATCH_SIZE = 200
+REAPER_FLUSH_INTERVAL = 2  # segundos
+RECONCILE_INTERVAL = 6 * 60 * 60  # 6 horas
+TEMP_FILE_MAX_AGE = 24 * 60 * 60  # uploads/temp abandonados há mais de 24h
+
+
+class BlobReaper:
+    """
+    Recebe os caminhos de blobs liberados (conteúdo + thumbnail) e os apaga fora
+    da requisição, em lotes. Antes de apagar, cada hash é travado com o mesmo
+    advisory lock usado por BlobStore.ingest e conferido em file_blobs, então um
+    upload simultâneo do mesmo conteúdo nunca perde o arquivo
+    """
+
+    def __init__(self, upload_dir: Path):
+        self.upload_dir = upload_dir
+        self.pending: Dict[str, List[str]] = {}  # hash -> caminhos a remover
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {
+            'scheduled': 0,
+            'deleted_files': 0,
+            'skipped_reused': 0,
+            'batches': 0,
+            'last_reconcile': None
+        }
+
+    def start(self):
+        """Inicia o worker de remoção e a reconciliação periódica"""
+        if self._tasks:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._flush_loop(), name="blob-reaper"),
+            asyncio.create_task(self._reconcile_loop(), name="blob-reconciler")
+        ]
+
+    async def stop(self):
+        """Processa o que estiver pendente e encerra os workers"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self.pending:
+            await self.flush()
+
+    def schedule(self, blob_hash: str, paths: List[Optional[str]]):
+        """Agenda a remoção dos arquivos de um blob cuja linha já saiu de file_blobs"""
+        self.start()
+
+        self.pending.setdefault(blob_hash, []).extend(p for p in paths if p)
+        self.stats['scheduled'] += 1
+
+        if len(self.pending) >= REAPER_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Remove imediatamente um lote pendente; retorna quantos arquivos saíram"""
+        if not self.pending:
+            return 0
+
+        batch = dict(list(self.pending.items())[:REAPER_BATCH_SIZE])
+        for blob_hash in batch:
+            del self.pending[blob_hash]
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._reap_batch, batch)
+
+    async def reconcile(self) -> Dict[str, Any]:
+        """Procura blobs, thumbnails e temporários sem registro e agenda sua remoção"""
+        loop = asyncio.get_running_loop()
+        orphans, temp_removed = await loop.run_in_executor(None, self._find_orphans)
+
+        for blob_hash, paths in orphans.items():
+            self.schedule(blob_hash, paths)
+
+        # Esvaziar a fila para que o relatório reflita o que foi apagado
+        deleted = 0
+        while self.pending:
+            deleted += await self.flush()
+
+        report = {
+            'orphans_found': len(orphans),
+            'deleted_files': deleted,
+            'temp_files_removed': temp_removed,
+            'finished_at': time.time()
+        }
+        self.stats['last_reconcile'] = report
+        print(f"🧹 Reconciliação de uploads: {len(orphans)} órfãos, {temp_removed} temporários")
+        return report
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Remoções pendentes e totais desde o início"""
+        return {'pending': len(self.pending), **self.stats}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=REAPER_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                while self.pending:
+                    await self.flush()
+            except Exception as e:
+                print(f"Erro ao remover arquivos liberados: {e}")
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"Erro na reconciliação de uploads: {e}")
+
+    def _reap_batch(self, batch: Dict[str, List[str]]) -> int:
+        """Executado em thread: trava, confere e apaga um lote em uma transação"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        deleted = 0
+
+        try:
+            # Locks adquiridos na ordem do array (ordenado) evitam deadlock
+            # entre lotes concorrentes
+            hashes = sorted(batch)
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(hashtext(h)) FROM unnest(%s::text[]) AS h",
+                (hashes,)
+            )
+            cursor.execute("SELECT hash FROM file_blobs WHERE hash = ANY(%s)", (hashes,))
+            reused = {row[0] for row in cursor.fetchall()}
+
+            for blob_hash in hashes:
+                if blob_hash in reused:
+                    # Conteúdo enviado de novo depois da liberação
+                    self.stats['skipped_reused'] += 1
+                    continue
+
+                for path in batch[blob_hash]:
+                    try:
+                        os.unlink(path)
+                        deleted += 1
+                    except FileNotFoundError:
+                        pass
+
+            conn.commit()
+
+        finally:
+            cursor.close()
+            conn.close()
+
+        self.stats['deleted_files'] += deleted
+        self.stats['batches'] += 1
+        return deleted
+
+    def _find_orphans(self):
+        """Executado em thread: compara o disco com file_blobs"""
+        on_disk: Dict[str, List[str]] = {}
+
+        # uploads/blobs/ab/cd/<hash>
+        blobs_dir = self.upload_dir / 'blobs'
+        if blobs_dir.exists():
+            for level1 in os.scandir(blobs_dir):
+                if not level1.is_dir():
+                    continue
+                for level2 in os.scandir(level1.path):
+                    if not level2.is_dir():
+                        continue
+                    for entry in os.scandir(level2.path):
+                        if entry.is_file():
+                            on_disk.setdefault(entry.name, []).append(entry.path)
+
+        # uploads/thumbnails/<hash>_thumb.jpg
+        thumbnails_dir = self.upload_dir / 'thumbnails'
+        if thumbnails_dir.exists():
+            for entry in os.scandir(thumbnails_dir):
+                if entry.is_file() and entry.name.endswith('_thumb.jpg'):
+                    on_disk.setdefault(entry.name[:-len('_thumb.jpg')], []).append(entry.path)
+
+        orphans: Dict[str, List[str]] = {}
+        if on_disk:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            try:
+                cursor.execute("SELECT hash FROM file_blobs WHERE hash = ANY(%s)", (list(on_disk),))
+                known = {row[0] for row in cursor.fetchall()}
+            finally:
+                cursor.close()
+                conn.close()
+
+            orphans = {h: paths for h, paths in on_disk.items() if h not in known}
+
+        # Arquivos temporários de uploads interrompidos
+        temp_removed = 0
+        temp_dir = self.upload_dir / 'temp'
+        cutoff = time.time() - TEMP_FILE_MAX_AGE
+        if temp_dir.exists():
+            for entry in os.scandir(temp_dir):
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.unlink(entry.path)
+                        temp_removed += 1
+                    except FileNotFoundError:
+                        pass
+
+        return orphans, temp_removed
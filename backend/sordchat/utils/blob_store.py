@@ -0,0 +1,122 @@
+"""
+Armazenamento de arquivos endereçado por conteúdo (deduplicado)
+"""
+
+import os
+import shutil
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+BLOB_COLUMNS = (
+    'hash', 'size', 'mime_type', 'path', 'thumbnail_path',
+    'thumbnail_status', 'ref_count', 'created_at'
+)
+
+
+class BlobStore:
+    """
+    Guarda cada conteúdo uma única vez, em uploads/blobs/ab/cd/<sha256>
+    Os metadados ficam na tabela file_blobs e ref_count conta quantos registros
+    de files apontam para o blob; o arquivo físico só é removido na última liberação
+
+    Os métodos recebem o cursor do chamador para participar da mesma transação
+    que grava ou remove o registro em files
+    """
+
+    def __init__(self, base_dir: Path):
+        self.base_dir = base_dir
+
+    def blob_path(self, digest: str) -> Path:
+        """Caminho do blob, fragmentado pelos 4 primeiros caracteres do hash"""
+        return self.base_dir / digest[:2] / digest[2:4] / digest
+
+    def get(self, cursor, digest: str) -> Optional[Dict[str, Any]]:
+        """Obtém metadados de um blob"""
+        cursor.execute(
+            f"SELECT {', '.join(BLOB_COLUMNS)} FROM file_blobs WHERE hash = %s",
+            (digest,)
+        )
+        row = cursor.fetchone()
+        return dict(zip(BLOB_COLUMNS, row)) if row else None
+
+    def ingest(self, cursor, staged_path: Path, digest: str, size: int, mime_type: str) -> Dict[str, Any]:
+        """
+        Incorpora um arquivo já gravado em uploads/temp
+        Se o conteúdo já existir, apenas incrementa a contagem de referências
+
+        O arquivo de staging continua no lugar: o chamador o apaga depois do
+        commit e, se a transação não for confirmada, chama discard_placed
+        antes do rollback
+        """
+        path = self.blob_path(digest)
+
+        # Serializa com o BlobReaper, que apaga arquivos de blobs liberados
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (digest,))
+
+        # Upsert atômico: dois uploads simultâneos do mesmo conteúdo
+        # resultam em uma linha com ref_count = 2
+        cursor.execute(f"""
+            INSERT INTO file_blobs (hash, size, mime_type, path, ref_count)
+            VALUES (%s, %s, %s, %s, 1)
+            ON CONFLICT (hash) DO UPDATE SET ref_count = file_blobs.ref_count + 1
+            RETURNING {', '.join(BLOB_COLUMNS)}, (xmax = 0) AS inserted
+        """, (digest, size, mime_type, str(path)))
+
+        row = cursor.fetchone()
+        blob = dict(zip(BLOB_COLUMNS, row[:-1]))
+        inserted = row[-1]
+
+        # Conteúdo novo (ou blob ausente em disco, que é restaurado)
+        blob['placed'] = not path.exists()
+        if blob['placed']:
+            self._place(staged_path, path)
+
+        blob['deduplicated'] = not inserted
+        return blob
+
+    def discard_placed(self, blob: Dict[str, Any]):
+        """
+        Desfaz a gravação em disco de um ingest que não será confirmado
+        Chamado antes do rollback, enquanto o advisory lock ainda está retido
+        """
+        if blob.get('placed'):
+            self.blob_path(blob['hash']).unlink(missing_ok=True)
+
+    def _place(self, staged_path: Path, path: Path):
+        """Cria o blob a partir do staging sem removê-lo (hard link ou cópia)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(staged_path, path)
+        except OSError:
+            # Sem suporte a hard link: cópia com troca atômica
+            partial = path.with_name(f"{path.name}.part")
+            shutil.copyfile(staged_path, partial)
+            os.replace(partial, path)
+
+    def release(self, cursor, digest: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove uma referência ao blob
+        Se esta foi a última, apaga a linha e retorna o blob removido; os arquivos
+        (caminhos exatos gravados na linha) são entregues ao BlobReaper após o commit
+        """
+        cursor.execute(
+            "UPDATE file_blobs SET ref_count = ref_count - 1 WHERE hash = %s",
+            (digest,)
+        )
+
+        cursor.execute(f"""
+            DELETE FROM file_blobs
+            WHERE hash = %s AND ref_count <= 0
+            RETURNING {', '.join(BLOB_COLUMNS)}
+        """, (digest,))
+
+        row = cursor.fetchone()
+        return dict(zip(BLOB_COLUMNS, row)) if row else None
+
+    def set_thumbnail(self, cursor, digest: str, status: str, thumbnail_path: Optional[str] = None) -> bool:
+        """Atualiza o status do thumbnail; retorna False se o blob não existe mais"""
+        cursor.execute("""
+            UPDATE file_blobs SET thumbnail_status = %s, thumbnail_path = %s
+            WHERE hash = %s
+        """, (status, thumbnail_path, digest))
+        return cursor.rowcount > 0
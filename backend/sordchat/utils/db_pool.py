@@ -0,0 +1,216 @@
+"""
+Pool de conexões PostgreSQL compartilhado pelas rotas e utilitários
+"""
+
+import os
+import time
+import asyncio
+import threading
+import psycopg2
+from psycopg2 import extensions
+from urllib.parse import urlparse
+from typing import Dict, List, Any
+
+from ..config.settings import load_environment
+
+load_environment()
+
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))  # conexões abertas no aquecimento
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))  # conexões ociosas mantidas abertas
+DB_POOL_LIMIT = int(os.getenv("DB_POOL_LIMIT", "40"))  # teto de conexões em uso ao mesmo tempo
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))  # espera por uma vaga (fora do event loop)
+DB_POOL_VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))  # ociosa há mais que isso: SELECT 1
+
+
+class PoolExhausted(psycopg2.OperationalError):
+    """Todas as DB_POOL_LIMIT conexões estão em uso (a API responde 503)"""
+
+
+class PooledConnection(extensions.connection):
+    """
+    Conexão cujo close() devolve ao pool em vez de encerrar
+    O padrão das rotas (conn.close() no finally) continua valendo
+    """
+
+    def close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is not None:
+            pool.putconn(self)
+        else:
+            super().close()
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class ConnectionPool:
+    """
+    Conexões reutilizadas entre requisições
+    Até `maxconn` ficam ociosas; no máximo `limit` ficam em uso ao mesmo tempo.
+    No teto, threads de trabalho esperam até `timeout` segundos por uma vaga;
+    no event loop a falha é imediata (esperar ali impediria a devolução)
+    """
+
+    def __init__(self, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 limit: int = DB_POOL_LIMIT, timeout: float = DB_POOL_TIMEOUT,
+                 validate_after: float = DB_POOL_VALIDATE_AFTER):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.limit = limit
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self.idle: List[PooledConnection] = []
+        self.in_use = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self.stats = {
+            'created': 0,
+            'reused': 0,
+            'validated': 0,
+            'discarded': 0,
+            'waits': 0,
+            'exhausted': 0
+        }
+
+    def _connect(self) -> PooledConnection:
+        database_url = os.getenv("DATABASE_URL")
+        parsed = urlparse(database_url)
+
+        conn = psycopg2.connect(
+            host=parsed.hostname,
+            database=parsed.path[1:],
+            user=parsed.username,
+            password=parsed.password,
+            port=parsed.port or 5432,
+            connection_factory=PooledConnection
+        )
+        self.stats['created'] += 1
+        return conn
+
+    def open(self):
+        """Abre e valida as conexões mínimas (aquecimento antes da prontidão)"""
+        with self._lock:
+            missing = self.minconn - len(self.idle)
+
+        for _ in range(missing):
+            conn = self._connect()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            conn.idle_since = time.monotonic()
+            with self._lock:
+                self.idle.append(conn)
+
+    def getconn(self) -> PooledConnection:
+        self._reserve()
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._release()
+            raise
+
+        conn.pool = self
+        return conn
+
+    def _reserve(self):
+        """Ocupa uma vaga de conexão em uso, respeitando o teto"""
+        timeout = 0 if _in_event_loop() else self.timeout
+        with self._available:
+            if self.in_use >= self.limit:
+                self.stats['waits'] += 1
+                if not self._available.wait_for(lambda: self.in_use < self.limit, timeout=timeout):
+                    self.stats['exhausted'] += 1
+                    raise PoolExhausted(f"Pool de conexões esgotado ({self.limit} em uso)")
+            self.in_use += 1
+
+    def _release(self):
+        with self._available:
+            self.in_use -= 1
+            self._available.notify()
+
+    def _checkout(self) -> PooledConnection:
+        """Conexão ociosa ainda viva ou, se não houver, uma nova"""
+        while True:
+            with self._lock:
+                conn = self.idle.pop() if self.idle else None
+
+            if conn is None:
+                return self._connect()
+
+            if conn.closed or not self._is_alive(conn):
+                self.stats['discarded'] += 1
+                conn.close()
+                continue
+
+            self.stats['reused'] += 1
+            return conn
+
+    def _is_alive(self, conn: PooledConnection) -> bool:
+        """SELECT 1 apenas nas conexões ociosas há mais de validate_after segundos"""
+        if time.monotonic() - getattr(conn, 'idle_since', 0) <= self.validate_after:
+            return True
+
+        self.stats['validated'] += 1
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def putconn(self, conn: PooledConnection):
+        """Devolve a conexão; transação pendente é desfeita"""
+        conn.pool = None  # um segundo close() encerra de fato, sem devolver duas vezes
+        self._release()
+
+        try:
+            if not conn.closed:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+        except psycopg2.Error:
+            pass
+
+        reusable = not conn.closed and conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        with self._lock:
+            if reusable and len(self.idle) < self.maxconn:
+                conn.idle_since = time.monotonic()
+                self.idle.append(conn)
+                return
+            self.stats['discarded'] += 1
+
+        conn.close()
+
+    def closeall(self):
+        """Encerra as conexões ociosas (desligamento da aplicação)"""
+        with self._lock:
+            idle, self.idle = self.idle, []
+
+        for conn in idle:
+            conn.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'idle': len(self.idle),
+            'in_use': self.in_use,
+            'min': self.minconn,
+            'max': self.maxconn,
+            'limit': self.limit,
+            **self.stats
+        }
+
+
+# Instância global do pool
+db_pool = ConnectionPool()
+
+
+def get_db_connection():
+    """Obtém conexão com o banco de dados (do pool; close() devolve a conexão)"""
+    return db_pool.getconn()
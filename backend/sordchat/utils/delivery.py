@@ -0,0 +1,169 @@
+"""
+Barramento único de entrega em tempo real (WebSocket)
+
+Chat e notificações publicam aqui; os eventos de um mesmo usuário gerados na
+mesma volta do event loop são enviados em um único frame
+{"type": "batch", "events": [...]}, desagrupado pelo cliente
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Dict, List, Optional, Any, Tuple
+
+LATENCY_SAMPLES = 1000  # amostras usadas nos percentis globais
+
+
+class DeliveryBus:
+    """
+    Fila por usuário em frente ao gerenciador de conexões
+    `connections` precisa oferecer `active_connections` e `async send_frame(user_id, text) -> bool`
+    """
+
+    def __init__(self):
+        self.connections = None
+        # user_id -> [(evento JSON, publicado em, futuro de quem aguarda o envio)]
+        self.buffers: Dict[int, List[Tuple[str, float, Optional[asyncio.Future]]]] = {}
+        self.sending = set()  # usuários com frame em envio (preserva a ordem dos eventos)
+        self._flush_scheduled = False
+        self._tasks = set()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.user_latency: Dict[int, Dict[str, Any]] = {}
+        self.stats = {
+            'events': 0,
+            'frames': 0,
+            'batched_frames': 0,
+            'dropped_offline': 0,
+            'failed': 0
+        }
+
+    def attach(self, connections):
+        """Define o gerenciador de conexões WebSocket usado para os envios"""
+        self.connections = connections
+
+    def is_connected(self, user_id: int) -> bool:
+        return self.connections is not None and user_id in self.connections.active_connections
+
+    def publish(self, user_id: int, message: str, waiter: Optional[asyncio.Future] = None) -> bool:
+        """
+        Enfileira um evento (objeto JSON já serializado) para o usuário
+        Retorna False se ele não está conectado; o evento é descartado
+        True significa apenas enfileirado: use deliver() para saber se foi enviado
+        """
+        if not self.is_connected(user_id):
+            self.stats['dropped_offline'] += 1
+            return False
+
+        self.buffers.setdefault(user_id, []).append((message, time.perf_counter(), waiter))
+        self.stats['events'] += 1
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._start_flush)
+
+        return True
+
+    async def deliver(self, user_id: int, message: str) -> bool:
+        """
+        Publica e aguarda o envio do frame que contém o evento
+        Retorna True somente se o frame foi escrito no socket
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        if not self.publish(user_id, message, waiter):
+            return False
+        return await waiter
+
+    async def drain(self, timeout: float = 5.0) -> bool:
+        """Aguarda o envio de tudo o que foi publicado"""
+        deadline = time.monotonic() + timeout
+        while self.buffers or self.sending or self._tasks:
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.001)
+        return True
+
+    def get_metrics(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Totais, percentis de latência e a latência por usuário"""
+        if user_id is not None:
+            return self.user_latency.get(user_id, {'frames': 0, 'events': 0})
+
+        samples = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(int(len(samples) * p), len(samples) - 1)], 3)
+
+        slowest = sorted(self.user_latency.items(), key=lambda item: item[1]['max_ms'], reverse=True)[:20]
+
+        return {
+            'connected_users': len(self.connections.active_connections) if self.connections else 0,
+            'buffered_users': len(self.buffers),
+            'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)},
+            'slowest_users': [{'user_id': uid, **stats} for uid, stats in slowest],
+            **self.stats
+        }
+
+    def _start_flush(self):
+        self._flush_scheduled = False
+
+        # Usuários com envio em andamento ficam para depois, mantendo a ordem
+        ready = {uid: events for uid, events in self.buffers.items() if uid not in self.sending}
+        if not ready:
+            return
+
+        for user_id in ready:
+            del self.buffers[user_id]
+            self.sending.add(user_id)
+
+        task = asyncio.create_task(self._flush(ready))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, ready: Dict[int, List[Tuple[str, float, Optional[asyncio.Future]]]]):
+        await asyncio.gather(
+            *(self._send_user(user_id, events) for user_id, events in ready.items()),
+            return_exceptions=True
+        )
+
+        # Eventos publicados enquanto estes usuários estavam em envio
+        if any(uid in self.buffers for uid in ready) and not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._start_flush)
+
+    async def _send_user(self, user_id: int, events: List[Tuple[str, float, Optional[asyncio.Future]]]):
+        if len(events) == 1:
+            frame = events[0][0]
+        else:
+            frame = '{"type": "batch", "events": [' + ", ".join(e[0] for e in events) + ']}'
+            self.stats['batched_frames'] += 1
+
+        delivered = False
+        try:
+            delivered = await self.connections.send_frame(user_id, frame)
+        finally:
+            self.sending.discard(user_id)
+            # Também em cancelamento: quem aguarda deliver() nunca fica pendurado
+            for _, _, waiter in events:
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(delivered)
+
+        if not delivered:
+            self.stats['failed'] += len(events)
+            return
+
+        self.stats['frames'] += 1
+        now = time.perf_counter()
+        latency_ms = (now - events[0][1]) * 1000
+        self.latencies.append(latency_ms)
+
+        stats = self.user_latency.setdefault(user_id, {'frames': 0, 'events': 0, 'avg_ms': 0.0, 'max_ms': 0.0})
+        stats['frames'] += 1
+        stats['events'] += len(events)
+        stats['last_ms'] = round(latency_ms, 3)
+        stats['avg_ms'] = round(stats['avg_ms'] + (latency_ms - stats['avg_ms']) / stats['frames'], 3)
+        stats['max_ms'] = round(max(stats['max_ms'], latency_ms), 3)
+
+
+# Instância global do barramento
+delivery_bus = DeliveryBus()
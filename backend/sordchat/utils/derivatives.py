@@ -0,0 +1,154 @@
+"""
+Derivados de imagem sob demanda (tamanhos e formatos) com cache em disco
+"""
+
+import os
+import asyncio
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any
+
+from .thumbnails import thumbnail_queue, render_image
+
+DERIVATIVE_MAX_DIMENSION = 2048
+# Tamanhos gerados: pedidos são arredondados para cima, limitando as variações
+# que um cliente consegue colocar no cache e no pool de processos
+DERIVATIVE_SIZES = (64, 128, 256, 512, 1024, DERIVATIVE_MAX_DIMENSION)
+DERIVATIVE_FORMATS = {
+    'jpeg': {'pil_format': 'JPEG', 'extension': 'jpg', 'media_type': 'image/jpeg', 'quality': 85},
+    'webp': {'pil_format': 'WEBP', 'extension': 'webp', 'media_type': 'image/webp', 'quality': 80},
+    'png': {'pil_format': 'PNG', 'extension': 'png', 'media_type': 'image/png', 'quality': 95},
+}
+DERIVATIVE_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+
+
+def snap_dimension(value: int) -> int:
+    """Menor tamanho de DERIVATIVE_SIZES que comporta o valor pedido"""
+    for size in DERIVATIVE_SIZES:
+        if value <= size:
+            return size
+    return DERIVATIVE_MAX_DIMENSION
+
+
+class DerivativeCache:
+    """
+    Cache LRU de derivados em disco, limitado pelo total de bytes
+    Cada derivado é identificado pelo hash do conteúdo original, tamanho e formato,
+    então uploads repetidos da mesma imagem compartilham os mesmos derivados
+    """
+
+    def __init__(self, base_dir: Path, max_bytes: int = DERIVATIVE_CACHE_MAX_BYTES):
+        self.base_dir = base_dir
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # nome -> bytes (mais antigo primeiro)
+        self.total_bytes = 0
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0}
+        self._loaded = False
+
+    def derivative_name(self, blob_hash: str, width: int, height: int, image_format: str) -> str:
+        return f"{blob_hash}_{width}x{height}.{DERIVATIVE_FORMATS[image_format]['extension']}"
+
+    async def get_or_create(self, blob: Dict[str, Any], width: int, height: int, image_format: str) -> Path:
+        """
+        Retorna o caminho do derivado, gerando-o na primeira solicitação
+        Pedidos simultâneos para o mesmo derivado aguardam uma única geração
+        """
+        self._load()
+
+        name = self.derivative_name(blob['hash'], width, height, image_format)
+        path = self.base_dir / name
+
+        if name in self.entries and path.exists():
+            self.entries.move_to_end(name)
+            self.stats['hits'] += 1
+            return path
+
+        task = self.inflight.get(name)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+            # A geração é uma tarefa própria: cancelar quem pediu primeiro não
+            # interrompe os demais nem descarta o arquivo gerado
+            task = asyncio.create_task(self._render(blob, name, path, width, height, image_format))
+            self.inflight[name] = task
+            task.add_done_callback(lambda done: self._render_done(name, done))
+
+        return await asyncio.shield(task)
+
+    async def _render(self, blob: Dict[str, Any], name: str, path: Path,
+                      width: int, height: int, image_format: str) -> Path:
+        """Gera o derivado no pool de processos e o registra no cache"""
+        spec = DERIVATIVE_FORMATS[image_format]
+        await thumbnail_queue.run_in_pool(
+            render_image, blob['path'], str(path), (width, height), spec['pil_format'], spec['quality']
+        )
+        self._add(name, path.stat().st_size)
+        return path
+
+    def _render_done(self, name: str, task: asyncio.Task):
+        if self.inflight.get(name) is task:
+            del self.inflight[name]
+
+        # Evita aviso de exceção não consumida quando todos desistiram de aguardar
+        if not task.cancelled():
+            task.exception()
+
+    def discard_blob(self, blob_hash: str) -> int:
+        """Remove todos os derivados de um conteúdo excluído"""
+        self._load()
+
+        removed = 0
+        for name in [n for n in self.entries if n.startswith(f"{blob_hash}_")]:
+            self._remove(name)
+            removed += 1
+
+        return removed
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Ocupação do cache e taxa de acertos"""
+        return {
+            'entries': len(self.entries),
+            'total_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'inflight': len(self.inflight),
+            **self.stats
+        }
+
+    def _add(self, name: str, size: int):
+        if name in self.entries:
+            self.total_bytes -= self.entries.pop(name)
+
+        self.entries[name] = size
+        self.total_bytes += size
+
+        # Evicção por bytes, do menos usado recentemente para o mais recente
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.stats['evictions'] += 1
+
+    def _remove(self, name: str):
+        size = self.entries.pop(name, 0)
+        self.total_bytes -= size
+        (self.base_dir / name).unlink(missing_ok=True)
+
+    def _load(self):
+        """Reconstrói o índice a partir do disco, ordenado pelo último acesso"""
+        if self._loaded:
+            return
+
+        self._loaded = True
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+        found = []
+        for entry in os.scandir(self.base_dir):
+            if entry.is_file() and not entry.name.endswith('.part'):
+                stat = entry.stat()
+                found.append((stat.st_atime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(found):
+            self.entries[name] = size
+            self.total_bytes += size
+
@@ -4,39 +4,61 @@ Sistema de upload e gerenciamento de arquivos
 
 import os
 import uuid
-import aiofiles
+import asyncio
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-import magic
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from .blob_store import BlobStore
+from .blob_reaper import BlobReaper
+from .file_store import (
+    get_db_connection,
+    fetch_file,
+    insert_file,
+    delete_file_record,
+    is_valid_file_id,
+    get_user_usage,
+    UPLOAD_SESSION_COLUMNS
+)
+from .thumbnails import thumbnail_queue
+from .derivatives import DerivativeCache, DERIVATIVE_CACHE_MAX_BYTES
+from .notifications import notification_manager
+from ..config.settings import UPLOAD_DIR, MAX_FILE_SIZE, MAX_FILES_PER_USER, ALLOWED_EXTENSIONS
 
 # Configurações
-UPLOAD_DIR = Path("uploads")
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-ALLOWED_EXTENSIONS = {
-    'images': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'],
-    'documents': ['.pdf', '.doc', '.docx', '.txt', '.rtf', '.odt'],
-    'spreadsheets': ['.xls', '.xlsx', '.csv', '.ods'],
-    'presentations': ['.ppt', '.pptx', '.odp'],
-    'archives': ['.zip', '.rar', '.7z', '.tar', '.gz'],
-    'audio': ['.mp3', '.wav', '.ogg', '.m4a'],
-    'video': ['.mp4', '.avi', '.mkv', '.mov', '.wmv']
-}
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB por leitura/escrita
+MIME_SNIFF_BYTES = 2048  # bytes iniciais usados para detectar o tipo real
+MAX_RESUMABLE_FILE_SIZE = 200 * 1024 * 1024  # 200MB via sessão de upload retomável
+UPLOAD_SESSION_CHUNK_SIZE = 5 * 1024 * 1024  # tamanho sugerido de cada PUT
+UPLOAD_SESSION_MAX_CHUNK = 16 * 1024 * 1024  # maior PUT aceito
+UPLOAD_SESSION_TTL = timedelta(hours=24)  # sessões sem atividade expiram
+UPLOAD_BATCH_CONCURRENCY = 4  # arquivos processados ao mesmo tempo em upload-multiple
 
 
 # Criar diretórios se não existirem
+_upload_directories_ready = False
+
+
 def create_upload_directories():
-    """Cria diretórios de upload"""
+    """
+    Cria diretórios de upload (uma vez por processo)
+    Chamado na inicialização da aplicação e antes da primeira gravação,
+    nunca na importação do módulo
+    """
+    global _upload_directories_ready
+    if _upload_directories_ready:
+        return
+
     base_dir = UPLOAD_DIR
-    subdirs = ['images', 'documents', 'temp', 'thumbnails', 'avatars']
+    subdirs = ['blobs', 'temp', 'thumbnails', 'derivatives', 'avatars']
 
     for subdir in subdirs:
         dir_path = base_dir / subdir
         dir_path.mkdir(parents=True, exist_ok=True)
 
+    _upload_directories_ready = True
     print("✅ Diretórios de upload criados")
 
 
@@ -53,15 +75,20 @@ def get_file_category(filename: str) -> str:
 
 def validate_file(file: UploadFile) -> Dict[str, Any]:
     """Valida arquivo antes do upload"""
+    return validate_file_metadata(file.filename, getattr(file, 'size', None), MAX_FILE_SIZE)
+
+
+def validate_file_metadata(filename: str, size: Optional[int], max_size: int) -> Dict[str, Any]:
+    """Valida nome e tamanho declarados de um arquivo"""
     errors = []
     warnings = []
 
     # Verificar tamanho
-    if hasattr(file, 'size') and file.size > MAX_FILE_SIZE:
-        errors.append(f"Arquivo muito grande. Máximo: {MAX_FILE_SIZE // (1024 * 1024)}MB")
+    if size is not None and size > max_size:
+        errors.append(f"Arquivo muito grande. Máximo: {max_size // (1024 * 1024)}MB")
 
     # Verificar extensão
-    ext = Path(file.filename).suffix.lower()
+    ext = Path(filename or '').suffix.lower()
     all_extensions = []
     for exts in ALLOWED_EXTENSIONS.values():
         all_extensions.extend(exts)
@@ -70,10 +97,10 @@ def validate_file(file: UploadFile) -> Dict[str, Any]:
         errors.append(f"Tipo de arquivo não permitido: {ext}")
 
     # Verificar nome do arquivo
-    if not file.filename or len(file.filename) > 255:
+    if not filename or len(filename) > 255:
         errors.append("Nome do arquivo inválido")
 
-    category = get_file_category(file.filename)
+    category = get_file_category(filename or '')
 
     return {
         'valid': len(errors) == 0,
@@ -84,7 +111,114 @@ def validate_file(file: UploadFile) -> Dict[str, Any]:
     }
 
 
-async def save_uploaded_file(file: UploadFile, user_id: int, category: str = None) -> Dict[str, Any]:
+def check_upload_quota(cursor, user_id: int, incoming: int = 1):
+    """
+    Garante que o usuário ainda pode enviar arquivos (MAX_FILES_PER_USER)
+    Sessões de upload abertas também contam, pois reservam um arquivo
+    """
+    usage = get_user_usage(cursor, user_id)
+    used = sum(c['count'] for c in usage.values())
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM upload_sessions WHERE user_id = %s AND expires_at > now()",
+        (user_id,)
+    )
+    used += cursor.fetchone()[0]
+
+    if used + incoming > MAX_FILES_PER_USER:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Limite de arquivos atingido ({MAX_FILES_PER_USER} por usuário)"
+        )
+
+
+def lock_user_usage(cursor, user_id: int):
+    """Serializa, até o commit, as inclusões de arquivos de um mesmo usuário"""
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('file_usage'), %s)", (user_id,))
+
+
+def ensure_upload_quota(user_id: int):
+    """Verificação rápida antes de receber e gravar os bytes do upload"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        check_upload_quota(cursor, user_id)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def sniff_mime_type(head: bytes, fallback: Optional[str] = None) -> str:
+    """Detecta o tipo MIME pelos primeiros bytes do conteúdo"""
+    try:
+        import magic  # libmagic só é carregada no primeiro upload
+        detected = magic.from_buffer(head, mime=True) if head else None
+    except Exception as e:
+        print(f"Erro ao detectar tipo do arquivo: {e}")
+        detected = None
+
+    return detected or fallback or 'application/octet-stream'
+
+
+async def stream_to_staging(file: UploadFile, max_size: int = MAX_FILE_SIZE) -> Dict[str, Any]:
+    """
+    Grava o upload em uploads/temp em blocos de tamanho fixo
+    O hash é atualizado a cada bloco e o limite de tamanho é verificado
+    durante a leitura, então o arquivo nunca é carregado inteiro em memória
+    """
+    import aiofiles
+
+    create_upload_directories()
+    temp_path = UPLOAD_DIR / 'temp' / f"{uuid.uuid4()}.part"
+    file_hash = hashlib.sha256()
+    file_size = 0
+    head = b''
+    loop = asyncio.get_running_loop()
+
+    try:
+        async with aiofiles.open(temp_path, 'wb') as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                file_size += len(chunk)
+                if file_size > max_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Arquivo muito grande. Máximo: {max_size // (1024 * 1024)}MB"
+                    )
+
+                if len(head) < MIME_SNIFF_BYTES:
+                    head += chunk[:MIME_SNIFF_BYTES - len(head)]
+
+                # sha256 libera o GIL: o hash roda em thread enquanto o bloco é gravado
+                await asyncio.gather(
+                    loop.run_in_executor(None, file_hash.update, chunk),
+                    f.write(chunk)
+                )
+
+    except BaseException:
+        # Limpar arquivo parcial em caso de erro ou cancelamento
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+    return {
+        'temp_path': temp_path,
+        'size': file_size,
+        'hash': file_hash.hexdigest(),
+        'mime_type': sniff_mime_type(head, file.content_type)
+    }
+
+
+async def save_uploaded_file(
+        file: UploadFile,
+        user_id: int,
+        category: str = None,
+        description: Optional[str] = None
+) -> Dict[str, Any]:
     """Salva arquivo no sistema"""
 
     # Validar arquivo
@@ -92,108 +226,547 @@ async def save_uploaded_file(file: UploadFile, user_id: int, category: str = Non
     if not validation['valid']:
         raise HTTPException(status_code=400, detail=validation['errors'])
 
-    # Gerar nome único
+    ensure_upload_quota(user_id)
+
+    staged = await stream_to_staging(file)
+
+    try:
+        return await register_staged_file(
+            staged,
+            original_name=file.filename,
+            user_id=user_id,
+            category=category or validation['category'],
+            description=description
+        )
+
+    except HTTPException:
+        staged['temp_path'].unlink(missing_ok=True)
+        raise
+
+    except Exception as e:
+        staged['temp_path'].unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+
+
+async def register_staged_file(
+        staged: Dict[str, Any],
+        original_name: str,
+        user_id: int,
+        category: str,
+        description: Optional[str] = None,
+        session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Incorpora um arquivo de uploads/temp ao armazenamento por conteúdo
+    Um conteúdo repetido custa apenas o hash e um novo registro apontando para o blob
+    Com session_id, a sessão de upload é encerrada na mesma transação do registro
+    """
     file_id = str(uuid.uuid4())
-    original_name = file.filename
     ext = Path(original_name).suffix.lower()
-    safe_filename = f"{file_id}{ext}"
 
-    # Determinar categoria e diretório
-    file_category = category or validation['category']
-    upload_subdir = UPLOAD_DIR / file_category
-    file_path = upload_subdir / safe_filename
-
-    # Calcular hash do arquivo
-    file_hash = hashlib.md5()
-    file_size = 0
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    blob = None
+    committing = False
 
     try:
-        # Salvar arquivo
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            file_size = len(content)
-            file_hash.update(content)
-            await f.write(content)
-
-        # Criar thumbnail se for imagem
-        thumbnail_path = None
-        if file_category == 'images':
-            thumbnail_path = await create_thumbnail(file_path, file_id)
+        # Revalidar a cota com o lock do usuário: uploads simultâneos não
+        # ultrapassam o limite (o contador em file_usage é mantido por trigger)
+        lock_user_usage(cursor, user_id)
+
+        if session_id is not None:
+            # A vaga reservada pela sessão passa para o arquivo sem ficar livre
+            # entre as transações; uma segunda finalização não encontra a sessão
+            cursor.execute("DELETE FROM upload_sessions WHERE id = %s RETURNING id", (session_id,))
+            if cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail="Sessão de upload não encontrada ou expirada")
+
+        check_upload_quota(cursor, user_id)
+
+        blob = blob_store.ingest(
+            cursor,
+            staged['temp_path'],
+            digest=staged['hash'],
+            size=staged['size'],
+            mime_type=staged['mime_type']
+        )
 
         # Informações do arquivo
         file_info = {
             'id': file_id,
             'original_name': original_name,
-            'filename': safe_filename,
-            'category': file_category,
-            'size': file_size,
-            'hash': file_hash.hexdigest(),
-            'path': str(file_path),
-            'thumbnail_path': thumbnail_path,
+            'filename': f"{file_id}{ext}",
+            'category': category,
+            'size': blob['size'],
+            'hash': blob['hash'],
+            'mime_type': blob['mime_type'],
+            'description': description,
+            'is_public': False,
+            'downloads': 0,
             'uploaded_by': user_id,
-            'uploaded_at': datetime.now().isoformat(),
-            'mime_type': file.content_type or 'application/octet-stream'
+            'uploaded_at': datetime.now().astimezone()
         }
+        insert_file(cursor, file_info)
 
-        return file_info
+        # Thumbnail gerado em segundo plano, uma vez por conteúdo
+        thumbnail_status = request_thumbnail(cursor, blob) if category == 'images' else None
 
-    except Exception as e:
-        # Limpar arquivo se houver erro
-        if file_path.exists():
-            file_path.unlink()
-        raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+        committing = True
+        conn.commit()
 
+    except Exception:
+        # Blob criado por este ingest sai antes do rollback liberar o advisory
+        # lock; se o próprio commit falhou, fica em disco e é reaproveitado
+        # pelo próximo upload do mesmo conteúdo
+        if blob is not None and not committing:
+            blob_store.discard_placed(blob)
+        conn.rollback()
+        raise
 
-async def create_thumbnail(image_path: Path, file_id: str) -> Optional[str]:
-    """Cria thumbnail para imagens"""
-    try:
-        thumbnail_dir = UPLOAD_DIR / 'thumbnails'
-        thumbnail_path = thumbnail_dir / f"{file_id}_thumb.jpg"
+    finally:
+        cursor.close()
+        conn.close()
 
-        with Image.open(image_path) as img:
-            # Converter para RGB se necessário
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
+    # O staging só é removido com o registro confirmado: em qualquer falha
+    # anterior ele continua disponível para uma nova finalização da sessão
+    Path(staged['temp_path']).unlink(missing_ok=True)
 
-            # Criar thumbnail
-            img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            img.save(thumbnail_path, 'JPEG', quality=85)
+    if thumbnail_status == 'pending':
+        enqueue_thumbnail(blob['hash'], waiter={'user_id': user_id, 'file_id': file_id})
 
-        return str(thumbnail_path)
+    file_info.update({
+        'uploaded_at': file_info['uploaded_at'].isoformat(),
+        'thumbnail_status': thumbnail_status,
+        'deduplicated': blob['deduplicated']
+    })
+    return file_info
 
-    except Exception as e:
-        print(f"Erro ao criar thumbnail: {e}")
-        return None
+
+def get_blob_path(file_info: Dict[str, Any]) -> Path:
+    """Caminho do conteúdo de um upload (derivado do hash, sem consulta)"""
+    return blob_store.blob_path(file_info['hash'])
+
+
+def request_thumbnail(cursor, blob: Dict[str, Any]) -> Optional[str]:
+    """
+    Marca o thumbnail do blob como pendente, se ainda não foi gerado
+    Retorna o status atual: 'ready', 'pending' ou 'failed'
+    """
+    status = blob.get('thumbnail_status')
+    if status in ('ready', 'failed'):
+        return status
+
+    if status != 'pending':
+        blob_store.set_thumbnail(cursor, blob['hash'], 'pending')
+
+    return 'pending'
+
+
+def enqueue_thumbnail(blob_hash: str, waiter: Optional[Dict[str, Any]] = None):
+    """Agenda a geração do thumbnail (chamado após o commit do blob)"""
+    thumbnail_path = UPLOAD_DIR / 'thumbnails' / f"{blob_hash}_thumb.jpg"
+    thumbnail_queue.enqueue(
+        blob_hash, str(blob_store.blob_path(blob_hash)), str(thumbnail_path), waiter=waiter
+    )
+
+
+def resolve_thumbnail(blob_hash: str, status: Optional[str], path: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    Status e caminho do thumbnail a partir das colunas de file_blobs
+    Um status 'pending' sem trabalho na fila (ex.: após reinício) é reenfileirado
+    """
+    if status == 'pending' and not thumbnail_queue.is_pending(blob_hash):
+        enqueue_thumbnail(blob_hash)
+
+    return {'status': status, 'path': path}
+
+
+def get_thumbnail_info(cursor, file_info: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Status e caminho do thumbnail de um upload"""
+    blob = blob_store.get(cursor, file_info['hash'])
+    if blob is None:
+        return {'status': None, 'path': None}
+
+    return resolve_thumbnail(blob['hash'], blob['thumbnail_status'], blob['thumbnail_path'])
+
+
+async def _on_thumbnail_finished(job, thumbnail_path: Optional[str]):
+    """Atualiza o blob e avisa os usuários que aguardavam o thumbnail"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        updated = blob_store.set_thumbnail(
+            cursor, job.blob_hash, 'ready' if thumbnail_path else 'failed', thumbnail_path
+        )
+        conn.commit()
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    if not updated:
+        # Conteúdo excluído enquanto o thumbnail era gerado
+        if thumbnail_path:
+            Path(thumbnail_path).unlink(missing_ok=True)
+        return
+
+    for waiter in job.waiters:
+        await notification_manager.send_event(waiter['user_id'], {
+            "type": "thumbnail_ready" if thumbnail_path else "thumbnail_failed",
+            "file_id": waiter['file_id'],
+            "thumbnail_url": f"/files/{waiter['file_id']}/thumbnail" if thumbnail_path else None
+        })
+
+
+async def get_image_derivative(file_info: Dict[str, Any], width: int, height: int, image_format: str) -> Path:
+    """
+    Obtém (gerando na primeira vez) o derivado de uma imagem no tamanho e formato pedidos
+    """
+    source_path = get_blob_path(file_info)
+    if file_info['category'] != 'images' or not source_path.exists():
+        raise HTTPException(status_code=404, detail="Imagem não encontrada")
+
+    blob = {'hash': file_info['hash'], 'path': str(source_path)}
+
+    try:
+        return await derivative_cache.get_or_create(blob, width, height, image_format)
+    except (OSError, ValueError) as e:
+        print(f"Erro ao gerar derivado: {e}")
+        raise HTTPException(status_code=422, detail="Não foi possível processar a imagem")
 
 
 def get_file_info(file_id: str) -> Optional[Dict[str, Any]]:
     """Obtém informações de um arquivo"""
-    # Em produção, isso viria do banco de dados
-    # Por enquanto, vamos simular
-    return None
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        return fetch_file(cursor, file_id)
 
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def release_file(file_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Remove o registro do upload e libera sua referência ao blob, na mesma transação
+    O conteúdo só é apagado quando nenhum outro upload aponta para ele
+    Retorna o registro removido, ou None se ele já não existia
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
-def delete_file(file_id: str, user_id: int) -> bool:
-    """Exclui arquivo do sistema"""
     try:
-        # Encontrar arquivo (em produção, consultar banco)
-        for category_dir in UPLOAD_DIR.iterdir():
-            if category_dir.is_dir():
-                for file_path in category_dir.glob(f"{file_id}.*"):
-                    file_path.unlink()
-
-                    # Remover thumbnail se existir
-                    thumbnail_path = UPLOAD_DIR / 'thumbnails' / f"{file_id}_thumb.jpg"
-                    if thumbnail_path.exists():
-                        thumbnail_path.unlink()
-
-                    return True
-        return False
+        file_info = delete_file_record(cursor, file_id)
+        if file_info is None:
+            conn.rollback()
+            return None
 
-    except Exception as e:
-        print(f"Erro ao excluir arquivo: {e}")
+        released = blob_store.release(cursor, file_info['hash'])
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    if released:
+        blob_reaper.schedule(released['hash'], [released['path'], released['thumbnail_path']])
+        derivative_cache.discard_blob(released['hash'])
+
+    return file_info
+
+
+def _session_staging_path(session_id: str) -> Path:
+    return UPLOAD_DIR / 'temp' / f"{session_id}.upload"
+
+
+# Hash incremental das sessões atendidas por este processo: session_id -> (offset, sha256)
+# Se o próximo bloco chegar por outro worker (ou após reinício), o hash é
+# recalculado a partir do arquivo na finalização
+_session_hashers: Dict[str, Any] = {}
+_session_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _fetch_upload_session(cursor, session_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    if not is_valid_file_id(session_id):
+        return None
+
+    cursor.execute(f"""
+        SELECT {', '.join(UPLOAD_SESSION_COLUMNS)} FROM upload_sessions
+        WHERE id = %s AND user_id = %s AND expires_at > now()
+    """, (session_id, user_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    session = dict(zip(UPLOAD_SESSION_COLUMNS, row))
+    session['id'] = str(session['id'])
+    return session
+
+
+def expire_upload_sessions(cursor) -> int:
+    """Remove sessões abandonadas e seus arquivos parciais"""
+    cursor.execute("DELETE FROM upload_sessions WHERE expires_at <= now() RETURNING id")
+    expired = [str(row[0]) for row in cursor.fetchall()]
+
+    for session_id in expired:
+        _session_staging_path(session_id).unlink(missing_ok=True)
+        _session_hashers.pop(session_id, None)
+        _session_locks.pop(session_id, None)
+
+    return len(expired)
+
+
+def create_upload_session(
+        user_id: int,
+        filename: str,
+        size: int,
+        category: Optional[str] = None,
+        description: Optional[str] = None
+) -> Dict[str, Any]:
+    """Abre uma sessão de upload retomável e reserva o arquivo de staging"""
+    validation = validate_file_metadata(filename, size, MAX_RESUMABLE_FILE_SIZE)
+    if not validation['valid']:
+        raise HTTPException(status_code=400, detail=validation['errors'])
+
+    session_id = str(uuid.uuid4())
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        expire_upload_sessions(cursor)
+
+        # A sessão aberta já ocupa uma vaga na cota até ser concluída ou expirar
+        lock_user_usage(cursor, user_id)
+        check_upload_quota(cursor, user_id)
+
+        cursor.execute(f"""
+            INSERT INTO upload_sessions (id, user_id, original_name, category, description,
+                                         total_size, expires_at)
+            VALUES (%s, %s, %s, %s, %s, %s, now() + %s)
+            RETURNING {', '.join(UPLOAD_SESSION_COLUMNS)}
+        """, (session_id, user_id, filename, category or validation['category'], description,
+              size, UPLOAD_SESSION_TTL))
+        session = dict(zip(UPLOAD_SESSION_COLUMNS, cursor.fetchone()))
+        session['id'] = str(session['id'])
+
+        create_upload_directories()
+        _session_staging_path(session_id).touch()
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        cursor.close()
+        conn.close()
+
+    _session_hashers[session_id] = (0, hashlib.sha256())
+    return session
+
+
+def get_upload_session(session_id: str, user_id: int) -> Dict[str, Any]:
+    """Estado de uma sessão (usado pelo cliente para saber de onde retomar)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        session = _fetch_upload_session(cursor, session_id, user_id)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada ou expirada")
+
+    return session
+
+
+async def append_upload_chunk(session_id: str, user_id: int, offset: int, stream) -> Dict[str, Any]:
+    """
+    Grava um bloco recebido diretamente no arquivo de staging, a partir de offset
+    O offset precisa ser exatamente o total já recebido; caso contrário a
+    resposta 409 informa de onde o cliente deve continuar
+    """
+    import aiofiles
+
+    lock = _session_locks.setdefault(session_id, asyncio.Lock())
+
+    async with lock:
+        session = get_upload_session(session_id, user_id)
+
+        if offset != session['received_bytes']:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Offset esperado: {session['received_bytes']}",
+                headers={"Upload-Offset": str(session['received_bytes'])}
+            )
+
+        # Continuar o hash incremental só se ele estiver exatamente neste ponto
+        hashed_offset, hasher = _session_hashers.get(session_id, (-1, None))
+        hasher = hasher.copy() if hashed_offset == offset else None
+
+        remaining = session['total_size'] - offset
+        staging_path = _session_staging_path(session_id)
+        written = 0
+
+        async with aiofiles.open(staging_path, 'r+b') as f:
+            await f.seek(offset)
+
+            async for chunk in stream:
+                if not chunk:
+                    continue
+
+                written += len(chunk)
+                if written > min(remaining, UPLOAD_SESSION_MAX_CHUNK):
+                    raise HTTPException(
+                        status_code=413,
+                        detail="Bloco excede o tamanho declarado ou o máximo por requisição"
+                    )
+
+                if hasher is not None:
+                    hasher.update(chunk)
+                await f.write(chunk)
+
+            # Descartar restos de uma tentativa anterior interrompida
+            await f.truncate(offset + written)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("""
+                UPDATE upload_sessions
+                SET received_bytes = received_bytes + %s, expires_at = now() + %s
+                WHERE id = %s AND received_bytes = %s
+                RETURNING received_bytes
+            """, (written, UPLOAD_SESSION_TTL, session_id, offset))
+            row = cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        if row is None:
+            # Outro worker gravou este trecho primeiro
+            _session_hashers.pop(session_id, None)
+            raise HTTPException(status_code=409, detail="Bloco enviado em paralelo; consulte o offset")
+
+        if hasher is not None:
+            _session_hashers[session_id] = (row[0], hasher)
+        else:
+            _session_hashers.pop(session_id, None)
+
+        session['received_bytes'] = row[0]
+        return session
+
+
+def _hash_staged_file(path: Path) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+async def complete_upload_session(session_id: str, user_id: int) -> Dict[str, Any]:
+    """Finaliza a sessão: o arquivo de staging segue o mesmo caminho de um upload comum"""
+    import aiofiles
+
+    lock = _session_locks.setdefault(session_id, asyncio.Lock())
+
+    async with lock:
+        session = get_upload_session(session_id, user_id)
+
+        if session['received_bytes'] != session['total_size']:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload incompleto: {session['received_bytes']}/{session['total_size']} bytes",
+                headers={"Upload-Offset": str(session['received_bytes'])}
+            )
+
+        staging_path = _session_staging_path(session_id)
+
+        hashed_offset, hasher = _session_hashers.pop(session_id, (-1, None))
+        if hashed_offset == session['total_size']:
+            digest = hasher.hexdigest()
+        else:
+            loop = asyncio.get_running_loop()
+            digest = await loop.run_in_executor(None, _hash_staged_file, staging_path)
+
+        async with aiofiles.open(staging_path, 'rb') as f:
+            head = await f.read(MIME_SNIFF_BYTES)
+
+        staged = {
+            'temp_path': staging_path,
+            'size': session['total_size'],
+            'hash': digest,
+            'mime_type': sniff_mime_type(head)
+        }
+
+        try:
+            return await register_staged_file(
+                staged,
+                original_name=session['original_name'],
+                user_id=user_id,
+                category=session['category'],
+                description=session['description'],
+                session_id=session_id
+            )
+
+        except HTTPException as e:
+            # Em outras falhas a transação foi desfeita e a sessão continua
+            # válida (nova finalização, cancelamento ou expiração)
+            if e.status_code == 404:
+                staging_path.unlink(missing_ok=True)
+            raise
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
+
+        finally:
+            _session_locks.pop(session_id, None)
+
+
+def abort_upload_session(session_id: str, user_id: int) -> bool:
+    """Cancela uma sessão e descarta o que já foi recebido"""
+    if not is_valid_file_id(session_id):
         return False
 
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
-# Inicializar diretórios
-create_upload_directories()
\ No newline at end of file
+    try:
+        cursor.execute(
+            "DELETE FROM upload_sessions WHERE id = %s AND user_id = %s RETURNING id",
+            (session_id, user_id)
+        )
+        deleted = cursor.fetchone() is not None
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if deleted:
+        _session_staging_path(session_id).unlink(missing_ok=True)
+        _session_hashers.pop(session_id, None)
+        _session_locks.pop(session_id, None)
+
+    return deleted
+
+
+# Armazenamento deduplicado dos conteúdos
+blob_store = BlobStore(UPLOAD_DIR / 'blobs')
+blob_reaper = BlobReaper(UPLOAD_DIR)
+thumbnail_queue.add_listener(_on_thumbnail_finished)
+
+# Derivados de imagem gerados sob demanda
+derivative_cache = DerivativeCache(UPLOAD_DIR / 'derivatives', DERIVATIVE_CACHE_MAX_BYTES)
\ No newline at end of file
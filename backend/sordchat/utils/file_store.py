@@ -0,0 +1,204 @@
+"""
+Metadados persistentes dos arquivos enviados (PostgreSQL)
+"""
+
+import uuid
+from typing import Optional, Dict, Any
+
+from ..config.settings import load_environment
+from .db_pool import get_db_connection
+
+load_environment()
+
+# Um registro em files por upload; o conteúdo em si é compartilhado em file_blobs
+FILE_STORE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS file_blobs (
+        hash             VARCHAR(64)  PRIMARY KEY,
+        size             BIGINT       NOT NULL,
+        mime_type        VARCHAR(100),
+        path             TEXT         NOT NULL,
+        thumbnail_path   TEXT,
+        thumbnail_status VARCHAR(10),
+        ref_count        INTEGER      NOT NULL DEFAULT 0,
+        created_at       TIMESTAMPTZ  NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        id            UUID         PRIMARY KEY,
+        original_name VARCHAR(255) NOT NULL,
+        filename      VARCHAR(255) NOT NULL,
+        category      VARCHAR(20)  NOT NULL,
+        size          BIGINT       NOT NULL,
+        hash          VARCHAR(64)  NOT NULL REFERENCES file_blobs (hash),
+        mime_type     VARCHAR(100),
+        description   TEXT,
+        is_public     BOOLEAN      NOT NULL DEFAULT FALSE,
+        downloads     INTEGER      NOT NULL DEFAULT 0,
+        uploaded_by   INTEGER      NOT NULL REFERENCES users (id),
+        uploaded_at   TIMESTAMPTZ  NOT NULL DEFAULT now()
+    )
+    """,
+    # Listagem por usuário (com ou sem categoria) em ordem de envio, usada
+    # também como chave da paginação por cursor
+    """
+    CREATE INDEX IF NOT EXISTS idx_files_uploader_time
+        ON files (uploaded_by, uploaded_at DESC, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_files_uploader_category_time
+        ON files (uploaded_by, category, uploaded_at DESC, id DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_files_hash
+        ON files (hash)
+    """,
+    # Sessões de upload retomável; o conteúdo parcial fica em uploads/temp/<id>.upload
+    """
+    CREATE TABLE IF NOT EXISTS upload_sessions (
+        id             UUID         PRIMARY KEY,
+        user_id        INTEGER      NOT NULL REFERENCES users (id),
+        original_name  VARCHAR(255) NOT NULL,
+        category       VARCHAR(20)  NOT NULL,
+        description    TEXT,
+        total_size     BIGINT       NOT NULL,
+        received_bytes BIGINT       NOT NULL DEFAULT 0,
+        created_at     TIMESTAMPTZ  NOT NULL DEFAULT now(),
+        expires_at     TIMESTAMPTZ  NOT NULL
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires
+        ON upload_sessions (expires_at)
+    """,
+    # Uso de armazenamento por usuário e categoria, mantido pelo trigger abaixo
+    # na mesma transação de cada INSERT/DELETE em files
+    """
+    CREATE TABLE IF NOT EXISTS file_usage (
+        user_id     INTEGER     NOT NULL REFERENCES users (id),
+        category    VARCHAR(20) NOT NULL,
+        file_count  INTEGER     NOT NULL DEFAULT 0,
+        total_bytes BIGINT      NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, category)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION file_usage_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE file_usage
+            SET file_count = file_count - 1, total_bytes = total_bytes - OLD.size
+            WHERE user_id = OLD.uploaded_by AND category = OLD.category;
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO file_usage (user_id, category, file_count, total_bytes)
+            VALUES (NEW.uploaded_by, NEW.category, 1, NEW.size)
+            ON CONFLICT (user_id, category) DO UPDATE
+            SET file_count = file_usage.file_count + 1,
+                total_bytes = file_usage.total_bytes + EXCLUDED.total_bytes;
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_file_usage ON files",
+    """
+    CREATE TRIGGER trg_file_usage
+        AFTER INSERT OR DELETE OR UPDATE OF uploaded_by, category, size ON files
+        FOR EACH ROW EXECUTE FUNCTION file_usage_sync()
+    """,
+    # Recalcula os contadores a partir de files (bases existentes ou correção manual)
+    """
+    INSERT INTO file_usage (user_id, category, file_count, total_bytes)
+    SELECT uploaded_by, category, COUNT(*), SUM(size)
+    FROM files
+    GROUP BY uploaded_by, category
+    ON CONFLICT (user_id, category) DO UPDATE
+    SET file_count = EXCLUDED.file_count, total_bytes = EXCLUDED.total_bytes
+    """,
+]
+
+FILE_COLUMNS = (
+    'id', 'original_name', 'filename', 'category', 'size', 'hash', 'mime_type',
+    'description', 'is_public', 'downloads', 'uploaded_by', 'uploaded_at'
+)
+
+UPLOAD_SESSION_COLUMNS = (
+    'id', 'user_id', 'original_name', 'category', 'description',
+    'total_size', 'received_bytes', 'created_at', 'expires_at'
+)
+
+
+def get_file_store_schema_statements():
+    """
+    Retorna os comandos DDL das tabelas de arquivos, na ordem de execução
+    """
+    return FILE_STORE_DDL
+
+
+def row_to_file(row) -> Dict[str, Any]:
+    """Converte uma linha de files (na ordem de FILE_COLUMNS) em dicionário"""
+    file_info = dict(zip(FILE_COLUMNS, row))
+    file_info['id'] = str(file_info['id'])
+    file_info['uploaded_at'] = file_info['uploaded_at'].isoformat()
+    return file_info
+
+
+def is_valid_file_id(file_id: str) -> bool:
+    """Ids de arquivo são UUIDs; qualquer outro valor não existe"""
+    try:
+        uuid.UUID(file_id)
+        return True
+    except ValueError:
+        return False
+
+
+def fetch_file(cursor, file_id: str) -> Optional[Dict[str, Any]]:
+    """Busca um arquivo pela chave primária"""
+    if not is_valid_file_id(file_id):
+        return None
+
+    cursor.execute(
+        f"SELECT {', '.join(FILE_COLUMNS)} FROM files WHERE id = %s",
+        (file_id,)
+    )
+    row = cursor.fetchone()
+    return row_to_file(row) if row else None
+
+
+def insert_file(cursor, file_info: Dict[str, Any]):
+    """Grava o registro de um upload"""
+    cursor.execute(f"""
+        INSERT INTO files ({', '.join(FILE_COLUMNS)})
+        VALUES ({', '.join(['%s'] * len(FILE_COLUMNS))})
+    """, [file_info.get(column) for column in FILE_COLUMNS])
+
+
+def get_user_usage(cursor, user_id: int) -> Dict[str, Dict[str, int]]:
+    """Contadores de uso do usuário por categoria: {categoria: {count, size}}"""
+    cursor.execute("""
+        SELECT category, file_count, total_bytes
+        FROM file_usage
+        WHERE user_id = %s AND file_count > 0
+    """, (user_id,))
+
+    return {
+        category: {'count': file_count, 'size': total_bytes}
+        for category, file_count, total_bytes in cursor.fetchall()
+    }
+
+
+def delete_file_record(cursor, file_id: str) -> Optional[Dict[str, Any]]:
+    """Remove o registro de um upload e retorna o que foi removido"""
+    if not is_valid_file_id(file_id):
+        return None
+
+    cursor.execute(
+        f"DELETE FROM files WHERE id = %s RETURNING {', '.join(FILE_COLUMNS)}",
+        (file_id,)
+    )
+    row = cursor.fetchone()
+    return row_to_file(row) if row else None
@@ -0,0 +1,170 @@
+"""
+Respostas de arquivo com validadores HTTP (ETag/Last-Modified), GET condicional e Range
+"""
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple, Dict
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+RANGE_CHUNK_SIZE = 64 * 1024
+
+# Conteúdo endereçado por hash nunca muda para a mesma URL
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def make_etag(*parts: str) -> str:
+    """ETag forte a partir do hash do conteúdo (e da variante, se houver)"""
+    return '"' + "-".join(parts) + '"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Comparação fraca de If-None-Match, como define a RFC 9110"""
+    if header.strip() == "*":
+        return True
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Avalia If-None-Match (prioritário) e If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified tem resolução de segundos
+        return int(mtime) <= since
+
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um cabeçalho Range de intervalo único
+    Retorna (início, fim) inclusivos, None se o cabeçalho deve ser ignorado
+    ou (-1, -1) se o intervalo não pode ser atendido
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Múltiplos intervalos: responder com o arquivo completo é permitido
+        return None
+
+    start_text, _, end_text = spec.strip().partition("-")
+
+    try:
+        if not start_text:
+            # bytes=-N: últimos N bytes
+            length = int(end_text)
+            if length <= 0 or size == 0:
+                return -1, -1
+            return max(size - length, 0), size - 1
+
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        return -1, -1
+
+    return start, min(end, size - 1)
+
+
+def content_disposition(filename: str) -> str:
+    """Mesmo formato usado pelo FileResponse para downloads"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+async def iter_file_range(path: Path, start: int, end: int):
+    """Lê do disco apenas o intervalo pedido, em blocos"""
+    import aiofiles
+
+    remaining = end - start + 1
+
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(
+        request: Request,
+        path: Path,
+        etag: str,
+        media_type: str,
+        filename: Optional[str] = None,
+        cache_control: str = IMMUTABLE_CACHE_CONTROL
+) -> Response:
+    """
+    Serve um arquivo com ETag forte, Last-Modified e Cache-Control
+    Responde 304 a requisições condicionais válidas e 206 a pedidos de Range
+    """
+    stat_result = os.stat(path)
+    headers: Dict[str, str] = {
+        "etag": etag,
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes"
+    }
+
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range(range_header, stat_result.st_size)
+
+        if byte_range == (-1, -1):
+            return Response(
+                status_code=416,
+                headers={**headers, "content-range": f"bytes */{stat_result.st_size}"}
+            )
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({
+                "content-range": f"bytes {start}-{end}/{stat_result.st_size}",
+                "content-length": str(end - start + 1)
+            })
+            if filename is not None:
+                headers["content-disposition"] = content_disposition(filename)
+
+            return StreamingResponse(
+                iter_file_range(path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+
+    return FileResponse(
+        path=path,
+        filename=filename,
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat_result
+    )
@@ -0,0 +1,339 @@
+"""
+Persistência das notificações (PostgreSQL) com escrita em lote (write-behind)
+"""
+
+import os
+import time
+import asyncio
+from psycopg2.extras import execute_values, Json
+from typing import Dict, List, Set, Tuple, Optional, Any
+
+from ..config.settings import load_environment
+from .db_pool import get_db_connection
+
+load_environment()
+
+NOTIFICATION_FLUSH_INTERVAL = 1  # segundos entre gravações do buffer
+NOTIFICATION_FLUSH_BATCH = 500  # linhas pendentes que antecipam a gravação
+NOTIFICATION_CACHE_TTL = 30  # segundos até recarregar o índice de um usuário da tabela
+NOTIFICATION_PURGE_BATCH = 5000  # expiradas removidas por comando (faixa de idx_notifications_expires)
+
+NOTIFICATION_STORE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS notifications (
+        id         UUID         PRIMARY KEY,
+        user_id    INTEGER      NOT NULL REFERENCES users (id),
+        title      VARCHAR(255) NOT NULL,
+        message    TEXT         NOT NULL,
+        type       VARCHAR(20)  NOT NULL DEFAULT 'info',
+        data       JSONB,
+        read       BOOLEAN      NOT NULL DEFAULT FALSE,
+        created_at TIMESTAMP    NOT NULL,
+        expires_at TIMESTAMP    NOT NULL
+    )
+    """,
+    # Carga do índice em memória (mais recentes de um usuário)
+    """
+    CREATE INDEX IF NOT EXISTS idx_notifications_user_time
+        ON notifications (user_id, created_at DESC)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_notifications_expires
+        ON notifications (expires_at)
+    """,
+]
+
+NOTIFICATION_COLUMNS = (
+    'id', 'user_id', 'title', 'message', 'type', 'data', 'read', 'created_at', 'expires_at'
+)
+
+
+def get_notification_store_schema_statements():
+    """
+    Retorna os comandos DDL da tabela de notificações, na ordem de execução
+    """
+    return NOTIFICATION_STORE_DDL
+
+
+def fetch_user_notifications(user_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Últimas `limit` notificações do usuário, da mais antiga para a mais recente"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT {', '.join(NOTIFICATION_COLUMNS)} FROM (
+                SELECT * FROM notifications
+                WHERE user_id = %s
+                ORDER BY created_at DESC
+                LIMIT %s
+            ) recent
+            ORDER BY created_at
+        """, (user_id, limit))
+
+        rows = []
+        for row in cursor.fetchall():
+            record = dict(zip(NOTIFICATION_COLUMNS, row))
+            record['id'] = str(record['id'])
+            record['created_at'] = record['created_at'].isoformat()
+            record['expires_at'] = record['expires_at'].isoformat()
+            rows.append(record)
+
+        return rows
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def purge_notifications(max_per_user: int) -> Dict[str, int]:
+    """
+    Remove da tabela as notificações expiradas e o excedente de cada usuário
+    (mantém as não lidas e, em seguida, as lidas mais recentes)
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # Expiradas em lotes pela faixa do índice de expires_at
+        expired = 0
+        while True:
+            cursor.execute("""
+                DELETE FROM notifications
+                WHERE id IN (
+                    SELECT id FROM notifications
+                    WHERE expires_at <= now()::timestamp
+                    ORDER BY expires_at
+                    LIMIT %s
+                )
+            """, (NOTIFICATION_PURGE_BATCH,))
+            expired += cursor.rowcount
+            conn.commit()
+            if cursor.rowcount < NOTIFICATION_PURGE_BATCH:
+                break
+
+        # Excedente: apenas usuários acima do limite são ordenados
+        cursor.execute("""
+            DELETE FROM notifications
+            WHERE id IN (
+                SELECT excess.id
+                FROM (
+                    SELECT user_id FROM notifications
+                    GROUP BY user_id
+                    HAVING count(*) > %s
+                ) over_cap
+                CROSS JOIN LATERAL (
+                    SELECT id FROM notifications
+                    WHERE user_id = over_cap.user_id
+                    ORDER BY read, created_at DESC
+                    OFFSET %s
+                ) excess
+            )
+        """, (max_per_user, max_per_user))
+        trimmed = cursor.rowcount
+
+        conn.commit()
+        return {'expired': expired, 'trimmed': trimmed}
+
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class NotificationWriter:
+    """
+    Buffer de escrita da tabela notifications
+    Inclusões, leituras e exclusões são acumuladas e gravadas em uma transação
+    por lote (INSERT de várias linhas, UPDATE/DELETE com ANY); enquanto isso o
+    índice em memória já reflete a alteração
+    """
+
+    def __init__(self):
+        # Sem DATABASE_URL (scripts, benchmark) as notificações ficam só em memória
+        self.enabled = bool(os.getenv("DATABASE_URL"))
+        self.inserts: Dict[str, Any] = {}  # id -> Notification (estado lido no momento da gravação)
+        self.reads: Set[str] = set()
+        self.deletes: Set[str] = set()
+        self._inflight: Tuple[Dict[str, Any], Set[str], Set[str]] = ({}, set(), set())
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'flushes': 0,
+            'rows_written': 0,
+            'errors': 0,
+            'last_flush_ms': None
+        }
+
+    def start(self):
+        """Inicia a gravação periódica (chamado no primeiro uso)"""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._flush_loop(), name="notification-writer")
+
+    async def stop(self):
+        """Encerra o worker gravando tudo o que estiver pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        while self.pending_count():
+            if not await self.flush():
+                break
+
+    def add(self, notification):
+        if not self.enabled:
+            return
+        self.inserts[notification.id] = notification
+        self._changed()
+
+    def mark_read(self, notification_ids):
+        if not self.enabled:
+            return
+        # Inclusões ainda pendentes já gravam o campo read atual
+        self.reads.update(nid for nid in notification_ids if nid not in self.inserts)
+        self._changed()
+
+    def delete(self, notification_ids):
+        if not self.enabled:
+            return
+        for nid in notification_ids:
+            self.inserts.pop(nid, None)
+            self.reads.discard(nid)
+            self.deletes.add(nid)
+        self._changed()
+
+    def pending_count(self) -> int:
+        return len(self.inserts) + len(self.reads) + len(self.deletes)
+
+    def pending_for_user(self, user_id: int) -> Tuple[List[Any], Set[str], Set[str]]:
+        """Alterações ainda não gravadas, para sobrepor a uma carga da tabela"""
+        inflight_inserts, inflight_reads, inflight_deletes = self._inflight
+
+        inserts = [
+            n for n in list(inflight_inserts.values()) + list(self.inserts.values())
+            if n.user_id == user_id
+        ]
+        return inserts, inflight_reads | self.reads, inflight_deletes | self.deletes
+
+    async def flush(self) -> bool:
+        """Grava o buffer atual; em caso de erro as alterações voltam para o buffer"""
+        if not self.pending_count():
+            return True
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        # Um lote por vez, para que as alterações cheguem à tabela na ordem
+        async with self._lock:
+            batch = (self.inserts, self.reads, self.deletes)
+            self.inserts, self.reads, self.deletes = {}, set(), set()
+            self._inflight = batch
+
+            started = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                written = await loop.run_in_executor(None, self._write_batch, *batch)
+
+            except Exception as e:
+                inserts, reads, deletes = batch
+                self.inserts = {**inserts, **self.inserts}
+                self.reads |= reads - self.deletes
+                self.deletes |= deletes
+                self.stats['errors'] += 1
+                print(f"❌ Erro ao gravar notificações: {e}")
+                return False
+
+            finally:
+                self._inflight = ({}, set(), set())
+
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += written
+            self.stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'pending_inserts': len(self.inserts),
+            'pending_reads': len(self.reads),
+            'pending_deletes': len(self.deletes),
+            **self.stats
+        }
+
+    def _changed(self):
+        self.start()
+        if self._wakeup is not None and self.pending_count() >= NOTIFICATION_FLUSH_BATCH:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=NOTIFICATION_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            await self.flush()
+
+    def _write_batch(self, inserts: Dict[str, Any], reads: Set[str], deletes: Set[str]) -> int:
+        """Executado em thread: grava um lote em uma transação"""
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        written = 0
+
+        try:
+            if inserts:
+                execute_values(cursor, f"""
+                    INSERT INTO notifications ({', '.join(NOTIFICATION_COLUMNS)})
+                    VALUES %s
+                    ON CONFLICT (id) DO UPDATE SET
+                        title = EXCLUDED.title,
+                        message = EXCLUDED.message,
+                        data = EXCLUDED.data,
+                        read = EXCLUDED.read,
+                        created_at = EXCLUDED.created_at
+                """, [
+                    (n.id, n.user_id, n.title, n.message, n.type, Json(n.data),
+                     n.read, n.created_at, n.expires_at)
+                    for n in inserts.values()
+                ], page_size=NOTIFICATION_FLUSH_BATCH)
+                written += len(inserts)
+
+            if reads:
+                cursor.execute(
+                    "UPDATE notifications SET read = TRUE WHERE id = ANY(%s::uuid[])",
+                    (list(reads),)
+                )
+                written += cursor.rowcount
+
+            if deletes:
+                cursor.execute(
+                    "DELETE FROM notifications WHERE id = ANY(%s::uuid[])",
+                    (list(deletes),)
+                )
+                written += cursor.rowcount
+
+            conn.commit()
+            return written
+
+        except Exception:
+            conn.rollback()
+            raise
+
+        finally:
+            cursor.close()
+            conn.close()
+
+
+# Instância global do buffer de escrita
+notification_writer = NotificationWriter()
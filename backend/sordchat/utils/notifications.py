@@ -3,39 +3,144 @@ Sistema de Push Notifications
 """
 
 import json
+import time
 import asyncio
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterator, Callable, Tuple, Set
 from datetime import datetime, timedelta
-from dataclasses import dataclass
 import uuid
-
-# Simulação de banco de dados para notificações
+from itertools import islice
+
+from ..config.settings import NOTIFICATION_EXPIRE_DAYS, MAX_NOTIFICATIONS_PER_USER
+from .notification_store import (
+    notification_writer,
+    fetch_user_notifications,
+    purge_notifications,
+    NOTIFICATION_CACHE_TTL
+)
+from .push_queue import push_queue
+
+RETENTION_INTERVAL = 60  # segundos entre passadas de limpeza
+RETENTION_USERS_PER_STEP = 100  # usuários compactados antes de devolver o event loop
+BROADCAST_BATCH_SIZE = 200  # destinatários entregues em paralelo por lote
+BROADCAST_JOBS_KEPT = 100  # jobs de broadcast concluídos mantidos para consulta
+NOTIFICATION_COALESCE_WINDOW = 5 * 60  # segundos em que eventos iguais viram uma notificação
+DIGEST_INTERVAL = 60 * 60  # resumo periódico para usuários offline
+DIGEST_HIGHLIGHTS = 5  # títulos citados no resumo
+
+# Cache das notificações (user_id -> UserNotifications); a tabela notifications
+# é a fonte durável e cada índice é recarregado após NOTIFICATION_CACHE_TTL
 NOTIFICATIONS_DB = {}
+CACHE_LOADED_AT = {}  # user_id -> time.monotonic() da última carga
 USER_SUBSCRIPTIONS = {}
+BROADCAST_JOBS = {}  # job_id -> progresso do broadcast
+COALESCE_WINDOWS = {}  # (user_id, chave) -> (notification_id, início da janela)
+LAST_DIGEST_AT = {}  # user_id -> created_at da última notificação incluída em um resumo
 
 
-@dataclass
 class Notification:
-    id: str
-    user_id: int
-    title: str
-    message: str
-    type: str  # info, success, warning, error
-    data: Optional[Dict[str, Any]] = None
-    read: bool = False
-    created_at: str = None
-    expires_at: str = None
-
-    def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = datetime.now().isoformat()
-        if self.expires_at is None:
-            self.expires_at = (datetime.now() + timedelta(days=7)).isoformat()
+    """Registro compacto de uma notificação (sem __dict__ por instância)"""
+
+    __slots__ = ('id', 'user_id', 'title', 'message', 'type', 'data', 'read', 'created_at', 'expires_at')
+
+    def __init__(
+            self,
+            id: str,
+            user_id: int,
+            title: str,
+            message: str,
+            type: str,  # info, success, warning, error
+            data: Optional[Dict[str, Any]] = None,
+            read: bool = False,
+            created_at: Optional[str] = None,
+            expires_at: Optional[str] = None
+    ):
+        now = datetime.now()
+        self.id = id
+        self.user_id = user_id
+        self.title = title
+        self.message = message
+        self.type = type
+        self.data = data
+        self.read = read
+        self.created_at = created_at or now.isoformat()
+        self.expires_at = expires_at or (now + timedelta(days=NOTIFICATION_EXPIRE_DAYS)).isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "message": self.message,
+            "type": self.type,
+            "data": self.data,
+            "read": self.read,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at
+        }
+
+
+class UserNotifications:
+    """
+    Notificações de um usuário indexadas por id
+    Os dicionários preservam a ordem de inserção, que é mantida igual à ordem
+    de created_at; assim a listagem lê só as mais recentes, marcar/excluir são
+    O(1) e o total de não lidas é o tamanho de `unread`
+    """
+
+    __slots__ = ('items', 'unread')
+
+    def __init__(self):
+        self.items: Dict[str, Notification] = {}  # id -> notificação (mais antiga primeiro)
+        self.unread: Dict[str, Notification] = {}  # subconjunto não lido, mesma ordem
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, notification: Notification):
+        newest = next(reversed(self.items.values()), None) if self.items else None
+
+        self.items[notification.id] = notification
+        if not notification.read:
+            self.unread[notification.id] = notification
+
+        # Inserção fora de ordem (created_at informado e mais antigo): reordenar
+        if newest is not None and notification.created_at < newest.created_at:
+            self.items = dict(sorted(self.items.items(), key=lambda item: item[1].created_at))
+            self.unread = {nid: n for nid, n in self.items.items() if not n.read}
+
+    def get(self, notification_id: str) -> Optional[Notification]:
+        return self.items.get(notification_id)
+
+    def newest(self, unread_only: bool = False) -> Iterator[Notification]:
+        """Percorre da mais recente para a mais antiga"""
+        return reversed((self.unread if unread_only else self.items).values())
+
+    def mark_read(self, notification_id: str) -> bool:
+        notification = self.items.get(notification_id)
+        if notification is None:
+            return False
+
+        notification.read = True
+        self.unread.pop(notification_id, None)
+        return True
+
+    def mark_all_read(self) -> int:
+        count = len(self.unread)
+        for notification in self.unread.values():
+            notification.read = True
+        self.unread.clear()
+        return count
+
+    def remove(self, notification_id: str) -> Optional[Notification]:
+        notification = self.items.pop(notification_id, None)
+        if notification is not None:
+            self.unread.pop(notification_id, None)
+        return notification
 
 
 class NotificationManager:
     def __init__(self):
         self.websocket_connections = {}  # user_id -> websocket
+        self._broadcast_tasks: Set[asyncio.Task] = set()  # o loop guarda só referências fracas
 
     def set_websocket_manager(self, manager):
         """Define o gerenciador de WebSocket"""
@@ -64,47 +169,189 @@ class NotificationManager:
         )
 
         # Salvar no "banco de dados"
-        if user_id not in NOTIFICATIONS_DB:
-            NOTIFICATIONS_DB[user_id] = []
-
-        NOTIFICATIONS_DB[user_id].append(notification)
+        self.store_notification(notification)
+        notification_retention.start()
 
         # Enviar via WebSocket se o usuário estiver online
         if hasattr(self, 'websocket_manager'):
             await self._send_websocket_notification(user_id, notification)
 
         # Enviar push notification se solicitado
-        if send_push:
+        if send_push and self._wants_immediate_push(user_id):
             await self._send_push_notification(user_id, notification)
 
         return notification_id
 
+    async def create_coalesced_notification(
+            self,
+            user_id: int,
+            coalesce_key: str,
+            title: str,
+            message: str,
+            summarize: Callable[[int], Tuple[str, str]],
+            notification_type: str = "info",
+            data: Optional[Dict[str, Any]] = None,
+            send_push: bool = True
+    ) -> str:
+        """
+        Agrupa eventos da mesma chave dentro de NOTIFICATION_COALESCE_WINDOW
+        Enquanto a notificação da janela não for lida, cada novo evento a atualiza
+        (summarize(total) gera título e mensagem) em vez de criar outra; só a
+        primeira gera push
+        """
+        window = COALESCE_WINDOWS.get((user_id, coalesce_key))
+
+        if window and time.monotonic() - window[1] <= NOTIFICATION_COALESCE_WINDOW:
+            user_notifications = self._get_user_index(user_id)
+            notification = user_notifications.get(window[0]) if user_notifications else None
+
+            if notification is not None and not notification.read:
+                count = notification.data.get("count", 1) + 1
+                notification.title, notification.message = summarize(count)
+                notification.data = {**notification.data, **(data or {}), "count": count}
+                notification.created_at = datetime.now().isoformat()
+
+                # Reposiciona como a mais recente
+                user_notifications.remove(notification.id)
+                user_notifications.add(notification)
+                notification_writer.add(notification)
+
+                if hasattr(self, 'websocket_manager'):
+                    try:
+                        await self.websocket_manager.send_personal_message(
+                            self._websocket_payload(notification, "notification_updated"), user_id
+                        )
+                    except Exception as e:
+                        print(f"❌ Erro ao enviar notificação WebSocket: {e}")
+
+                return notification.id
+
+        notification_id = await self.create_notification(
+            user_id=user_id,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            data={**(data or {}), "count": 1, "coalesce_key": coalesce_key},
+            send_push=send_push
+        )
+        COALESCE_WINDOWS[(user_id, coalesce_key)] = (notification_id, time.monotonic())
+        return notification_id
+
+    def is_online(self, user_id: int) -> bool:
+        """Usuário com WebSocket conectado"""
+        if not hasattr(self, 'websocket_manager'):
+            return False
+        return user_id in getattr(self.websocket_manager, 'active_connections', {})
+
+    def _wants_immediate_push(self, user_id: int) -> bool:
+        """Quem optou por resumos (digest_only) não recebe push por evento enquanto offline"""
+        subscription = USER_SUBSCRIPTIONS.get(user_id)
+        if subscription and subscription.get("digest_only"):
+            return self.is_online(user_id)
+        return True
+
+    def store_notification(self, notification: Notification):
+        """Grava a notificação no índice do usuário e no buffer da tabela"""
+        user_notifications = NOTIFICATIONS_DB.get(notification.user_id)
+
+        if user_notifications is None and not notification_writer.enabled:
+            user_notifications = NOTIFICATIONS_DB[notification.user_id] = UserNotifications()
+
+        # Usuário ainda não carregado: a notificação entra no índice na primeira
+        # leitura (carga da tabela + alterações pendentes do buffer)
+        if user_notifications is not None:
+            user_notifications.add(notification)
+
+        notification_writer.add(notification)
+
+    def _get_user_index(self, user_id: int) -> Optional[UserNotifications]:
+        """Índice do usuário, carregado da tabela quando ausente ou antigo"""
+        if notification_writer.enabled:
+            loaded_at = CACHE_LOADED_AT.get(user_id)
+            if loaded_at is None or time.monotonic() - loaded_at > NOTIFICATION_CACHE_TTL:
+                self._load_user(user_id)
+
+        return NOTIFICATIONS_DB.get(user_id)
+
+    def _load_user(self, user_id: int):
+        try:
+            rows = fetch_user_notifications(user_id, MAX_NOTIFICATIONS_PER_USER)
+        except Exception as e:
+            # Mantém o que já estiver em memória e tenta de novo após o TTL
+            print(f"❌ Erro ao carregar notificações do usuário {user_id}: {e}")
+            CACHE_LOADED_AT[user_id] = time.monotonic()
+            return
+
+        user_notifications = UserNotifications()
+        for row in rows:
+            user_notifications.add(Notification(**row))
+
+        # Sobrepor o que este processo ainda não gravou
+        inserts, reads, deletes = notification_writer.pending_for_user(user_id)
+        for notification in inserts:
+            user_notifications.add(notification)
+        for notification_id in reads & user_notifications.items.keys():
+            user_notifications.mark_read(notification_id)
+        for notification_id in deletes & user_notifications.items.keys():
+            user_notifications.remove(notification_id)
+
+        # Mesmo vazio o índice fica no cache, para receber as próximas notificações
+        NOTIFICATIONS_DB[user_id] = user_notifications
+        CACHE_LOADED_AT[user_id] = time.monotonic()
+
+    def store_notifications(self, notifications: List[Notification]):
+        """Grava várias notificações de uma vez (broadcast)"""
+        for notification in notifications:
+            self.store_notification(notification)
+
+    def _websocket_payload(self, notification: Notification, event_type: str = "notification") -> str:
+        payload = {
+            "type": event_type,
+            "notification": {
+                "id": notification.id,
+                "title": notification.title,
+                "message": notification.message,
+                "type": notification.type,
+                "data": notification.data,
+                "created_at": notification.created_at
+            }
+        }
+
+        # Contador junto do evento, quando o índice do usuário está em memória,
+        # para o cliente não precisar consultar /unread-count
+        user_notifications = NOTIFICATIONS_DB.get(notification.user_id)
+        if user_notifications is not None:
+            payload["unread_count"] = len(user_notifications.unread)
+
+        return json.dumps(payload)
+
     async def _send_websocket_notification(self, user_id: int, notification: Notification):
         """Envia notificação via WebSocket"""
         try:
             if hasattr(self, 'websocket_manager'):
-                message = {
-                    "type": "notification",
-                    "notification": {
-                        "id": notification.id,
-                        "title": notification.title,
-                        "message": notification.message,
-                        "type": notification.type,
-                        "data": notification.data,
-                        "created_at": notification.created_at
-                    }
-                }
-
                 await self.websocket_manager.send_personal_message(
-                    json.dumps(message), user_id
+                    self._websocket_payload(notification), user_id
                 )
                 print(f"📱 Notificação WebSocket enviada para usuário {user_id}")
 
         except Exception as e:
             print(f"❌ Erro ao enviar notificação WebSocket: {e}")
 
+    async def send_event(self, user_id: int, event: Dict[str, Any]) -> bool:
+        """Envia um evento em tempo real (sem criar notificação) se o usuário estiver online"""
+        if not hasattr(self, 'websocket_manager'):
+            return False
+
+        try:
+            return bool(await self.websocket_manager.send_personal_message(
+                json.dumps(event), user_id
+            ))
+        except Exception as e:
+            print(f"❌ Erro ao enviar evento WebSocket: {e}")
+            return False
+
     async def _send_push_notification(self, user_id: int, notification: Notification):
-        """Envia push notification"""
+        """Agenda a push notification na fila de entrega (não espera a rede)"""
         try:
             # Verificar se o usuário tem subscription
             subscription = USER_SUBSCRIPTIONS.get(user_id)
@@ -112,13 +359,138 @@ class NotificationManager:
                 print(f"⚠️ Usuário {user_id} não tem subscription para push notifications")
                 return
 
-            # Simular envio de push notification
-            # Em produção, usar serviços como Firebase, OneSignal, etc.
-            print(f"🔔 Push notification enviada para usuário {user_id}: {notification.title}")
+            push_queue.enqueue(subscription, {
+                "id": notification.id,
+                "title": notification.title,
+                "body": notification.message,
+                "type": notification.type,
+                "data": notification.data,
+                "created_at": notification.created_at
+            })
 
         except Exception as e:
             print(f"❌ Erro ao enviar push notification: {e}")
 
+    def start_broadcast(
+            self,
+            user_ids: List[int],
+            title: str,
+            message: str,
+            notification_type: str = "info",
+            data: Optional[Dict[str, Any]] = None,
+            created_by: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Agenda um broadcast e retorna o job imediatamente
+        A gravação e a entrega acontecem em segundo plano (_run_broadcast)
+        """
+        job = {
+            "id": str(uuid.uuid4()),
+            "status": "queued",
+            "total": len(user_ids),
+            "stored": 0,
+            "delivered": 0,
+            "offline": 0,
+            "failed": 0,
+            "created_by": created_by,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None
+        }
+
+        BROADCAST_JOBS[job["id"]] = job
+        self._prune_broadcast_jobs()
+
+        task = asyncio.create_task(
+            self._run_broadcast(job, user_ids, title, message, notification_type, data or {}),
+            name=f"broadcast-{job['id']}"
+        )
+        self._broadcast_tasks.add(task)
+        task.add_done_callback(self._broadcast_done)
+        return job
+
+    def _broadcast_done(self, task: asyncio.Task):
+        self._broadcast_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Erro no broadcast {task.get_name()}: {task.exception()}")
+
+    def get_broadcast_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progresso de um broadcast"""
+        return BROADCAST_JOBS.get(job_id)
+
+    async def _run_broadcast(
+            self,
+            job: Dict[str, Any],
+            user_ids: List[int],
+            title: str,
+            message: str,
+            notification_type: str,
+            data: Dict[str, Any]
+    ):
+        job["status"] = "running"
+        notification_retention.start()
+
+        try:
+            for offset in range(0, len(user_ids), BROADCAST_BATCH_SIZE):
+                batch = [
+                    Notification(
+                        id=str(uuid.uuid4()),
+                        user_id=user_id,
+                        title=title,
+                        message=message,
+                        type=notification_type,
+                        data=data
+                    )
+                    for user_id in user_ids[offset:offset + BROADCAST_BATCH_SIZE]
+                ]
+
+                self.store_notifications(batch)
+                job["stored"] += len(batch)
+
+                results = await asyncio.gather(
+                    *(self._deliver_broadcast_notification(n) for n in batch),
+                    return_exceptions=True
+                )
+
+                for result in results:
+                    if isinstance(result, Exception):
+                        job["failed"] += 1
+                    elif result:
+                        job["delivered"] += 1
+                    else:
+                        job["offline"] += 1
+
+            job["status"] = "completed"
+            print(f"📢 Broadcast {job['id']}: {job['delivered']} entregues, "
+                  f"{job['offline']} offline, {job['failed']} falhas")
+
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            print(f"❌ Erro no broadcast {job['id']}: {e}")
+
+        finally:
+            job["finished_at"] = datetime.now().isoformat()
+
+    async def _deliver_broadcast_notification(self, notification: Notification) -> bool:
+        """Entrega uma notificação do broadcast; retorna se o frame chegou ao socket do usuário"""
+        delivered = False
+
+        if hasattr(self, 'websocket_manager'):
+            delivered = bool(await self.websocket_manager.send_personal_message(
+                self._websocket_payload(notification), notification.user_id
+            ))
+
+        # Push apenas para quem tem subscription (evita um aviso por destinatário)
+        if notification.user_id in USER_SUBSCRIPTIONS and self._wants_immediate_push(notification.user_id):
+            await self._send_push_notification(notification.user_id, notification)
+
+        return delivered
+
+    def _prune_broadcast_jobs(self):
+        finished = [job_id for job_id, job in BROADCAST_JOBS.items() if job["finished_at"]]
+        for job_id in finished[:max(len(finished) - BROADCAST_JOBS_KEPT, 0)]:
+            del BROADCAST_JOBS[job_id]
+
     def get_user_notifications(
             self,
             user_id: int,
@@ -127,85 +499,74 @@ class NotificationManager:
     ) -> List[Dict[str, Any]]:
         """Obtém notificações do usuário"""
 
-        user_notifications = NOTIFICATIONS_DB.get(user_id, [])
-
-        if unread_only:
-            user_notifications = [n for n in user_notifications if not n.read]
-
-        # Ordenar por data (mais recentes primeiro)
-        user_notifications.sort(key=lambda x: x.created_at, reverse=True)
-
-        # Limitar quantidade
-        user_notifications = user_notifications[:limit]
+        user_notifications = self._get_user_index(user_id)
+        if user_notifications is None:
+            return []
 
+        # Já em ordem (mais recentes primeiro): lê apenas `limit` itens
         return [
-            {
-                "id": n.id,
-                "title": n.title,
-                "message": n.message,
-                "type": n.type,
-                "data": n.data,
-                "read": n.read,
-                "created_at": n.created_at,
-                "expires_at": n.expires_at
-            }
-            for n in user_notifications
+            n.to_dict()
+            for n in islice(user_notifications.newest(unread_only), max(limit, 0))
         ]
 
     def mark_as_read(self, user_id: int, notification_id: str) -> bool:
         """Marca notificação como lida"""
 
-        user_notifications = NOTIFICATIONS_DB.get(user_id, [])
+        user_notifications = self._get_user_index(user_id)
+        if user_notifications is None or not user_notifications.mark_read(notification_id):
+            return False
 
-        for notification in user_notifications:
-            if notification.id == notification_id:
-                notification.read = True
-                return True
-
-        return False
+        notification_writer.mark_read([notification_id])
+        return True
 
     def mark_all_as_read(self, user_id: int) -> int:
         """Marca todas as notificações como lidas"""
 
-        user_notifications = NOTIFICATIONS_DB.get(user_id, [])
-        count = 0
-
-        for notification in user_notifications:
-            if not notification.read:
-                notification.read = True
-                count += 1
+        user_notifications = self._get_user_index(user_id)
+        if user_notifications is None:
+            return 0
 
+        unread_ids = list(user_notifications.unread)
+        count = user_notifications.mark_all_read()
+        notification_writer.mark_read(unread_ids)
         return count
 
     def delete_notification(self, user_id: int, notification_id: str) -> bool:
         """Exclui uma notificação"""
 
-        user_notifications = NOTIFICATIONS_DB.get(user_id, [])
+        user_notifications = self._get_user_index(user_id)
+        if user_notifications is None or user_notifications.remove(notification_id) is None:
+            return False
 
-        for i, notification in enumerate(user_notifications):
-            if notification.id == notification_id:
-                del user_notifications[i]
-                return True
-
-        return False
+        notification_writer.delete([notification_id])
+        return True
 
     def get_unread_count(self, user_id: int) -> int:
         """Obtém quantidade de notificações não lidas"""
 
-        user_notifications = NOTIFICATIONS_DB.get(user_id, [])
-        return len([n for n in user_notifications if not n.read])
+        user_notifications = self._get_user_index(user_id)
+        return len(user_notifications.unread) if user_notifications is not None else 0
 
     def subscribe_user(self, user_id: int, subscription_data: Dict[str, Any]):
         """Registra subscription do usuário para push notifications"""
 
         USER_SUBSCRIPTIONS[user_id] = {
+            "user_id": user_id,
             "endpoint": subscription_data.get("endpoint"),
             "keys": subscription_data.get("keys", {}),
+            "digest_only": bool(subscription_data.get("digest_only", False)),
             "created_at": datetime.now().isoformat()
         }
 
+        notification_digest.start()
         print(f"✅ Usuário {user_id} inscrito para push notifications")
 
+    def _on_push_gone(self, subscription: Dict[str, Any]):
+        """Subscription recusada pelo serviço de push (404/410): remover"""
+        current = USER_SUBSCRIPTIONS.get(subscription.get("user_id"))
+        if current and current["endpoint"] == subscription["endpoint"]:
+            self.unsubscribe_user(subscription["user_id"])
+
     def unsubscribe_user(self, user_id: int):
         """Remove subscription do usuário"""
 
@@ -214,8 +575,250 @@ class NotificationManager:
             print(f"❌ Usuário {user_id} removido das push notifications")
 
 
+class NotificationRetention:
+    """
+    Remove notificações expiradas e limita cada usuário a MAX_NOTIFICATIONS_PER_USER
+    (primeiro as lidas mais antigas; as não lidas só quando não há lidas suficientes)
+
+    Roda em segundo plano, em passos de RETENTION_USERS_PER_STEP usuários, então
+    nenhuma requisição paga pela limpeza
+    """
+
+    def __init__(self, max_per_user: int = MAX_NOTIFICATIONS_PER_USER):
+        self.max_per_user = max_per_user
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'passes': 0,
+            'expired': 0,
+            'trimmed': 0,
+            'last_pass': None
+        }
+
+    def start(self):
+        """Inicia a limpeza periódica (chamado no primeiro uso)"""
+        if self._task is not None and not self._task.done():
+            return
+
+        try:
+            self._task = asyncio.get_running_loop().create_task(
+                self._retention_loop(), name="notification-retention"
+            )
+        except RuntimeError:
+            # Sem event loop (scripts e benchmarks): limpeza apenas sob demanda
+            self._task = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def compact_user(self, user_id: int, now: Optional[str] = None) -> Dict[str, int]:
+        """Aplica expiração e limite a um usuário; retorna quantas saíram"""
+        user_notifications = NOTIFICATIONS_DB.get(user_id)
+        if user_notifications is None:
+            return {'expired': 0, 'trimmed': 0}
+
+        now = now or datetime.now().isoformat()
+
+        expired = [nid for nid, n in user_notifications.items.items() if n.expires_at <= now]
+        for nid in expired:
+            user_notifications.remove(nid)
+
+        trimmed = []
+        excess = len(user_notifications) - self.max_per_user
+        if excess > 0:
+            trimmed = list(islice(
+                (nid for nid, n in user_notifications.items.items() if n.read), excess
+            ))
+            if len(trimmed) < excess:
+                trimmed.extend(islice(user_notifications.unread, excess - len(trimmed)))
+
+            for nid in trimmed:
+                user_notifications.remove(nid)
+
+        notification_writer.delete(expired + trimmed)
+
+        if not user_notifications:
+            NOTIFICATIONS_DB.pop(user_id, None)
+            CACHE_LOADED_AT.pop(user_id, None)
+
+        return {'expired': len(expired), 'trimmed': len(trimmed)}
+
+    async def run_pass(self) -> Dict[str, Any]:
+        """Percorre todos os usuários, devolvendo o event loop entre os passos"""
+        started = datetime.now()
+        now = started.isoformat()
+        report = {'users_scanned': 0, 'expired': 0, 'trimmed': 0, 'evicted_users': 0}
+
+        # Índices não recarregados há mais de um TTL saem do cache; a próxima
+        # leitura do usuário os traz de volta da tabela
+        if notification_writer.enabled:
+            stale_before = time.monotonic() - NOTIFICATION_CACHE_TTL
+            for user_id in [u for u, loaded_at in CACHE_LOADED_AT.items() if loaded_at < stale_before]:
+                NOTIFICATIONS_DB.pop(user_id, None)
+                del CACHE_LOADED_AT[user_id]
+                report['evicted_users'] += 1
+
+        expired_windows = time.monotonic() - NOTIFICATION_COALESCE_WINDOW
+        for key in [k for k, (_, opened_at) in COALESCE_WINDOWS.items() if opened_at < expired_windows]:
+            del COALESCE_WINDOWS[key]
+
+        user_ids = list(NOTIFICATIONS_DB)
+        report['users_scanned'] = len(user_ids)
+
+        for offset in range(0, len(user_ids), RETENTION_USERS_PER_STEP):
+            for user_id in user_ids[offset:offset + RETENTION_USERS_PER_STEP]:
+                reclaimed = self.compact_user(user_id, now)
+                report['expired'] += reclaimed['expired']
+                report['trimmed'] += reclaimed['trimmed']
+            await asyncio.sleep(0)
+
+        # Mesma regra aplicada às linhas da tabela que não estão em memória
+        # (as removidas acima são gravadas antes, para não contar duas vezes)
+        if notification_writer.enabled:
+            await notification_writer.flush()
+            loop = asyncio.get_running_loop()
+            purged = await loop.run_in_executor(None, purge_notifications, self.max_per_user)
+            report['expired'] += purged['expired']
+            report['trimmed'] += purged['trimmed']
+
+        report['duration_ms'] = round((datetime.now() - started).total_seconds() * 1000, 2)
+        report['finished_at'] = datetime.now().isoformat()
+
+        self.stats['passes'] += 1
+        self.stats['expired'] += report['expired']
+        self.stats['trimmed'] += report['trimmed']
+        self.stats['last_pass'] = report
+
+        if report['expired'] or report['trimmed']:
+            print(f"🧹 Notificações: {report['expired']} expiradas, {report['trimmed']} acima do limite removidas")
+
+        return report
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'users': len(NOTIFICATIONS_DB),
+            'notifications': sum(len(n) for n in NOTIFICATIONS_DB.values()),
+            'max_per_user': self.max_per_user,
+            'expire_days': NOTIFICATION_EXPIRE_DAYS,
+            'persistence': notification_writer.get_metrics(),
+            **self.stats
+        }
+
+    async def _retention_loop(self):
+        while True:
+            await asyncio.sleep(RETENTION_INTERVAL)
+            try:
+                await self.run_pass()
+            except Exception as e:
+                print(f"❌ Erro na limpeza de notificações: {e}")
+
+
+class NotificationDigest:
+    """
+    Resumo periódico das notificações não lidas para usuários offline com
+    subscription: um único push por usuário a cada DIGEST_INTERVAL, cobrindo
+    apenas o que chegou desde o resumo anterior
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {'runs': 0, 'digests_sent': 0, 'last_run': None}
+
+    def start(self):
+        """Inicia o agendamento (chamado na primeira subscription)"""
+        if self._task is not None and not self._task.done():
+            return
+
+        try:
+            self._task = asyncio.get_running_loop().create_task(
+                self._digest_loop(), name="notification-digest"
+            )
+        except RuntimeError:
+            self._task = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def build_digest(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Não lidas desde o último resumo, agrupadas por tipo"""
+        user_notifications = notification_manager._get_user_index(user_id)
+        if user_notifications is None:
+            return None
+
+        since = LAST_DIGEST_AT.get(user_id, "")
+        pending = []
+        for notification in user_notifications.newest(unread_only=True):
+            if notification.created_at <= since:
+                break
+            pending.append(notification)
+
+        if not pending:
+            return None
+
+        by_type: Dict[str, int] = {}
+        for notification in pending:
+            by_type[notification.type] = by_type.get(notification.type, 0) + 1
+
+        return {
+            "user_id": user_id,
+            "count": len(pending),
+            "events": sum((n.data or {}).get("count", 1) for n in pending),
+            "by_type": by_type,
+            "highlights": [n.title for n in pending[:DIGEST_HIGHLIGHTS]],
+            "since": since or None,
+            "until": pending[0].created_at
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        """Envia os resumos pendentes; retorna quantos usuários receberam"""
+        report = {'users_checked': 0, 'digests_sent': 0}
+
+        for user_id in list(USER_SUBSCRIPTIONS):
+            if notification_manager.is_online(user_id):
+                continue
+
+            report['users_checked'] += 1
+            digest = self.build_digest(user_id)
+            if digest is None:
+                continue
+
+            await notification_manager._send_push_notification(user_id, Notification(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                title=f"📬 Resumo: {digest['count']} notificações não lidas",
+                message=" · ".join(digest["highlights"]),
+                type="info",
+                data={"action": "view_notifications", "digest": digest}
+            ))
+
+            LAST_DIGEST_AT[user_id] = digest["until"]
+            report['digests_sent'] += 1
+
+        report['finished_at'] = datetime.now().isoformat()
+        self.stats['runs'] += 1
+        self.stats['digests_sent'] += report['digests_sent']
+        self.stats['last_run'] = report
+        return report
+
+    async def _digest_loop(self):
+        while True:
+            await asyncio.sleep(DIGEST_INTERVAL)
+            try:
+                await self.run()
+            except Exception as e:
+                print(f"❌ Erro ao enviar resumos de notificações: {e}")
+
+
 # Instância global do gerenciador
 notification_manager = NotificationManager()
+push_queue.on_gone = notification_manager._on_push_gone
+notification_retention = NotificationRetention()
+notification_digest = NotificationDigest()
 
 
 # Funções de conveniência para diferentes tipos de notificação
@@ -252,14 +855,25 @@ async def notify_task_completed(user_id: int, task_name: str, task_id: int):
     )
 
 
-async def notify_new_message(user_id: int, sender_name: str, message_preview: str):
-    """Notificação de nova mensagem"""
-    await notification_manager.create_notification(
+async def notify_new_message(
+        user_id: int,
+        sender_name: str,
+        message_preview: str,
+        sender_id: Optional[int] = None
+):
+    """Notificação de nova mensagem (mensagens seguidas do mesmo remetente são agrupadas)"""
+
+    def summarize(count: int) -> Tuple[str, str]:
+        return "💬 Novas Mensagens", f"{count} novas mensagens de {sender_name}"
+
+    await notification_manager.create_coalesced_notification(
         user_id=user_id,
+        coalesce_key=f"message:{sender_id if sender_id is not None else sender_name}",
         title="💬 Nova Mensagem",
         message=f"{sender_name}: {message_preview[:50]}...",
+        summarize=summarize,
         notification_type="info",
-        data={"action": "open_chat"}
+        data={"action": "open_chat", "sender_id": sender_id}
     )
 
 
@@ -3,7 +3,7 @@ Sistema de permissões por nível de acesso
 """
 
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from fastapi import HTTPException, status
 
 
@@ -140,3 +140,55 @@ def get_user_permissions(user_level: str) -> List[str]:
         return LEVEL_PERMISSIONS.get(level_enum, [])
     except ValueError:
         return []
+
+
+def ticket_visibility_filter(current_user: dict, alias: str = "t") -> Tuple[List[str], List]:
+    """
+    Condições SQL de visibilidade de tickets para o usuário atual
+    Retorna (condições, parâmetros); lista vazia quando pode ver todos
+    """
+    if has_permission(current_user.get("access_level"), Permission.VIEW_ALL_TICKETS):
+        # Master e Coordenador podem ver todos os tickets
+        return [], []
+
+    # Usuário padrão só vê seus próprios tickets
+    user_id = current_user.get("user_id")
+    return [f"({alias}.created_by_id = %s OR {alias}.assigned_to_id = %s)"], [user_id, user_id]
+
+
+def task_visibility_filter(
+        current_user: dict,
+        department: Optional[str] = None,
+        alias: str = "t"
+) -> Tuple[List[str], List]:
+    """
+    Condições SQL de visibilidade de tasks para o usuário atual
+    department é o departamento do usuário (usado apenas por coordenadores)
+    """
+    user_id = current_user.get("user_id")
+    access_level = current_user.get("access_level")
+
+    if has_permission(access_level, Permission.VIEW_ALL_TASKS):
+        # Master pode ver todas as tasks
+        return [], []
+
+    if has_permission(access_level, Permission.VIEW_DEPARTMENT_TASKS):
+        if department:
+            # Coordenador vê tasks do departamento + públicas
+            return [f"""
+                ({alias}.visibility = 'todos' OR 
+                 ({alias}.visibility = 'departamento' AND 
+                  ({alias}.created_by_id IN (SELECT id FROM users WHERE department = %s) OR
+                   {alias}.assigned_to_id = %s)) OR
+                 {alias}.created_by_id = %s OR {alias}.assigned_to_id = %s)
+            """], [department, user_id, user_id, user_id]
+
+        # Se não tem departamento, só vê suas próprias tasks
+        return [f"({alias}.created_by_id = %s OR {alias}.assigned_to_id = %s)"], [user_id, user_id]
+
+    # Usuário padrão vê apenas suas tasks + públicas atribuídas a ele
+    return [f"""
+        ({alias}.created_by_id = %s OR 
+         ({alias}.assigned_to_id = %s AND {alias}.visibility = 'todos'))
+    """], [user_id, user_id]
+
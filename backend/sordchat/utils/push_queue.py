@@ -0,0 +1,367 @@
+"""
+Fila de entrega de push notifications com workers, lotes por endpoint,
+novas tentativas com backoff exponencial e dead-letter
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import urllib.request
+import urllib.error
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from itertools import groupby
+from typing import Dict, List, Optional, Any, Callable
+
+from ..config.settings import ENABLE_PUSH_NOTIFICATIONS
+
+PUSH_WORKERS = 4  # entregas simultâneas
+PUSH_BATCH_MAX = 20  # notificações agrupadas em um único envio ao mesmo endpoint
+PUSH_BATCH_MAX_BYTES = 3 * 1024  # payload do lote; Web Push/FCM aceitam ~4KB já cifrados
+PUSH_BATCH_OVERHEAD = 64  # bytes do envelope {"type": "batch", ...}
+PUSH_MAX_ATTEMPTS = 5
+PUSH_BACKOFF_BASE = 1.0  # segundos; dobra a cada tentativa
+PUSH_BACKOFF_MAX = 60.0
+PUSH_TIMEOUT = 10  # segundos por requisição
+PUSH_TTL = 24 * 60 * 60  # validade da mensagem no serviço de push
+DEAD_LETTER_KEPT = 500
+
+
+class PushDeliveryError(Exception):
+    """Falha de entrega; `retryable` indica se vale tentar de novo"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+    @property
+    def gone(self) -> bool:
+        """Subscription expirada ou cancelada no navegador"""
+        return self.status_code in (404, 410)
+
+
+def classify_status(status_code: int) -> PushDeliveryError:
+    """Converte o status HTTP do serviço de push em erro (429/5xx: tentar de novo)"""
+    retryable = status_code == 429 or status_code >= 500
+    return PushDeliveryError(f"Serviço de push respondeu {status_code}", status_code, retryable)
+
+
+class PushTransport(ABC):
+    """Interface dos transportes de push; send levanta PushDeliveryError em falhas"""
+
+    name = "base"
+
+    @abstractmethod
+    async def send(self, subscription: Dict[str, Any], payload: str):
+        """Entrega o payload (JSON) no endpoint da subscription"""
+
+
+class LogTransport(PushTransport):
+    """Apenas registra o envio (desenvolvimento, sem chaves VAPID)"""
+
+    name = "log"
+
+    async def send(self, subscription: Dict[str, Any], payload: str):
+        print(f"🔔 Push (simulado) para {subscription.get('endpoint')}: {payload[:80]}")
+
+
+class HttpTransport(PushTransport):
+    """
+    POST do payload JSON diretamente no endpoint da subscription
+    Usado em testes contra um endpoint local que imita o serviço de push
+    """
+
+    name = "http"
+
+    def __init__(self, timeout: float = PUSH_TIMEOUT):
+        self.timeout = timeout
+
+    async def send(self, subscription: Dict[str, Any], payload: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._post, subscription['endpoint'], payload)
+
+    def _post(self, endpoint: str, payload: str):
+        request = urllib.request.Request(
+            endpoint,
+            data=payload.encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'TTL': str(PUSH_TTL)},
+            method='POST'
+        )
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                return
+        except urllib.error.HTTPError as e:
+            raise classify_status(e.code)
+        except (urllib.error.URLError, TimeoutError, OSError) as e:
+            raise PushDeliveryError(f"Endpoint inacessível: {e}")
+
+
+class WebPushTransport(PushTransport):
+    """Web Push com VAPID via pywebpush (executado em thread, a biblioteca é síncrona)"""
+
+    name = "webpush"
+
+    def __init__(self, vapid_private_key: str, vapid_email: str, timeout: float = PUSH_TIMEOUT):
+        from pywebpush import webpush, WebPushException
+
+        self._webpush = webpush
+        self._exception = WebPushException
+        self.vapid_private_key = vapid_private_key
+        self.vapid_claims = {"sub": f"mailto:{vapid_email}"}
+        self.timeout = timeout
+
+    async def send(self, subscription: Dict[str, Any], payload: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._send, subscription, payload)
+
+    def _send(self, subscription: Dict[str, Any], payload: str):
+        try:
+            self._webpush(
+                subscription_info={"endpoint": subscription['endpoint'], "keys": subscription.get('keys', {})},
+                data=payload,
+                vapid_private_key=self.vapid_private_key,
+                vapid_claims=dict(self.vapid_claims),
+                ttl=PUSH_TTL,
+                timeout=self.timeout
+            )
+        except self._exception as e:
+            response = getattr(e, 'response', None)
+            if response is not None:
+                raise classify_status(response.status_code)
+            raise PushDeliveryError(str(e))
+        except OSError as e:
+            raise PushDeliveryError(f"Endpoint inacessível: {e}")
+
+
+def take_batch(items: List[Dict[str, Any]], max_items: int = PUSH_BATCH_MAX,
+               max_bytes: int = PUSH_BATCH_MAX_BYTES) -> List[Dict[str, Any]]:
+    """
+    Primeiros itens que cabem em um envio (quantidade e bytes do payload)
+    O primeiro item sempre entra, mesmo acima do limite, e segue sozinho
+    """
+    batch = []
+    total = PUSH_BATCH_OVERHEAD
+
+    for item in items[:max_items]:
+        total += item['size'] + 1  # vírgula entre as notificações
+        if batch and total > max_bytes:
+            break
+        batch.append(item)
+
+    return batch
+
+
+def create_default_transport() -> PushTransport:
+    """Web Push quando há chave VAPID configurada; caso contrário, apenas log"""
+    vapid_private_key = os.getenv("VAPID_PRIVATE_KEY")
+
+    if ENABLE_PUSH_NOTIFICATIONS and vapid_private_key:
+        try:
+            return WebPushTransport(vapid_private_key, os.getenv("VAPID_CLAIMS_EMAIL", "admin@sordchat.local"))
+        except ImportError:
+            print("⚠️ pywebpush não instalado - push notifications apenas simuladas")
+
+    return LogTransport()
+
+
+class PushQueue:
+    """
+    Fila de push por endpoint
+    Notificações que chegam para um endpoint enquanto ele espera ou está sendo
+    atendido são agrupadas (até PUSH_BATCH_MAX e PUSH_BATCH_MAX_BYTES) em um
+    único envio; um endpoint nunca é atendido por dois workers ao mesmo tempo
+    Cada notificação conta as próprias tentativas, mesmo quando muda de lote
+    """
+
+    def __init__(self, transport: Optional[PushTransport] = None, workers: int = PUSH_WORKERS):
+        self.transport = transport
+        self.workers = workers
+        self.pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # endpoint -> {subscription, messages}
+        self.in_progress = set()
+        self.dead_letter = deque(maxlen=DEAD_LETTER_KEPT)
+        self.on_gone: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks = set()
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'requests': 0,
+            'retries': 0,
+            'dead_lettered': 0,
+            'gone': 0
+        }
+
+    def set_transport(self, transport: PushTransport):
+        """Troca o transporte (ex.: HttpTransport apontando para um stub local)"""
+        self.transport = transport
+
+    def start(self):
+        """Inicia os workers (chamado no primeiro uso)"""
+        if self._tasks:
+            return
+
+        if self.transport is None:
+            self.transport = create_default_transport()
+
+        self._ready = asyncio.Queue()
+        for endpoint in self.pending:
+            self._ready.put_nowait(endpoint)
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"push-worker-{i}")
+            for i in range(self.workers)
+        ]
+        print(f"🔔 Fila de push iniciada com {self.workers} workers ({self.transport.name})")
+
+    async def stop(self):
+        for task in [*self._tasks, *self._retry_tasks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_tasks, return_exceptions=True)
+        self._tasks = []
+        self._retry_tasks = set()
+
+    def enqueue(self, subscription: Dict[str, Any], message: Dict[str, Any]):
+        """Agenda a entrega e retorna imediatamente"""
+        self.start()
+        self.stats['enqueued'] += 1
+        self._add(subscription, [{
+            'message': message,
+            'size': len(json.dumps(message).encode('utf-8')),
+            'attempts': 0,
+            'queued_at': time.time()
+        }])
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Aguarda a fila esvaziar (inclusive tentativas agendadas)"""
+        deadline = time.monotonic() + timeout
+        while self.pending or self.in_progress or self._retry_tasks:
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'transport': self.transport.name if self.transport else None,
+            'workers': self.workers,
+            'pending_endpoints': len(self.pending),
+            'pending_messages': sum(len(e['messages']) for e in self.pending.values()),
+            'in_progress': len(self.in_progress),
+            'scheduled_retries': len(self._retry_tasks),
+            'dead_letter': len(self.dead_letter),
+            **self.stats
+        }
+
+    def get_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(self.dead_letter)[-limit:]
+
+    def _add(self, subscription: Dict[str, Any], items: List[Dict[str, Any]]):
+        endpoint = subscription['endpoint']
+        entry = self.pending.get(endpoint)
+
+        if entry is None:
+            self.pending[endpoint] = {'subscription': subscription, 'messages': list(items)}
+            # Endpoint em atendimento volta para a fila quando o worker terminar
+            if endpoint not in self.in_progress:
+                self._ready.put_nowait(endpoint)
+        else:
+            entry['subscription'] = subscription
+            entry['messages'].extend(items)
+
+    async def _worker(self):
+        while True:
+            endpoint = await self._ready.get()
+            entry = self.pending.get(endpoint)
+            if entry is None or endpoint in self.in_progress:
+                continue
+
+            items = take_batch(entry['messages'])
+            del entry['messages'][:len(items)]
+            if not entry['messages']:
+                del self.pending[endpoint]
+
+            self.in_progress.add(endpoint)
+            try:
+                await self._deliver(entry['subscription'], items)
+            except Exception as e:
+                print(f"❌ Erro inesperado na fila de push: {e}")
+            finally:
+                self.in_progress.discard(endpoint)
+                if endpoint in self.pending:
+                    self._ready.put_nowait(endpoint)
+
+    async def _deliver(self, subscription: Dict[str, Any], items: List[Dict[str, Any]]):
+        messages = [item['message'] for item in items]
+        payload = json.dumps(messages[0] if len(messages) == 1 else {
+            "type": "batch",
+            "count": len(messages),
+            "notifications": messages
+        })
+
+        self.stats['requests'] += 1
+        try:
+            await self.transport.send(subscription, payload)
+
+        except PushDeliveryError as e:
+            for item in items:
+                item['attempts'] += 1
+
+            if e.gone:
+                self.stats['gone'] += 1
+                self._dead_letter(subscription, items, str(e))
+                if self.on_gone:
+                    self.on_gone(subscription)
+                return
+
+            if not e.retryable:
+                self._dead_letter(subscription, items, str(e))
+                return
+
+            exhausted = [item for item in items if item['attempts'] >= PUSH_MAX_ATTEMPTS]
+            if exhausted:
+                self._dead_letter(subscription, exhausted, str(e))
+
+            # Itens que entraram no lote em tentativas diferentes mantêm o próprio backoff
+            remaining = sorted((item for item in items if item['attempts'] < PUSH_MAX_ATTEMPTS),
+                               key=lambda item: item['attempts'])
+            for attempts, group in groupby(remaining, key=lambda item: item['attempts']):
+                self._schedule_retry(subscription, list(group), attempts)
+            return
+
+        self.stats['sent'] += len(items)
+
+    def _schedule_retry(self, subscription: Dict[str, Any], items: List[Dict[str, Any]], attempts: int):
+        # Backoff exponencial com jitter para não sincronizar as novas tentativas
+        delay = min(PUSH_BACKOFF_BASE * (2 ** (attempts - 1)), PUSH_BACKOFF_MAX)
+        delay *= random.uniform(0.8, 1.2)
+        self.stats['retries'] += 1
+
+        async def retry_later():
+            await asyncio.sleep(delay)
+            self._add(subscription, items)
+
+        task = asyncio.create_task(retry_later())
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    def _dead_letter(self, subscription: Dict[str, Any], items: List[Dict[str, Any]], error: str):
+        self.stats['dead_lettered'] += len(items)
+        for item in items:
+            self.dead_letter.append({
+                'endpoint': subscription['endpoint'],
+                'user_id': subscription.get('user_id'),
+                'message': item['message'],
+                'attempts': item['attempts'],
+                'error': error,
+                'failed_at': time.time()
+            })
+        print(f"💀 {len(items)} push descartado(s) após {max(item['attempts'] for item in items)} tentativas: {error}")
+
+
+# Instância global da fila
+push_queue = PushQueue()
@@ -0,0 +1,265 @@
+"""
+Agregados de atividade por hora e por dia (PostgreSQL)
+
+Os gráficos do dashboard leem estas tabelas em vez de agrupar as linhas de
+tasks e messages a cada requisição
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+# Escopos dos agregados: por usuário (scope_key = id) e por departamento (scope_key = nome)
+SCOPE_USER = "user"
+SCOPE_DEPARTMENT = "department"
+
+# Métricas mantidas pelos triggers
+METRIC_TASKS_CREATED = "tasks_created"
+METRIC_TASKS_COMPLETED = "tasks_completed"  # no dia de criação da task, como o gráfico de timeline
+METRIC_MESSAGES = "messages"
+
+# Cada linha de tasks/messages contribui com +1 nos baldes do seu created_at;
+# o trigger desfaz a contribuição da linha antiga (OLD) e aplica a nova (NEW)
+# na mesma transação da escrita, como file_usage
+#
+# O escopo de departamento usa o departamento *atual* de quem criou/enviou:
+# quando users.department muda, todo o histórico do usuário passa para o novo
+# departamento (trg_rollup_user_department), para que as reversões seguintes
+# subtraiam do mesmo departamento que recebeu a contagem
+ROLLUP_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS activity_rollup_hourly (
+        scope     VARCHAR(10)  NOT NULL,
+        scope_key VARCHAR(100) NOT NULL,
+        metric    VARCHAR(30)  NOT NULL,
+        bucket    TIMESTAMPTZ  NOT NULL,
+        count     INTEGER      NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, scope_key, metric, bucket)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS activity_rollup_daily (
+        scope     VARCHAR(10)  NOT NULL,
+        scope_key VARCHAR(100) NOT NULL,
+        metric    VARCHAR(30)  NOT NULL,
+        bucket    DATE         NOT NULL,
+        count     INTEGER      NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, scope_key, metric, bucket)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_bump(
+        p_scope TEXT, p_key TEXT, p_metric TEXT, p_at TIMESTAMPTZ, p_delta INTEGER
+    ) RETURNS void AS $$
+    BEGIN
+        IF p_key IS NULL OR p_at IS NULL THEN
+            RETURN;
+        END IF;
+
+        INSERT INTO activity_rollup_hourly (scope, scope_key, metric, bucket, count)
+        VALUES (p_scope, p_key, p_metric, date_trunc('hour', p_at), p_delta)
+        ON CONFLICT (scope, scope_key, metric, bucket) DO UPDATE
+        SET count = activity_rollup_hourly.count + EXCLUDED.count;
+
+        INSERT INTO activity_rollup_daily (scope, scope_key, metric, bucket, count)
+        VALUES (p_scope, p_key, p_metric, p_at::date, p_delta)
+        ON CONFLICT (scope, scope_key, metric, bucket) DO UPDATE
+        SET count = activity_rollup_daily.count + EXCLUDED.count;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Task: conta para quem criou, para o responsável (uma vez só se for a mesma
+    # pessoa) e para o departamento de quem criou
+    """
+    CREATE OR REPLACE FUNCTION rollup_task_row(
+        p_creator INTEGER, p_assignee INTEGER, p_at TIMESTAMPTZ, p_status TEXT, p_delta INTEGER
+    ) RETURNS void AS $$
+    DECLARE
+        v_done BOOLEAN := coalesce(lower(p_status) = 'concluida', FALSE);
+        v_department TEXT;
+    BEGIN
+        PERFORM rollup_bump('user', p_creator::text, 'tasks_created', p_at, p_delta);
+        IF v_done THEN
+            PERFORM rollup_bump('user', p_creator::text, 'tasks_completed', p_at, p_delta);
+        END IF;
+
+        IF p_assignee IS NOT NULL AND p_assignee <> p_creator THEN
+            PERFORM rollup_bump('user', p_assignee::text, 'tasks_created', p_at, p_delta);
+            IF v_done THEN
+                PERFORM rollup_bump('user', p_assignee::text, 'tasks_completed', p_at, p_delta);
+            END IF;
+        END IF;
+
+        SELECT department INTO v_department FROM users WHERE id = p_creator;
+        PERFORM rollup_bump('department', v_department, 'tasks_created', p_at, p_delta);
+        IF v_done THEN
+            PERFORM rollup_bump('department', v_department, 'tasks_completed', p_at, p_delta);
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Mensagem: conta para remetente e destinatário e para o departamento do remetente
+    """
+    CREATE OR REPLACE FUNCTION rollup_message_row(
+        p_sender INTEGER, p_receiver INTEGER, p_at TIMESTAMPTZ, p_delta INTEGER
+    ) RETURNS void AS $$
+    DECLARE
+        v_department TEXT;
+    BEGIN
+        PERFORM rollup_bump('user', p_sender::text, 'messages', p_at, p_delta);
+
+        IF p_receiver IS NOT NULL AND p_receiver <> p_sender THEN
+            PERFORM rollup_bump('user', p_receiver::text, 'messages', p_at, p_delta);
+        END IF;
+
+        SELECT department INTO v_department FROM users WHERE id = p_sender;
+        PERFORM rollup_bump('department', v_department, 'messages', p_at, p_delta);
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_tasks_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM rollup_task_row(OLD.created_by_id, OLD.assigned_to_id, OLD.created_at, OLD.status::text, -1);
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM rollup_task_row(NEW.created_by_id, NEW.assigned_to_id, NEW.created_at, NEW.status::text, 1);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_messages_sync() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM rollup_message_row(OLD.sender_id, OLD.receiver_id, OLD.created_at, -1);
+        END IF;
+
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM rollup_message_row(NEW.sender_id, NEW.receiver_id, NEW.created_at, 1);
+        END IF;
+
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # Move as contagens de departamento de um usuário (tasks criadas e mensagens
+    # enviadas), agregadas por hora, do departamento antigo para o novo
+    """
+    CREATE OR REPLACE FUNCTION rollup_move_department(
+        p_user INTEGER, p_old TEXT, p_new TEXT
+    ) RETURNS void AS $$
+    DECLARE
+        r RECORD;
+    BEGIN
+        FOR r IN
+            SELECT 'tasks_created' AS metric, date_trunc('hour', created_at) AS at, count(*)::int AS n
+            FROM tasks WHERE created_by_id = p_user
+            GROUP BY 2
+            UNION ALL
+            SELECT 'tasks_completed', date_trunc('hour', created_at), count(*)::int
+            FROM tasks WHERE created_by_id = p_user AND lower(status::text) = 'concluida'
+            GROUP BY 2
+            UNION ALL
+            SELECT 'messages', date_trunc('hour', created_at), count(*)::int
+            FROM messages WHERE sender_id = p_user
+            GROUP BY 2
+        LOOP
+            PERFORM rollup_bump('department', p_old, r.metric, r.at, -r.n);
+            PERFORM rollup_bump('department', p_new, r.metric, r.at, r.n);
+        END LOOP;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_user_department_sync() RETURNS trigger AS $$
+    BEGIN
+        PERFORM rollup_move_department(NEW.id, OLD.department::text, NEW.department::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_rollup_tasks ON tasks",
+    """
+    CREATE TRIGGER trg_rollup_tasks
+        AFTER INSERT OR DELETE OR UPDATE OF status, created_by_id, assigned_to_id, created_at ON tasks
+        FOR EACH ROW EXECUTE FUNCTION rollup_tasks_sync()
+    """,
+    "DROP TRIGGER IF EXISTS trg_rollup_messages ON messages",
+    """
+    CREATE TRIGGER trg_rollup_messages
+        AFTER INSERT OR DELETE OR UPDATE OF sender_id, receiver_id, created_at ON messages
+        FOR EACH ROW EXECUTE FUNCTION rollup_messages_sync()
+    """,
+    "DROP TRIGGER IF EXISTS trg_rollup_user_department ON users",
+    """
+    CREATE TRIGGER trg_rollup_user_department
+        AFTER UPDATE OF department ON users
+        FOR EACH ROW
+        WHEN (OLD.department IS DISTINCT FROM NEW.department)
+        EXECUTE FUNCTION rollup_user_department_sync()
+    """,
+    # Recalcula os agregados a partir das tabelas (bases existentes ou correção manual)
+    "DELETE FROM activity_rollup_hourly",
+    "DELETE FROM activity_rollup_daily",
+    """
+    SELECT rollup_task_row(created_by_id, assigned_to_id, created_at, status::text, 1)
+    FROM tasks
+    """,
+    """
+    SELECT rollup_message_row(sender_id, receiver_id, created_at, 1)
+    FROM messages
+    """,
+]
+
+
+def get_rollup_schema_statements():
+    """
+    Retorna os comandos DDL das tabelas de agregados, na ordem de execução
+    """
+    return ROLLUP_DDL
+
+
+def fetch_daily_series(cursor, scope: str, scope_key, metrics: List[str], days: int) -> Tuple[List[date], Dict[str, List[int]]]:
+    """
+    Série diária dos últimos `days` dias (incluindo hoje), com zero nos dias
+    sem atividade: (dias, {métrica: [contagem por dia]})
+    """
+    cursor.execute("SELECT CURRENT_DATE")
+    today = cursor.fetchone()[0]
+    start = today - timedelta(days=days - 1)
+
+    cursor.execute("""
+        SELECT metric, bucket, count
+        FROM activity_rollup_daily
+        WHERE scope = %s AND scope_key = %s AND metric = ANY(%s)
+          AND bucket BETWEEN %s AND %s
+    """, (scope, str(scope_key), list(metrics), start, today))
+
+    counts = {(metric, bucket): count for metric, bucket, count in cursor.fetchall()}
+    dates = [start + timedelta(days=i) for i in range(days)]
+
+    return dates, {
+        metric: [counts.get((metric, day), 0) for day in dates]
+        for metric in metrics
+    }
+
+
+def fetch_hour_of_day(cursor, scope: str, scope_key, metric: str, hours: int) -> List[int]:
+    """
+    Soma dos baldes horários das últimas `hours` horas (incluindo a atual)
+    agrupada pela hora do dia: lista com 24 posições (0-23)
+    """
+    cursor.execute("""
+        SELECT EXTRACT(HOUR FROM bucket)::int AS hour, SUM(count)
+        FROM activity_rollup_hourly
+        WHERE scope = %s AND scope_key = %s AND metric = %s
+          AND bucket >= date_trunc('hour', now()) - make_interval(hours => %s)
+        GROUP BY 1
+    """, (scope, str(scope_key), metric, hours - 1))
+
+    by_hour = {hour: int(total) for hour, total in cursor.fetchall()}
+    return [by_hour.get(h, 0) for h in range(24)]
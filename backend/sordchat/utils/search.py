@@ -0,0 +1,178 @@
+"""
+Índices de busca textual (PostgreSQL)
+"""
+
+# Configuração de dicionário usada em todos os índices de texto
+SEARCH_LANGUAGE = "portuguese"
+
+# Destaque dos termos encontrados nos trechos retornados
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2"
+
+# Índice invertido das mensagens: a coluna gerada é recalculada pelo próprio
+# PostgreSQL em INSERT/UPDATE e sai do índice GIN junto com a linha no DELETE
+MESSAGE_SEARCH_DDL = [
+    f"""
+    ALTER TABLE messages
+        ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{SEARCH_LANGUAGE}', coalesce(content, ''))) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_search_vector
+        ON messages USING GIN (search_vector)
+    """,
+]
+
+
+# Índices de trigramas do diretório de usuários: atendem tanto o autocomplete
+# quanto os filtros ILIKE '%termo%' de list_users, que deixam de varrer a tabela
+USER_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_full_name_trgm
+        ON users USING GIN (full_name gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_username_trgm
+        ON users USING GIN (username gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_users_email_trgm
+        ON users USING GIN (email gin_trgm_ops)
+    """,
+]
+
+
+# Índice unificado de tickets e tasks. Cada linha espelha os campos usados
+# pelas regras de visibilidade (created_by_id, assigned_to_id, visibility)
+# para que os mesmos filtros de list_tickets/list_tasks possam ser aplicados
+SEARCH_DOCUMENTS_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS search_documents (
+        entity_type    VARCHAR(10) NOT NULL,
+        entity_id      INTEGER     NOT NULL,
+        title          TEXT        NOT NULL,
+        body           TEXT,
+        status         VARCHAR(20),
+        priority       VARCHAR(20),
+        visibility     VARCHAR(20),
+        created_by_id  INTEGER,
+        assigned_to_id INTEGER,
+        created_at     TIMESTAMPTZ,
+        updated_at     TIMESTAMPTZ,
+        search_vector  tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_LANGUAGE}', coalesce(body, '')), 'B')
+        ) STORED,
+        PRIMARY KEY (entity_type, entity_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_search_documents_vector
+        ON search_documents USING GIN (search_vector)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_search_documents_assigned
+        ON search_documents (assigned_to_id)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_search_documents_created_by
+        ON search_documents (created_by_id)
+    """,
+    # Manutenção incremental: cada escrita em tickets/tasks atualiza apenas o
+    # documento correspondente, na mesma transação. Os enums são gravados em
+    # minúsculas, como os valores usados pelas regras de visibilidade e filtros
+    """
+    CREATE OR REPLACE FUNCTION search_documents_sync_ticket() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM search_documents WHERE entity_type = 'ticket' AND entity_id = OLD.id;
+            RETURN OLD;
+        END IF;
+
+        INSERT INTO search_documents (entity_type, entity_id, title, body, status, priority,
+                                      visibility, created_by_id, assigned_to_id, created_at, updated_at)
+        VALUES ('ticket', NEW.id, NEW.title, NEW.description, lower(NEW.status::text), lower(NEW.priority::text),
+                NULL, NEW.created_by_id, NEW.assigned_to_id, NEW.created_at, NEW.updated_at)
+        ON CONFLICT (entity_type, entity_id) DO UPDATE
+            SET title = EXCLUDED.title,
+                body = EXCLUDED.body,
+                status = EXCLUDED.status,
+                priority = EXCLUDED.priority,
+                created_by_id = EXCLUDED.created_by_id,
+                assigned_to_id = EXCLUDED.assigned_to_id,
+                updated_at = EXCLUDED.updated_at;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION search_documents_sync_task() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM search_documents WHERE entity_type = 'task' AND entity_id = OLD.id;
+            RETURN OLD;
+        END IF;
+
+        INSERT INTO search_documents (entity_type, entity_id, title, body, status, priority,
+                                      visibility, created_by_id, assigned_to_id, created_at, updated_at)
+        VALUES ('task', NEW.id, NEW.name,
+                concat_ws(' ', NEW.description, (
+                    SELECT string_agg(c->>'content', ' ')
+                    FROM json_array_elements(coalesce(NEW.comments::json, '[]'::json)) c
+                )),
+                lower(NEW.status::text), lower(NEW.urgency::text), lower(NEW.visibility::text),
+                NEW.created_by_id, NEW.assigned_to_id, NEW.created_at, NEW.updated_at)
+        ON CONFLICT (entity_type, entity_id) DO UPDATE
+            SET title = EXCLUDED.title,
+                body = EXCLUDED.body,
+                status = EXCLUDED.status,
+                priority = EXCLUDED.priority,
+                visibility = EXCLUDED.visibility,
+                created_by_id = EXCLUDED.created_by_id,
+                assigned_to_id = EXCLUDED.assigned_to_id,
+                updated_at = EXCLUDED.updated_at;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_search_documents_tickets ON tickets",
+    """
+    CREATE TRIGGER trg_search_documents_tickets
+        AFTER INSERT OR UPDATE OR DELETE ON tickets
+        FOR EACH ROW EXECUTE FUNCTION search_documents_sync_ticket()
+    """,
+    "DROP TRIGGER IF EXISTS trg_search_documents_tasks ON tasks",
+    """
+    CREATE TRIGGER trg_search_documents_tasks
+        AFTER INSERT OR UPDATE OR DELETE ON tasks
+        FOR EACH ROW EXECUTE FUNCTION search_documents_sync_task()
+    """,
+    # Carga inicial dos registros que já existiam (no-op nas execuções seguintes)
+    "UPDATE tickets SET id = id WHERE id NOT IN "
+    "(SELECT entity_id FROM search_documents WHERE entity_type = 'ticket')",
+    "UPDATE tasks SET id = id WHERE id NOT IN "
+    "(SELECT entity_id FROM search_documents WHERE entity_type = 'task')",
+]
+
+
+def escape_like(term: str) -> str:
+    """
+    Escapa os curingas de LIKE/ILIKE em um termo digitado pelo usuário
+    """
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def get_search_schema_statements():
+    """
+    Retorna todos os comandos DDL dos índices de busca, na ordem de execução
+    """
+    return MESSAGE_SEARCH_DDL + USER_SEARCH_DDL + SEARCH_DOCUMENTS_DDL
+
+
+def apply_search_schema(cursor):
+    """
+    Cria (ou mantém) as colunas e índices de busca textual
+    Todos os comandos são idempotentes
+    """
+    for statement in get_search_schema_statements():
+        cursor.execute(statement)
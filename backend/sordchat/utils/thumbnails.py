@@ -0,0 +1,210 @@
+"""
+Fila de geração de thumbnails fora do caminho da requisição
+"""
+
+import os
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Tuple
+
+THUMBNAIL_SIZE = (300, 300)
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+def render_image(source_path: str, target_path: str, size: Tuple[int, int],
+                 image_format: str = 'JPEG', quality: int = THUMBNAIL_QUALITY) -> str:
+    """
+    Decodifica e redimensiona a imagem (executado em um processo do pool)
+    Grava em arquivo temporário e renomeia para nunca expor um arquivo incompleto
+    """
+    from PIL import Image  # carregado apenas nos processos do pool
+
+    temp_path = f"{target_path}.part"
+
+    with Image.open(source_path) as img:
+        # JPEG não tem canal alfa (e CMYK/16 bits também viram RGB);
+        # WebP e PNG preservam a transparência
+        if image_format == 'JPEG':
+            if img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA')
+
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        img.save(temp_path, image_format, quality=quality)
+
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+def preload_image_library() -> int:
+    """Importa o PIL no processo do pool (aquecimento); retorna o pid"""
+    from PIL import Image  # noqa: F401
+
+    return os.getpid()
+
+
+def render_thumbnail(source_path: str, target_path: str, size: Tuple[int, int] = THUMBNAIL_SIZE) -> str:
+    """Thumbnail JPEG padrão das listagens"""
+    return render_image(source_path, target_path, size, 'JPEG', THUMBNAIL_QUALITY)
+
+
+class ThumbnailJob:
+    """Trabalho pendente para um conteúdo; vários uploads podem aguardar o mesmo"""
+
+    __slots__ = ('blob_hash', 'source_path', 'target_path', 'waiters', 'enqueued_at')
+
+    def __init__(self, blob_hash: str, source_path: str, target_path: str):
+        self.blob_hash = blob_hash
+        self.source_path = source_path
+        self.target_path = target_path
+        self.waiters: List[Dict[str, Any]] = []
+        self.enqueued_at = time.perf_counter()
+
+
+class ThumbnailQueue:
+    """
+    Fila assíncrona consumida por workers que delegam o trabalho de CPU
+    a um ProcessPoolExecutor, mantendo o event loop livre
+    """
+
+    def __init__(self, workers: int = THUMBNAIL_WORKERS):
+        self.workers = workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.jobs: Dict[str, ThumbnailJob] = {}  # blob_hash -> trabalho pendente
+        self.listeners: List[Callable[[ThumbnailJob, Optional[str]], Awaitable[None]]] = []
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {
+            'enqueued': 0,
+            'completed': 0,
+            'failed': 0,
+            'in_progress': 0,
+            'total_processing_ms': 0.0,
+            'max_processing_ms': 0.0,
+            'last_processing_ms': 0.0,
+            'total_wait_ms': 0.0
+        }
+
+    def add_listener(self, callback: Callable[[ThumbnailJob, Optional[str]], Awaitable[None]]):
+        """Registra callback chamado ao fim de cada trabalho (caminho ou None em caso de falha)"""
+        self.listeners.append(callback)
+
+    def start(self):
+        """Cria o pool de processos e os workers (chamado no primeiro uso)"""
+        if self._tasks:
+            return
+
+        self.queue = asyncio.Queue()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"thumbnail-worker-{i}")
+            for i in range(self.workers)
+        ]
+        print(f"🖼️ Fila de thumbnails iniciada com {self.workers} workers")
+
+    async def warm_up(self):
+        """Sobe os processos do pool e carrega o PIL antes do primeiro upload"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executor, preload_image_library)
+            for _ in range(self.workers)
+        ))
+
+    async def stop(self):
+        """Cancela os workers e encerra o pool de processos"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def enqueue(self, blob_hash: str, source_path: str, target_path: str,
+                waiter: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Agenda a geração do thumbnail e retorna imediatamente com status 'pending'
+        Pedidos repetidos para o mesmo conteúdo aguardam o trabalho já enfileirado
+        """
+        self.start()
+
+        job = self.jobs.get(blob_hash)
+        if job is None:
+            job = ThumbnailJob(blob_hash, source_path, target_path)
+            self.jobs[blob_hash] = job
+            self.queue.put_nowait(job)
+            self.stats['enqueued'] += 1
+
+        if waiter:
+            job.waiters.append(waiter)
+
+        return 'pending'
+
+    async def run_in_pool(self, func: Callable, *args) -> Any:
+        """Executa trabalho de CPU no mesmo pool de processos dos thumbnails"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def is_pending(self, blob_hash: str) -> bool:
+        return blob_hash in self.jobs
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Profundidade da fila e tempos de processamento por imagem"""
+        finished = self.stats['completed'] + self.stats['failed']
+        return {
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'in_progress': self.stats['in_progress'],
+            'workers': self.workers,
+            'enqueued': self.stats['enqueued'],
+            'completed': self.stats['completed'],
+            'failed': self.stats['failed'],
+            'avg_processing_ms': round(self.stats['total_processing_ms'] / finished, 2) if finished else 0,
+            'max_processing_ms': round(self.stats['max_processing_ms'], 2),
+            'last_processing_ms': round(self.stats['last_processing_ms'], 2),
+            'avg_wait_ms': round(self.stats['total_wait_ms'] / finished, 2) if finished else 0
+        }
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self.queue.get()
+            started = time.perf_counter()
+            self.stats['in_progress'] += 1
+            self.stats['total_wait_ms'] += (started - job.enqueued_at) * 1000
+
+            thumbnail_path = None
+            try:
+                thumbnail_path = await loop.run_in_executor(
+                    self.executor, render_thumbnail, job.source_path, job.target_path
+                )
+                self.stats['completed'] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Erro ao criar thumbnail: {e}")
+                self.stats['failed'] += 1
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.stats['in_progress'] -= 1
+                self.stats['total_processing_ms'] += elapsed_ms
+                self.stats['last_processing_ms'] = elapsed_ms
+                self.stats['max_processing_ms'] = max(self.stats['max_processing_ms'], elapsed_ms)
+                self.jobs.pop(job.blob_hash, None)
+                self.queue.task_done()
+
+            for listener in self.listeners:
+                try:
+                    await listener(job, thumbnail_path)
+                except Exception as e:
+                    print(f"Erro ao processar conclusão de thumbnail: {e}")
+
+
+# Instância global da fila
+thumbnail_queue = ThumbnailQueue()
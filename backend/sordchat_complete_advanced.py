@@ -14,12 +14,21 @@ import json
 import asyncio
 import os
 import uuid
+import base64
 import sqlite3  # Importar sqlite3 para as operações diretas no banco
 
+try:
+    import magic
+except ImportError:
+    # Sem libmagic: usar o content-type informado pelo cliente
+    magic = None
+
 # Configurações
 SECRET_KEY = "sordchat_secret_key_super_secure_2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 horas
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB por leitura/escrita
 
 # Configuração do banco de dados
 SQLALCHEMY_DATABASE_URL = "sqlite:///./sordchat.db"
@@ -139,6 +148,41 @@ def init_database():
                        )
                    ''')
 
+    # Índice de busca textual das mensagens (FTS5 com conteúdo externo)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+    fts_exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+                   CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                       content,
+                       content='messages',
+                       content_rowid='id',
+                       tokenize='unicode61 remove_diacritics 2'
+                   )
+                   ''')
+
+    # Triggers mantêm o índice atualizado em inserções, edições e exclusões
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                       INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                   END
+                   ''')
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                       INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                   END
+                   ''')
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+                       INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                       INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                   END
+                   ''')
+
+    if not fts_exists:
+        # Indexar mensagens que já existiam antes da criação do índice
+        cursor.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
     # NOVAS TABELAS KANBAN
 
     # Tabela de quadros Kanban
@@ -910,6 +954,21 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
 
 # Upload de arquivos
+def sniff_content_type(head: bytes, fallback: str) -> str:
+    """Detecta o tipo MIME pelos primeiros bytes; usa o tipo declarado se não for possível"""
+    if magic is None:
+        return fallback
+    try:
+        detected = magic.from_buffer(head[:2048], mime=True)
+    except Exception as e:
+        print(f"Erro ao detectar tipo do arquivo: {e}")
+        return fallback
+    # Tipos genéricos não acrescentam informação ao que o cliente declarou
+    if not detected or detected in ('application/octet-stream', 'application/zip'):
+        return fallback
+    return detected
+
+
 @app.post("/files/upload")
 async def upload_file(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     try:
@@ -924,10 +983,6 @@ async def upload_file(file: UploadFile = File(...), current_user: dict = Depends
         if file.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Tipo de arquivo não permitido")
 
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=400, detail="Arquivo muito grande")
-
         # Salvar arquivo
         upload_dir = "uploads"
         os.makedirs(upload_dir, exist_ok=True)
@@ -936,15 +991,35 @@ async def upload_file(file: UploadFile = File(...), current_user: dict = Depends
         unique_filename = f"{uuid.uuid4()}.{file_extension}"
         file_path = os.path.join(upload_dir, unique_filename)
 
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Gravar em blocos: memória constante e limite verificado durante a leitura
+        file_size = 0
+        content_type = file.content_type
+        try:
+            with open(file_path, "wb") as f:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    if file_size == 0:
+                        content_type = sniff_content_type(chunk, file.content_type)
+
+                    file_size += len(chunk)
+                    if file_size > MAX_UPLOAD_SIZE:
+                        raise HTTPException(status_code=413, detail="Arquivo muito grande")
+
+                    f.write(chunk)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
 
         # Salvar no banco
         file_record = FileUpload(
             filename=file.filename,
             file_path=file_path,
-            file_size=len(content),
-            content_type=file.content_type,
+            file_size=file_size,
+            content_type=content_type,
             uploaded_by=current_user['id']
         )
 
@@ -955,10 +1030,12 @@ async def upload_file(file: UploadFile = File(...), current_user: dict = Depends
             "id": file_record.id,
             "filename": file.filename,
             "file_path": file_path,
-            "file_size": len(content),
-            "content_type": file.content_type
+            "file_size": file_size,
+            "content_type": content_type
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -1074,6 +1151,116 @@ async def toggle_reaction(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def build_fts_query(text: str) -> str:
+    """Converte o texto digitado em uma consulta FTS5 segura (termos entre aspas, último como prefixo)"""
+    terms = [term.replace('"', '""') for term in text.split() if term.strip('"')]
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def encode_search_cursor(score: float, message_id: int) -> str:
+    raw = json.dumps({"score": score, "id": message_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor: str):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(data["score"]), int(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+# Busca textual de mensagens
+@app.get("/messages/search")
+async def search_messages(
+        q: str,
+        receiver_id: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        current_user: dict = Depends(get_current_user)
+):
+    match_query = build_fts_query(q)
+    if not match_query:
+        raise HTTPException(status_code=400, detail="Termo de busca é obrigatório")
+
+    limit = max(1, min(limit, 100))
+    user_id = current_user['id']
+
+    # Mesmas regras de visibilidade da listagem de mensagens
+    conditions = []
+    params = [match_query]
+
+    if receiver_id:
+        conditions.append("((m.sender_id = ? AND m.receiver_id = ?) OR (m.sender_id = ? AND m.receiver_id = ?))")
+        params.extend([user_id, receiver_id, receiver_id, user_id])
+    elif current_user['access_level'] != "master":
+        conditions.append("(m.receiver_id IS NULL OR m.receiver_id = ? OR m.sender_id = ?)")
+        params.extend([user_id, user_id])
+
+    visibility = " AND " + " AND ".join(conditions) if conditions else ""
+
+    # bm25: quanto menor, mais relevante
+    outer_filter = ""
+    if cursor:
+        last_score, last_id = decode_search_cursor(cursor)
+        outer_filter = "WHERE score > ? OR (score = ? AND id < ?)"
+        params.extend([last_score, last_score, last_id])
+
+    params.append(limit + 1)
+
+    conn = sqlite3.connect('sordchat.db')
+    try:
+        db_cursor = conn.cursor()
+
+        db_cursor.execute(f"""
+                          SELECT * FROM (
+                              SELECT m.id, m.content, m.sender_id, m.receiver_id, m.message_type,
+                                     m.timestamp, u.full_name,
+                                     bm25(messages_fts) AS score,
+                                     highlight(messages_fts, 0, '<mark>', '</mark>') AS highlight
+                              FROM messages_fts
+                                  JOIN messages m ON m.id = messages_fts.rowid
+                                  JOIN users u ON m.sender_id = u.id
+                              WHERE messages_fts MATCH ?{visibility}
+                          )
+                          {outer_filter}
+                          ORDER BY score, id DESC
+                          LIMIT ?
+                          """, params)
+
+        rows = db_cursor.fetchall()
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Consulta inválida: {e}")
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    results = [{
+        "id": row[0],
+        "content": row[1],
+        "sender_id": row[2],
+        "receiver_id": row[3],
+        "message_type": row[4],
+        "timestamp": row[5],
+        "sender_name": row[6],
+        "rank": -row[7],
+        "highlight": row[8]
+    } for row in rows]
+
+    next_cursor = encode_search_cursor(rows[-1][7], rows[-1][0]) if has_more else None
+
+    return {
+        "results": results,
+        "next_cursor": next_cursor
+    }
+
+
 # Endpoint para buscar reações de uma mensagem
 @app.get("/messages/{message_id}/reactions")
 async def get_message_reactions(
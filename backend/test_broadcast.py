@@ -0,0 +1,92 @@
+"""
+Teste do broadcast em segundo plano: gravação em lotes e contagem de entregas reais
+"""
+
+import json
+import asyncio
+
+from sordchat.utils import notifications as notifications_module
+from sordchat.utils.notifications import NotificationManager, NOTIFICATIONS_DB, notification_retention
+from sordchat.utils.notification_store import notification_writer
+from sordchat.utils.delivery import DeliveryBus
+
+RECIPIENTS = list(range(1, 451))  # três lotes de BROADCAST_BATCH_SIZE
+ONLINE = set(range(1, 51))
+BROKEN = {7}  # conectado, mas o socket falha no envio
+
+
+class FakeConnections:
+    def __init__(self):
+        self.active_connections = {user_id: object() for user_id in ONLINE}
+        self.frames = {}
+
+    async def send_frame(self, user_id: int, frame: str) -> bool:
+        if user_id in BROKEN:
+            return False
+        self.frames.setdefault(user_id, []).append(json.loads(frame))
+        return True
+
+
+class FakeWebSocketManager:
+    """Mesmo contrato de ConnectionManager.send_personal_message"""
+
+    def __init__(self, bus: DeliveryBus):
+        self.bus = bus
+
+    async def send_personal_message(self, message: str, user_id: int) -> bool:
+        return await self.bus.deliver(user_id, message)
+
+
+def test_broadcast_fans_out_in_background():
+    """O job volta na hora; a entrega conta só os frames escritos no socket"""
+    connections = FakeConnections()
+    bus = DeliveryBus()
+    bus.attach(connections)
+
+    manager = NotificationManager()
+    manager.set_websocket_manager(FakeWebSocketManager(bus))
+
+    async def scenario():
+        job = manager.start_broadcast(RECIPIENTS, "Manutenção", "Sistema fora do ar às 22h", created_by=1)
+        queued_status = job["status"]
+
+        await asyncio.gather(*manager._broadcast_tasks)
+        await notification_retention.stop()
+        return queued_status, job
+
+    writer_enabled = notification_writer.enabled
+    notification_writer.enabled = False
+    try:
+        queued_status, job = asyncio.run(scenario())
+    finally:
+        notification_writer.enabled = writer_enabled
+
+    try:
+        assert queued_status == "queued"
+        assert job["status"] == "completed" and job["finished_at"]
+        assert job["total"] == job["stored"] == len(RECIPIENTS)
+        assert job["delivered"] == len(ONLINE - BROKEN)
+        assert job["offline"] == len(RECIPIENTS) - len(ONLINE - BROKEN)
+        assert job["failed"] == 0
+
+        # Cada destinatário online recebeu a notificação uma vez
+        assert set(connections.frames) == ONLINE - BROKEN
+        assert all(
+            [frame["notification"]["title"] for frame in frames] == ["Manutenção"]
+            for frames in connections.frames.values()
+        )
+        assert all(len(NOTIFICATIONS_DB[user_id]) == 1 for user_id in RECIPIENTS)
+        assert not manager._broadcast_tasks
+        assert manager.get_broadcast_job(job["id"]) is job
+
+    finally:
+        for user_id in RECIPIENTS:
+            NOTIFICATIONS_DB.pop(user_id, None)
+        notifications_module.BROADCAST_JOBS.pop(job["id"], None)
+
+    print(f"✅ Broadcast: {job['delivered']} entregues, {job['offline']} offline")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando broadcast de notificações...")
+    test_broadcast_fans_out_in_background()
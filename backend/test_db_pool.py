@@ -0,0 +1,256 @@
+"""
+Teste do pool de conexões (reutilização, rollback na devolução, validação e teto)
+"""
+
+import time
+import asyncio
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+from sordchat.utils.db_pool import ConnectionPool, PoolExhausted
+
+
+class FakeInfo:
+    def __init__(self):
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Imita o necessário de PooledConnection sem abrir um socket"""
+
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.info = FakeInfo()
+        self.pool = None
+        self.rollbacks = 0
+        self.executed = []
+        self.dead = False  # servidor derrubou a conexão sem que o cliente percebesse
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def begin(self):
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        # Mesma regra de PooledConnection.close
+        if self.pool is not None:
+            self.pool.putconn(self)
+        else:
+            self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.dead:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.executed.append(query)
+        self.conn.begin()
+
+
+class FakePool(ConnectionPool):
+    def _connect(self):
+        self.stats['created'] += 1
+        return FakeConnection()
+
+
+def test_connection_is_reused():
+    """close() devolve ao pool e a próxima requisição recebe a mesma conexão"""
+    pool = FakePool(minconn=1, maxconn=5)
+
+    conn = pool.getconn()
+    conn.close()
+    again = pool.getconn()
+
+    assert again is conn
+    assert pool.stats['created'] == 1 and pool.stats['reused'] == 1
+    assert pool.get_metrics()['in_use'] == 1
+
+    again.close()
+    assert pool.get_metrics()['in_use'] == 0 and pool.get_metrics()['idle'] == 1
+
+    print("✅ Reutilização")
+
+
+def test_putconn_rolls_back_and_resets():
+    """Transação pendente é desfeita e autocommit volta ao padrão"""
+    pool = FakePool(minconn=1, maxconn=5)
+
+    conn = pool.getconn()
+    conn.begin()
+    conn.autocommit = True
+    conn.close()
+
+    assert conn.rollbacks == 1
+    assert conn.autocommit is False
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    assert pool.getconn() is conn
+
+    print("✅ Rollback na devolução")
+
+
+def test_double_close_does_not_return_twice():
+    """Um segundo close() encerra a conexão em vez de devolvê-la de novo"""
+    pool = FakePool(minconn=1, maxconn=5)
+
+    conn = pool.getconn()
+    conn.close()
+    conn.close()
+
+    assert pool.get_metrics()['idle'] == 1
+    assert pool.get_metrics()['in_use'] == 0
+    assert conn.closed
+
+    # A conexão encerrada é descartada na próxima retirada
+    fresh = pool.getconn()
+    assert fresh is not conn
+    assert pool.stats['discarded'] == 1
+
+    print("✅ close() duplo")
+
+
+def test_broken_and_excess_connections_are_discarded():
+    """Conexões fechadas pelo servidor e acima de maxconn não voltam ao pool"""
+    pool = FakePool(minconn=1, maxconn=1, limit=2)
+
+    first, second = pool.getconn(), pool.getconn()
+    first.close()
+    second.close()  # acima de maxconn ociosas: encerrada
+
+    assert second.closed
+    assert pool.get_metrics()['idle'] == 1
+
+    first.closed = 2  # servidor encerrou enquanto ociosa
+    fresh = pool.getconn()
+
+    assert fresh is not first
+    assert pool.stats['discarded'] == 2
+
+    print("✅ Descarte")
+
+
+def test_stale_connection_is_validated_on_checkout():
+    """Ociosa há mais de validate_after: SELECT 1 antes de entregar; morta, é trocada"""
+    pool = FakePool(minconn=1, maxconn=5, validate_after=60)
+
+    conn = pool.getconn()
+    conn.close()
+    assert pool.getconn() is conn and conn.executed == []  # recém-devolvida: sem consulta
+    conn.close()
+
+    conn.idle_since -= 120
+    assert pool.getconn() is conn and conn.executed == ["SELECT 1"]
+    assert conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+    conn.close()
+
+    conn.idle_since -= 120
+    conn.dead = True
+    fresh = pool.getconn()
+
+    assert fresh is not conn and conn.closed
+    assert pool.stats['validated'] == 2 and pool.stats['discarded'] == 1 and pool.stats['created'] == 2
+    assert pool.get_metrics()['in_use'] == 1
+
+    print("✅ Validação na retirada")
+
+
+def test_limit_fails_fast_in_event_loop():
+    """No teto, a retirada no event loop falha na hora e a vaga volta no close()"""
+    pool = FakePool(minconn=1, maxconn=1, limit=2, timeout=5)
+    first, second = pool.getconn(), pool.getconn()
+
+    async def checkout():
+        started = time.monotonic()
+        try:
+            pool.getconn()
+        except PoolExhausted:
+            return time.monotonic() - started
+        raise AssertionError("esperado PoolExhausted")
+
+    assert asyncio.run(checkout()) < 0.5
+    assert pool.stats['exhausted'] == 1 and pool.get_metrics()['in_use'] == 2
+
+    second.close()
+    third = pool.getconn()
+    assert pool.get_metrics()['in_use'] == 2
+
+    first.close()
+    third.close()
+    assert pool.get_metrics()['in_use'] == 0
+
+    print("✅ Teto no event loop")
+
+
+def test_limit_blocks_worker_thread_until_release():
+    """Em uma thread de trabalho a retirada espera a devolução (ou o timeout)"""
+    pool = FakePool(minconn=1, maxconn=1, limit=1, timeout=2)
+    held = pool.getconn()
+    result = {}
+
+    def worker():
+        result['conn'] = pool.getconn()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    assert 'conn' not in result  # aguardando vaga
+
+    held.close()
+    thread.join(timeout=1)
+
+    assert result['conn'] is held
+    assert pool.stats['waits'] == 1 and pool.stats['exhausted'] == 0
+
+    pool.timeout = 0.05
+    try:
+        pool.getconn()
+        raise AssertionError("esperado PoolExhausted")
+    except PoolExhausted:
+        pass
+    assert pool.get_metrics()['in_use'] == 1
+
+    print("✅ Teto em thread de trabalho")
+
+
+def test_open_warms_minimum_connections():
+    """open() deixa minconn conexões validadas e ociosas"""
+    pool = FakePool(minconn=3, maxconn=5)
+    pool.open()
+    pool.open()  # idempotente
+
+    metrics = pool.get_metrics()
+    assert metrics['idle'] == 3 and metrics['created'] == 3
+    assert all(conn.executed == ["SELECT 1"] and conn.rollbacks == 1 for conn in pool.idle)
+
+    pool.closeall()
+    assert pool.get_metrics()['idle'] == 0
+
+    print("✅ Aquecimento")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando pool de conexões...")
+    test_connection_is_reused()
+    test_putconn_rolls_back_and_resets()
+    test_double_close_does_not_return_twice()
+    test_broken_and_excess_connections_are_discarded()
+    test_stale_connection_is_validated_on_checkout()
+    test_limit_fails_fast_in_event_loop()
+    test_limit_blocks_worker_thread_until_release()
+    test_open_warms_minimum_connections()
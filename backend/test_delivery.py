@@ -0,0 +1,135 @@
+"""
+Teste do barramento de entrega: frames agrupados por volta do loop, ordem, drain e falhas
+"""
+
+import json
+import asyncio
+from typing import Dict, List, Set
+
+from sordchat.utils.delivery import DeliveryBus
+
+
+class FakeConnections:
+    """Gerenciador de conexões em memória; envios para `failing` falham"""
+
+    def __init__(self, user_ids, failing: Set[int] = frozenset(), delay: float = 0):
+        self.active_connections = {user_id: object() for user_id in user_ids}
+        self.failing = set(failing)
+        self.delay = delay
+        self.frames: Dict[int, List[dict]] = {}
+
+    async def send_frame(self, user_id: int, frame: str) -> bool:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if user_id in self.failing:
+            self.active_connections.pop(user_id, None)
+            return False
+        self.frames.setdefault(user_id, []).append(json.loads(frame))
+        return True
+
+
+def event(n: int) -> str:
+    return json.dumps({"type": "notification", "n": n})
+
+
+def unwrap(frames: List[dict]) -> List[int]:
+    """Mesma regra do cliente: frames 'batch' viram a lista de eventos"""
+    events = []
+    for frame in frames:
+        events.extend(frame["events"] if frame["type"] == "batch" else [frame])
+    return [e["n"] for e in events]
+
+
+def make_bus(connections) -> DeliveryBus:
+    bus = DeliveryBus()
+    bus.attach(connections)
+    return bus
+
+
+def test_same_tick_events_share_a_frame():
+    """Eventos de um usuário na mesma volta do loop saem em um frame 'batch'"""
+    connections = FakeConnections([1, 2])
+    bus = make_bus(connections)
+
+    async def scenario():
+        for n in range(5):
+            bus.publish(1, event(n))
+        bus.publish(2, event(100))
+        assert await bus.drain(timeout=1)
+
+    asyncio.run(scenario())
+
+    assert len(connections.frames[1]) == 1 and connections.frames[1][0]["type"] == "batch"
+    assert unwrap(connections.frames[1]) == [0, 1, 2, 3, 4]
+    # Um único evento segue sem envelope
+    assert connections.frames[2] == [{"type": "notification", "n": 100}]
+    assert bus.stats["frames"] == 2 and bus.stats["batched_frames"] == 1 and bus.stats["events"] == 6
+    assert bus.get_metrics(1)["events"] == 5
+
+    print("✅ Frame agrupado")
+
+
+def test_order_is_kept_across_frames():
+    """Eventos publicados durante um envio saem no frame seguinte, na ordem"""
+    connections = FakeConnections([1], delay=0.01)
+    bus = make_bus(connections)
+
+    async def scenario():
+        bus.publish(1, event(0))
+        await asyncio.sleep(0.002)  # primeiro frame em envio
+        for n in range(1, 4):
+            bus.publish(1, event(n))
+        assert await bus.drain(timeout=1)
+
+    asyncio.run(scenario())
+
+    assert len(connections.frames[1]) == 2
+    assert unwrap(connections.frames[1]) == [0, 1, 2, 3]
+    assert not bus.buffers and not bus.sending
+
+    print("✅ Ordem entre frames")
+
+
+def test_deliver_reports_send_result():
+    """deliver() só retorna True depois que o frame foi escrito no socket"""
+    connections = FakeConnections([1, 2], failing={2})
+    bus = make_bus(connections)
+
+    async def scenario():
+        return await asyncio.gather(
+            bus.deliver(1, event(1)),
+            bus.deliver(2, event(2)),  # conectado, mas o envio falha
+            bus.deliver(3, event(3)),  # offline
+        )
+
+    assert asyncio.run(scenario()) == [True, False, False]
+    assert bus.stats["failed"] == 1 and bus.stats["dropped_offline"] == 1
+    # O usuário cujo envio falhou foi desconectado
+    assert not bus.is_connected(2)
+
+    print("✅ Resultado real da entrega")
+
+
+def test_drain_times_out_while_sending():
+    """drain() devolve False se o envio não termina no prazo"""
+    connections = FakeConnections([1], delay=0.2)
+    bus = make_bus(connections)
+
+    async def scenario():
+        bus.publish(1, event(1))
+        drained_early = await bus.drain(timeout=0.02)
+        drained = await bus.drain(timeout=1)
+        return drained_early, drained
+
+    assert asyncio.run(scenario()) == (False, True)
+    assert unwrap(connections.frames[1]) == [1]
+
+    print("✅ Drain")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando barramento de entrega...")
+    test_same_tick_events_share_a_frame()
+    test_order_is_kept_across_frames()
+    test_deliver_reports_send_result()
+    test_drain_times_out_while_sending()
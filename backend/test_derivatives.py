@@ -0,0 +1,93 @@
+"""
+Teste do cache de derivados: gerações simultâneas e cancelamento de quem pediu primeiro
+"""
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+from sordchat.utils import derivatives as derivatives_module
+from sordchat.utils.derivatives import DerivativeCache
+
+BLOB = {'hash': 'abc123', 'path': '/origem/abc123'}
+
+
+class SlowQueue:
+    """Substitui o pool de processos: grava o arquivo depois de um intervalo"""
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def run_in_pool(self, func, source, target, size, pil_format, quality):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        Path(target).write_bytes(b"x" * 100)
+
+
+def with_queue(scenario):
+    original = derivatives_module.thumbnail_queue
+    queue = derivatives_module.thumbnail_queue = SlowQueue()
+    try:
+        return asyncio.run(scenario(queue))
+    finally:
+        derivatives_module.thumbnail_queue = original
+
+
+def test_concurrent_requests_share_one_render():
+    """Pedidos simultâneos do mesmo derivado geram o arquivo uma única vez"""
+    cache = DerivativeCache(Path(tempfile.mkdtemp()))
+
+    async def scenario(queue):
+        paths = await asyncio.gather(*(cache.get_or_create(BLOB, 128, 128, 'webp') for _ in range(5)))
+        return queue, paths
+
+    queue, paths = with_queue(scenario)
+
+    assert queue.calls == 1
+    assert len(set(paths)) == 1 and paths[0].exists()
+    assert cache.stats['misses'] == 1 and cache.stats['coalesced'] == 4
+    assert not cache.inflight
+
+    print("✅ Geração compartilhada")
+
+
+def test_first_caller_cancelled():
+    """Cancelar o primeiro pedido não cancela quem aguardava a mesma geração"""
+    cache = DerivativeCache(Path(tempfile.mkdtemp()))
+
+    async def scenario(queue):
+        first = asyncio.create_task(cache.get_or_create(BLOB, 256, 256, 'jpeg'))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get_or_create(BLOB, 256, 256, 'jpeg'))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        path = await second
+
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("o primeiro pedido deveria ter sido cancelado")
+
+        # O arquivo gerado ficou no cache: o próximo pedido é um acerto
+        again = await cache.get_or_create(BLOB, 256, 256, 'jpeg')
+        return queue, path, again
+
+    queue, path, again = with_queue(scenario)
+
+    assert path.exists() and again == path
+    assert queue.calls == 1
+    assert cache.stats['hits'] == 1
+    assert cache.derivative_name('abc123', 256, 256, 'jpeg') in cache.entries
+    assert not cache.inflight
+
+    print("✅ Cancelamento do primeiro pedido")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando cache de derivados...")
+    test_concurrent_requests_share_one_render()
+    test_first_caller_cancelled()
@@ -0,0 +1,118 @@
+"""
+Teste das respostas de arquivo: Range, ETag e GET condicional
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from sordchat.utils.http_cache import parse_range, file_response, make_etag
+
+CONTENT = bytes(range(256)) * 4  # 1024 bytes
+ETAG = make_etag("abc123")
+
+
+def make_client(content: bytes) -> TestClient:
+    """Aplicação mínima que serve um arquivo temporário com file_response"""
+    handle, name = tempfile.mkstemp()
+    with os.fdopen(handle, "wb") as f:
+        f.write(content)
+
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        return file_response(request, Path(name), etag=ETAG, media_type="application/octet-stream",
+                             filename="arquivo.bin")
+
+    return TestClient(app)
+
+
+def test_parse_range():
+    """Intervalos válidos, sufixos e casos não atendíveis"""
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+
+    assert parse_range("bytes=1000-", 1000) == (-1, -1)
+    assert parse_range("bytes=50-10", 1000) == (-1, -1)
+    assert parse_range("bytes=-0", 1000) == (-1, -1)
+
+    # Arquivo vazio: nenhum intervalo pode ser atendido
+    assert parse_range("bytes=-10", 0) == (-1, -1)
+    assert parse_range("bytes=0-", 0) == (-1, -1)
+
+    # Ignorados: outra unidade, múltiplos intervalos ou valores inválidos
+    assert parse_range("items=0-10", 1000) is None
+    assert parse_range("bytes=0-10,20-30", 1000) is None
+    assert parse_range("bytes=a-b", 1000) is None
+
+    print("✅ parse_range")
+
+
+def test_ranged_response():
+    """206 com Content-Range e apenas os bytes pedidos"""
+    client = make_client(CONTENT)
+
+    response = client.get("/file", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+    assert response.content == CONTENT[100:200]
+
+    response = client.get("/file", headers={"Range": "bytes=-24"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-24:]
+
+    # If-Range com outro ETag: arquivo completo
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"outro"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+    response = client.get("/file", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+    print("✅ Range")
+
+
+def test_ranged_response_empty_file():
+    """Sufixo em arquivo vazio é 416, nunca 'bytes 0--1/0'"""
+    client = make_client(b"")
+
+    response = client.get("/file", headers={"Range": "bytes=-10"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */0"
+
+    print("✅ Range em arquivo vazio")
+
+
+def test_conditional_get():
+    """If-None-Match com o ETag atual responde 304 sem corpo"""
+    client = make_client(CONTENT)
+
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.headers["etag"] == ETAG
+
+    response = client.get("/file", headers={"If-None-Match": f'W/{ETAG}, "outro"'})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/file", headers={"If-Modified-Since": response.headers["last-modified"]})
+    assert response.status_code == 304
+
+    print("✅ GET condicional")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando respostas de arquivo...")
+    test_parse_range()
+    test_ranged_response()
+    test_ranged_response_empty_file()
+    test_conditional_get()
@@ -0,0 +1,57 @@
+"""
+Teste dos cursores opacos de paginação
+"""
+
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from sordchat.utils.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    """O cursor devolve os mesmos valores, sem padding e seguro para URL"""
+    values = {"rank": 0.0607927, "id": 42, "timestamp": "2025-03-10T12:00:00.123456+00:00"}
+    cursor = encode_cursor(values)
+
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == values
+
+    print("✅ Ida e volta")
+
+
+def test_cursor_serializes_datetimes_as_text():
+    """Valores não JSON (datetime) viram texto com a precisão completa"""
+    moment = datetime(2025, 3, 10, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor({"timestamp": moment}))["timestamp"] == str(moment)
+
+    print("✅ datetime")
+
+
+def test_empty_cursor_is_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+    print("✅ Primeira página")
+
+
+def test_invalid_cursor_is_rejected():
+    """Cursor corrompido ou que não é um objeto responde 400"""
+    for cursor in ["não-base64!", "Zm9v", encode_cursor([1, 2])]:
+        try:
+            decode_cursor(cursor)
+        except HTTPException as e:
+            assert e.status_code == 400
+        else:
+            raise AssertionError(f"Cursor aceito: {cursor}")
+
+    print("✅ Cursor inválido")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando cursores de paginação...")
+    test_cursor_round_trip()
+    test_cursor_serializes_datetimes_as_text()
+    test_empty_cursor_is_first_page()
+    test_invalid_cursor_is_rejected()
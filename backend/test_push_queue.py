@@ -0,0 +1,193 @@
+"""
+Teste da fila de push com um transporte em memória: lotes, novas tentativas e dead-letter
+"""
+
+import json
+import asyncio
+from typing import Dict, List, Any
+
+from sordchat.utils import push_queue as push_module
+from sordchat.utils.push_queue import PushQueue, PushTransport, PushDeliveryError, take_batch
+
+SUBSCRIPTION = {"endpoint": "https://push.example/abc", "user_id": 1}
+
+
+class MemoryTransport(PushTransport):
+    """Guarda cada envio; as primeiras `failures` chamadas falham com `error`"""
+
+    name = "memory"
+
+    def __init__(self, failures: int = 0, error: PushDeliveryError = None):
+        self.failures = failures
+        self.error = error or PushDeliveryError("indisponível", 503)
+        self.sent: List[List[Dict[str, Any]]] = []
+        self.calls = 0
+
+    async def send(self, subscription: Dict[str, Any], payload: str):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+
+        data = json.loads(payload)
+        self.sent.append(data["notifications"] if data.get("type") == "batch" else [data])
+
+
+def message(n: int, text: str = "") -> Dict[str, Any]:
+    return {"id": n, "title": f"Notificação {n}", "body": text}
+
+
+async def run_queue(transport: PushTransport, messages: List[Dict[str, Any]], workers: int = 1) -> PushQueue:
+    queue = PushQueue(transport, workers=workers)
+    for item in messages:
+        queue.enqueue(SUBSCRIPTION, item)
+    assert await queue.drain(timeout=5)
+    await queue.stop()
+    return queue
+
+
+def fast_backoff(test):
+    """Backoff de milissegundos durante o teste"""
+    def wrapper():
+        original = push_module.PUSH_BACKOFF_BASE
+        push_module.PUSH_BACKOFF_BASE = 0.005
+        try:
+            test()
+        finally:
+            push_module.PUSH_BACKOFF_BASE = original
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+
+def test_transport_is_abstract():
+    """Transporte sem send não pode ser instanciado"""
+    class Incomplete(PushTransport):
+        pass
+
+    try:
+        Incomplete()
+    except TypeError:
+        print("✅ PushTransport abstrato")
+        return
+    raise AssertionError("PushTransport sem send foi instanciado")
+
+
+def test_take_batch_respects_bytes():
+    """Lote limitado pela quantidade e pelo tamanho do payload"""
+    items = [{"size": 1000} for _ in range(10)]
+
+    assert len(take_batch(items, max_items=20, max_bytes=3 * 1024)) == 3
+    assert len(take_batch(items, max_items=2, max_bytes=10 ** 6)) == 2
+
+    # Uma notificação maior que o limite segue sozinha
+    assert len(take_batch([{"size": 5000}, {"size": 10}], max_items=20, max_bytes=3 * 1024)) == 1
+
+    print("✅ take_batch")
+
+
+def test_batches_stay_under_byte_cap():
+    """Envios agrupados nunca passam de PUSH_BATCH_MAX_BYTES"""
+    transport = MemoryTransport()
+    queue = asyncio.run(run_queue(transport, [message(n, "x" * 700) for n in range(12)]))
+
+    delivered = [item["id"] for batch in transport.sent for item in batch]
+    assert sorted(delivered) == list(range(12))
+    assert all(len(json.dumps(batch)) <= push_module.PUSH_BATCH_MAX_BYTES for batch in transport.sent)
+    assert len(transport.sent) > 1
+    assert queue.stats["sent"] == 12
+
+    print(f"✅ Limite de bytes: {len(transport.sent)} envios")
+
+
+@fast_backoff
+def test_retry_then_success():
+    """Falhas temporárias são repetidas até a entrega"""
+    transport = MemoryTransport(failures=2)
+    queue = asyncio.run(run_queue(transport, [message(1)]))
+
+    assert transport.calls == 3
+    assert transport.sent == [[message(1)]]
+    assert queue.stats["retries"] == 2
+    assert queue.stats["sent"] == 1
+    assert not queue.dead_letter
+
+    print("✅ Nova tentativa")
+
+
+@fast_backoff
+def test_dead_letter_after_max_attempts():
+    """Após PUSH_MAX_ATTEMPTS falhas a notificação vai para o dead-letter"""
+    transport = MemoryTransport(failures=100)
+    queue = asyncio.run(run_queue(transport, [message(1)]))
+
+    assert transport.calls == push_module.PUSH_MAX_ATTEMPTS
+    assert queue.stats["dead_lettered"] == 1
+    assert queue.dead_letter[0]["attempts"] == push_module.PUSH_MAX_ATTEMPTS
+    assert queue.dead_letter[0]["message"] == message(1)
+
+    print("✅ Dead-letter")
+
+
+def test_non_retryable_goes_straight_to_dead_letter():
+    """4xx (exceto 429) não é repetido; 404/410 avisam on_gone"""
+    gone = []
+    transport = MemoryTransport(failures=1, error=PushDeliveryError("removida", 410, retryable=False))
+
+    async def scenario():
+        queue = PushQueue(transport, workers=1)
+        queue.on_gone = gone.append
+        queue.enqueue(SUBSCRIPTION, message(1))
+        assert await queue.drain(timeout=5)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    assert transport.calls == 1
+    assert queue.stats["gone"] == 1
+    assert queue.dead_letter[0]["attempts"] == 1
+    assert gone == [SUBSCRIPTION]
+
+    print("✅ Subscription removida")
+
+
+@fast_backoff
+def test_attempts_are_counted_per_item():
+    """Notificação que entra em um lote já repetido não herda as tentativas dele"""
+    transport = MemoryTransport(failures=1)
+    veteran = push_module.PUSH_MAX_ATTEMPTS - 1
+
+    async def scenario():
+        queue = PushQueue(transport, workers=1)
+        queue.start()
+
+        # Lote misto: uma notificação na última tentativa e uma recém-chegada
+        items = [
+            {"message": message(1), "size": 10, "attempts": veteran, "queued_at": 0},
+            {"message": message(2), "size": 10, "attempts": 0, "queued_at": 0},
+        ]
+        await queue._deliver(SUBSCRIPTION, items)
+
+        assert await queue.drain(timeout=5)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    # Apenas a veterana esgotou as tentativas; a outra foi repetida e entregue
+    assert [entry["message"]["id"] for entry in queue.dead_letter] == [1]
+    assert queue.dead_letter[0]["attempts"] == push_module.PUSH_MAX_ATTEMPTS
+    assert transport.sent == [[message(2)]]
+    assert queue.stats["sent"] == 1
+
+    print("✅ Tentativas por notificação")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando fila de push...")
+    test_transport_is_abstract()
+    test_take_batch_respects_bytes()
+    test_batches_stay_under_byte_cap()
+    test_retry_then_success()
+    test_dead_letter_after_max_attempts()
+    test_non_retryable_goes_straight_to_dead_letter()
+    test_attempts_are_counted_per_item()
@@ -0,0 +1,68 @@
+"""
+Teste da leitura dos agregados do dashboard (séries com dias e horas sem atividade)
+"""
+
+from datetime import date
+
+from sordchat.utils.rollups import fetch_daily_series, fetch_hour_of_day, SCOPE_USER
+
+TODAY = date(2025, 3, 10)
+
+
+class FakeCursor:
+    """Responde CURRENT_DATE e devolve as linhas do agregado configuradas"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def fetchone(self):
+        return (TODAY,)
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_daily_series_fills_missing_days():
+    """Dias sem linha no agregado aparecem com zero, em ordem"""
+    cursor = FakeCursor([
+        ("tasks_created", date(2025, 3, 8), 4),
+        ("tasks_created", TODAY, 1),
+        ("tasks_completed", date(2025, 3, 8), 2),
+    ])
+
+    dates, series = fetch_daily_series(cursor, SCOPE_USER, 7, ["tasks_created", "tasks_completed"], 5)
+
+    assert dates == [date(2025, 3, d) for d in range(6, 11)]
+    assert series == {
+        "tasks_created": [0, 0, 4, 0, 1],
+        "tasks_completed": [0, 0, 2, 0, 0],
+    }
+
+    # Filtro pela janela pedida, com a chave do escopo como texto
+    _, params = cursor.queries[-1]
+    assert params == (SCOPE_USER, "7", ["tasks_created", "tasks_completed"], date(2025, 3, 6), TODAY)
+
+    print("✅ Série diária")
+
+
+def test_hour_of_day_has_24_positions():
+    """Horas sem mensagens ficam com zero"""
+    cursor = FakeCursor([(9, 3), (14, 5)])
+
+    by_hour = fetch_hour_of_day(cursor, SCOPE_USER, 7, "messages", 24)
+
+    assert len(by_hour) == 24
+    assert by_hour[9] == 3 and by_hour[14] == 5
+    assert sum(by_hour) == 8
+
+    print("✅ Atividade por hora")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando agregados do dashboard...")
+    test_daily_series_fills_missing_days()
+    test_hour_of_day_has_24_positions()
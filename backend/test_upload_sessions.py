@@ -0,0 +1,182 @@
+"""
+Teste das sessões de upload retomáveis: offsets, conflitos (409) e retomada
+"""
+
+import asyncio
+import hashlib
+import tempfile
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from sordchat.utils import file_handler
+
+SESSION_ID = "6f1c2a9e-3b7d-4c1e-9a52-0d8f4e6b7a10"
+USER_ID = 7
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class FakeCursor:
+    """Aplica o UPDATE condicional de append_upload_chunk sobre a sessão em memória"""
+
+    def __init__(self, session):
+        self.session = session
+        self.row = None
+
+    def execute(self, query, params=None):
+        written, _, session_id, offset = params
+        if session_id == self.session['id'] and self.session['received_bytes'] == offset:
+            self.session['received_bytes'] += written
+            self.row = (self.session['received_bytes'],)
+        else:
+            self.row = None
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, session):
+        self.session = session
+
+    def cursor(self):
+        return FakeCursor(self.session)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def chunks(data: bytes, size: int = 1000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def with_session(scenario):
+    """Sessão em memória e staging em um diretório temporário"""
+    session = {
+        'id': SESSION_ID, 'user_id': USER_ID, 'original_name': 'dados.bin', 'category': 'documents',
+        'description': None, 'total_size': len(DATA), 'received_bytes': 0
+    }
+    originals = (file_handler.UPLOAD_DIR, file_handler.get_upload_session, file_handler.get_db_connection)
+
+    file_handler.UPLOAD_DIR = Path(tempfile.mkdtemp())
+    (file_handler.UPLOAD_DIR / 'temp').mkdir()
+    file_handler._session_staging_path(SESSION_ID).touch()
+    file_handler._session_hashers[SESSION_ID] = (0, hashlib.sha256())
+    file_handler.get_upload_session = lambda session_id, user_id: dict(session)
+    file_handler.get_db_connection = lambda: FakeConnection(session)
+
+    try:
+        return asyncio.run(scenario(session))
+    finally:
+        file_handler.UPLOAD_DIR, file_handler.get_upload_session, file_handler.get_db_connection = originals
+        file_handler._session_hashers.pop(SESSION_ID, None)
+        file_handler._session_locks.pop(SESSION_ID, None)
+
+
+async def expect_conflict(coroutine) -> HTTPException:
+    try:
+        await coroutine
+    except HTTPException as e:
+        assert e.status_code == 409, e.status_code
+        return e
+    raise AssertionError("esperado 409")
+
+
+def test_wrong_offset_reports_expected_position():
+    """Offset diferente do recebido responde 409 com Upload-Offset, sem gravar nada"""
+    async def scenario(session):
+        await file_handler.append_upload_chunk(SESSION_ID, USER_ID, 0, chunks(DATA[:4000]))
+
+        ahead = await expect_conflict(
+            file_handler.append_upload_chunk(SESSION_ID, USER_ID, 6000, chunks(DATA[6000:]))
+        )
+        # Reenvio de um trecho já aceito (resposta perdida pelo cliente)
+        behind = await expect_conflict(
+            file_handler.append_upload_chunk(SESSION_ID, USER_ID, 2000, chunks(DATA[2000:4000]))
+        )
+        return session, ahead, behind
+
+    session, ahead, behind = with_session(scenario)
+
+    assert ahead.headers["Upload-Offset"] == "4000"
+    assert behind.headers["Upload-Offset"] == "4000"
+    assert session['received_bytes'] == 4000
+
+    print("✅ Offset incorreto")
+
+
+def test_resume_from_reported_offset():
+    """Retomar do Upload-Offset informado completa o arquivo sem lacunas"""
+    async def scenario(session):
+        await file_handler.append_upload_chunk(SESSION_ID, USER_ID, 0, chunks(DATA[:3000]))
+
+        conflict = await expect_conflict(
+            file_handler.append_upload_chunk(SESSION_ID, USER_ID, 0, chunks(DATA))
+        )
+        offset = int(conflict.headers["Upload-Offset"])
+        result = await file_handler.append_upload_chunk(SESSION_ID, USER_ID, offset, chunks(DATA[offset:]))
+        hashed_offset, hasher = file_handler._session_hashers[SESSION_ID]
+        staged = file_handler._session_staging_path(SESSION_ID).read_bytes()
+        return session, result, staged, hashed_offset, hasher.hexdigest()
+
+    session, result, staged, hashed_offset, digest = with_session(scenario)
+
+    assert result['received_bytes'] == len(DATA) == session['received_bytes']
+    assert staged == DATA
+    # O 409 não desalinha o hash incremental: a finalização não relê o arquivo
+    assert hashed_offset == len(DATA)
+    assert digest == hashlib.sha256(DATA).hexdigest()
+
+    print("✅ Retomada")
+
+
+def test_parallel_chunk_loses_the_race():
+    """Se outro worker avançou a sessão durante a gravação, o bloco é recusado"""
+    async def scenario(session):
+        # get_upload_session ainda vê 0, mas a linha já está em 500
+        stale = dict(session)
+        session['received_bytes'] = 500
+        file_handler.get_upload_session = lambda session_id, user_id: dict(stale)
+
+        conflict = await expect_conflict(
+            file_handler.append_upload_chunk(SESSION_ID, USER_ID, 0, chunks(DATA[:500]))
+        )
+        return session, conflict
+
+    session, conflict = with_session(scenario)
+
+    assert "paralelo" in conflict.detail
+    assert session['received_bytes'] == 500
+    assert SESSION_ID not in file_handler._session_hashers
+
+    print("✅ Bloco concorrente")
+
+
+def test_complete_before_all_bytes():
+    """Finalizar com bytes faltando responde 409 e mantém a sessão retomável"""
+    async def scenario(session):
+        await file_handler.append_upload_chunk(SESSION_ID, USER_ID, 0, chunks(DATA[:1000]))
+        conflict = await expect_conflict(file_handler.complete_upload_session(SESSION_ID, USER_ID))
+        return conflict, file_handler._session_staging_path(SESSION_ID).read_bytes()
+
+    conflict, staged = with_session(scenario)
+
+    assert conflict.headers["Upload-Offset"] == "1000"
+    assert staged == DATA[:1000]
+
+    print("✅ Finalização incompleta")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando sessões de upload...")
+    test_wrong_offset_reports_expected_position()
+    test_resume_from_reported_offset()
+    test_parallel_chunk_loses_the_race()
+    test_complete_before_all_bytes()
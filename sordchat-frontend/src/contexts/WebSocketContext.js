@@ -150,7 +150,9 @@ export const WebSocketProvider = ({ children }) => {
       newSocket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          handleWebSocketMessage(data);
+          // O servidor agrupa em um frame 'batch' os eventos gerados no mesmo instante
+          const events = data.type === 'batch' ? data.events : [data];
+          events.forEach(handleWebSocketMessage);
         } catch (error) {
           console.error('Erro ao processar mensagem WebSocket:', error);
         }